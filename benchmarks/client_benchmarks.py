@@ -0,0 +1,337 @@
+"""
+Throughput, latency and memory of the API clients against local mock servers.
+
+Every scenario runs a fixed number of calls at several concurrency levels
+(and, for the chat clients, several history lengths) against the servers of
+`benchmarks.mock_servers`, and reports calls per second, latency percentiles,
+failed calls and the peak memory allocated per call. Run from the repository
+root:
+
+    python -m benchmarks.client_benchmarks
+    python -m benchmarks.client_benchmarks --error-rate 0.05 --latency 0.1
+    python -m benchmarks.client_benchmarks --check  # fail on regressions
+
+With `--check`, results are compared with `benchmarks/thresholds.json`
+(maximum p99 latency in ms and minimum calls per second per case) and the run
+exits with status 1 if any threshold is not met.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+from toctoc.tracing import TracerProvider
+
+# Spans go to a throwaway spool so the runs do not depend on a collector.
+TracerProvider.get_tracer(
+    "toctoc-benchmarks", spool_directory=tempfile.mkdtemp(prefix="spans-")
+)
+
+from benchmarks.mock_servers import MockOpenAIServer, MockTocTocServer  # noqa: E402
+from chat.chatbot_client import Chatbot  # noqa: E402
+from client.api_client import PropertyDetails, TocTocApiClient  # noqa: E402
+from toctoc.openai_client import (  # noqa: E402
+    ChatMessage,
+    FunctionSchema,
+    OpenAIClient,
+)
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+FUNCTIONS = [
+    FunctionSchema(
+        name="tasar_propiedad",
+        description="Tasa una propiedad a partir de sus características.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "lat": {"type": "number"},
+                "long": {"type": "number"},
+                "usableArea": {"type": "number"},
+            },
+            "required": ["lat", "long", "usableArea"],
+        },
+    )
+]
+
+
+@dataclass
+class CaseResult:
+    """Measurements of one scenario at one concurrency and history length."""
+
+    case: str
+    calls: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    peak_kb_per_call: float
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = int(round(q * len(sorted_values)))
+    return sorted_values[min(len(sorted_values) - 1, max(0, rank - 1))]
+
+
+def history(length: int) -> List[Dict[str, str]]:
+    """A conversation of `length` alternating user and assistant messages."""
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Mensaje {i}: busco un departamento de 80 m2 en Ñuñoa.",
+        }
+        for i in range(length)
+    ]
+
+
+def random_property(rng: random.Random) -> PropertyDetails:
+    return PropertyDetails(
+        latitude=-33.45 + rng.uniform(-0.1, 0.1),
+        longitude=-70.65 + rng.uniform(-0.1, 0.1),
+        property_family_type_id=rng.choice([1, 2]),
+        usable_area=rng.uniform(40, 200),
+        bedrooms=rng.randint(1, 4),
+    )
+
+
+def run_case(
+    case: str,
+    make_worker: Callable[[int], Callable[[], bool]],
+    concurrency: int,
+    calls: int,
+    memory_calls: int,
+) -> CaseResult:
+    """
+    Runs `calls` calls split across `concurrency` threads.
+
+    Args:
+        case (str): Name of the case in the report and the thresholds file.
+        make_worker (Callable[[int], Callable[[], bool]]): Returns, for a
+            worker index, the function making one call. It returns False for
+            a failed call.
+        concurrency (int): Number of threads making calls.
+        calls (int): Total number of calls.
+        memory_calls (int): Calls made after the timed run, one at a time,
+            while tracing memory allocations.
+
+    Returns:
+        CaseResult: The measurements.
+    """
+    workers = [make_worker(i) for i in range(concurrency)]
+    per_worker = [
+        calls // concurrency + (i < calls % concurrency) for i in range(concurrency)
+    ]
+
+    def run(index: int):
+        call = workers[index]
+        latencies, errors = [], 0
+        for _ in range(per_worker[index]):
+            start = time.perf_counter()
+            try:
+                ok = call()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(value for values, _ in results for value in values)
+    errors = sum(errors for _, errors in results)
+
+    tracemalloc.start()
+    for _ in range(memory_calls):
+        try:
+            workers[0]()
+        except Exception:
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return CaseResult(
+        case=case,
+        calls=len(latencies),
+        errors=errors,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50_ms=percentile(latencies, 0.50) * 1000,
+        p90_ms=percentile(latencies, 0.90) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        peak_kb_per_call=peak / 1024 / max(memory_calls, 1),
+    )
+
+
+def toctoc_cases(toctoc_url: str):
+    """Yields (scenario, make_worker) pairs for TocTocApiClient."""
+    client = TocTocApiClient("benchmark", base_url=toctoc_url)
+
+    def sale_appraisal(index: int):
+        rng = random.Random(index)
+        return lambda: bool(client.get_sale_appraisal(random_property(rng)))
+
+    def role_information(index: int):
+        return lambda: client.get_role_information("1234-22", 13101) is not None
+
+    yield "toctoc.sale_appraisal", sale_appraisal
+    yield "toctoc.role_information", role_information
+
+
+def openai_cases(openai_url: str, history_length: int):
+    """Yields (scenario, make_worker) pairs for OpenAIClient and Chatbot."""
+    client = OpenAIClient("benchmark", api_url=openai_url)
+
+    def function_call(index: int):
+        messages = [ChatMessage(**message) for message in history(history_length)]
+        return lambda: client.function_call(
+            "gpt-3.5-turbo", messages, FUNCTIONS
+        ).function_name == FUNCTIONS[0].name
+
+    def stream_function_call(index: int):
+        messages = [ChatMessage(**message) for message in history(history_length)]
+
+        def call():
+            stream = client.stream_function_call("gpt-3.5-turbo", messages, FUNCTIONS)
+            return stream.read().function_name == FUNCTIONS[0].name
+
+        return call
+
+    def chatbot(index: int):
+        bot = Chatbot("benchmark", api_url=openai_url)
+        base = history(history_length)
+
+        def call():
+            bot.conversation_history = list(base)
+            return not bot.get_response("¿Y en Providencia?").startswith("Error:")
+
+        return call
+
+    yield "openai.function_call", function_call
+    yield "openai.stream_function_call", stream_function_call
+    yield "chatbot.get_response", chatbot
+
+
+def check_thresholds(results: List[CaseResult], path: str) -> List[str]:
+    """
+    Compares the results with the thresholds of a JSON file.
+
+    The file maps case names to `max_p99_ms`, `min_throughput` and
+    `max_error_rate` limits.
+
+    Returns:
+        List[str]: One message per threshold not met.
+    """
+    with open(path) as file:
+        thresholds = json.load(file)
+    by_case = {result.case: result for result in results}
+    failures = []
+    for case, limits in thresholds.items():
+        result = by_case.get(case)
+        if result is None:
+            continue
+        if "max_p99_ms" in limits and result.p99_ms > limits["max_p99_ms"]:
+            failures.append(
+                f"{case}: p99 {result.p99_ms:.1f} ms > {limits['max_p99_ms']} ms"
+            )
+        if "min_throughput" in limits and result.throughput < limits["min_throughput"]:
+            failures.append(
+                f"{case}: {result.throughput:.1f} calls/s "
+                f"< {limits['min_throughput']} calls/s"
+            )
+        error_rate = result.errors / result.calls if result.calls else 0.0
+        if "max_error_rate" in limits and error_rate > limits["max_error_rate"]:
+            failures.append(
+                f"{case}: error rate {error_rate:.3f} > {limits['max_error_rate']}"
+            )
+    return failures
+
+
+def print_header() -> None:
+    print(
+        f"{'case':<46} {'calls/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>7} {'KB/call':>8}"
+    )
+
+
+def print_row(r: CaseResult) -> None:
+    print(
+        f"{r.case:<46} {r.throughput:>9.1f} {r.p50_ms:>8.1f} {r.p90_ms:>8.1f} "
+        f"{r.p99_ms:>8.1f} {r.errors:>7} {r.peak_kb_per_call:>8.1f}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Client benchmarks")
+    parser.add_argument("--calls", type=int, default=200, help="Calls per case")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--history", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--memory-calls", type=int, default=20)
+    parser.add_argument("--only", help="Run only the scenarios starting with this")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--check", action="store_true", help="Fail on regressions")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    args = parser.parse_args(argv)
+
+    faults = dict(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    results = []
+    print_header()
+    with MockOpenAIServer(**faults) as openai, MockTocTocServer(**faults) as toctoc:
+        cases = [(name, make, "") for name, make in toctoc_cases(toctoc.url)]
+        for length in args.history:
+            cases += [
+                (name, make, f",h={length}")
+                for name, make in openai_cases(openai.chat_completions_url, length)
+            ]
+        for name, make_worker, suffix in cases:
+            if args.only and not name.startswith(args.only):
+                continue
+            for concurrency in args.concurrency:
+                result = run_case(
+                    f"{name}[c={concurrency}{suffix}]",
+                    make_worker,
+                    concurrency,
+                    args.calls,
+                    args.memory_calls,
+                )
+                results.append(result)
+                print_row(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump([asdict(result) for result in results], file, indent=2)
+
+    if args.check:
+        failures = check_thresholds(results, args.thresholds)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            return 1
+        print("All thresholds met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Per-call overhead of building the OpenAIClient.function_call request body.
+
+Compares the previous approach (model_dump every message and function, then
+json.dumps the whole payload) with the incremental encoding, where each call
+only encodes the turn appended to the conversation. Run from the repository
+root:
+
+    python -m benchmarks.function_call_payload
+"""
+
+import json
+import time
+
+from toctoc.openai_client import ChatMessage, FunctionSchema, OpenAIClient
+
+HISTORY_LENGTHS = [10, 50, 100, 500, 1000]
+REPEATS = 200
+
+FUNCTIONS = [
+    FunctionSchema(
+        name=f"function_{i}",
+        description="Tasa una propiedad a partir de sus características.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "lat": {"type": "number"},
+                "long": {"type": "number"},
+                "usableArea": {"type": "number"},
+                "bedrooms": {"type": "integer"},
+            },
+            "required": ["lat", "long", "usableArea"],
+        },
+    )
+    for i in range(5)
+]
+
+
+def full_encoding(messages, functions) -> bytes:
+    payload = {
+        "model": "gpt-3.5-turbo",
+        "messages": [msg.model_dump() for msg in messages],
+        "functions": [fn.model_dump() for fn in functions],
+        "temperature": 1.0,
+    }
+    json.dumps(payload["functions"])  # span attribute
+    return json.dumps(payload).encode("utf-8")
+
+
+CLIENT = OpenAIClient("benchmark")
+
+
+def cached_encoding(messages, functions) -> bytes:
+    return CLIENT._build_body("gpt-3.5-turbo", messages, functions, 1.0)[0]
+
+
+def per_call_us(build, messages) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        build(messages, FUNCTIONS)
+    return (time.perf_counter() - start) / REPEATS * 1e6
+
+
+def per_turn_us(messages) -> float:
+    """
+    Times cached encodings that each add exactly one new turn.
+
+    Before each timed call the encoder is primed, untimed, with the
+    conversation without its last message, so every timed call encodes that
+    message and reuses the rest.
+    """
+    total = 0.0
+    for _ in range(REPEATS):
+        cached_encoding(messages[:-1], FUNCTIONS)
+        start = time.perf_counter()
+        cached_encoding(messages, FUNCTIONS)
+        total += time.perf_counter() - start
+    return total / REPEATS * 1e6
+
+
+def main():
+    print(f"{'history':>8} {'full (us)':>12} {'cached (us)':>12} {'speedup':>8}")
+    for length in HISTORY_LENGTHS:
+        messages = [
+            ChatMessage(
+                role="user" if i % 2 else "assistant",
+                content=f"Mensaje {i}: tengo un departamento de 80 m2 en Ñuñoa.",
+            )
+            for i in range(length)
+        ]
+        full = per_call_us(full_encoding, messages)
+        # Each call appends one turn to an already encoded conversation.
+        cached = per_turn_us(messages)
+        print(f"{length:>8} {full:>12.1f} {cached:>12.1f} {full / cached:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
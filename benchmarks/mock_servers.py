@@ -0,0 +1,317 @@
+"""
+Local stand-ins for the OpenAI chat completions API and the TocToc gateway.
+
+Both servers answer with fixed, well-formed payloads after a configurable
+latency, and fail a configurable fraction of the requests (500, or 429 with
+`Retry-After: 0`). Use them as context managers:
+
+    with MockOpenAIServer(latency=0.05) as openai, MockTocTocServer() as toctoc:
+        client = OpenAIClient("test", api_url=openai.chat_completions_url)
+        api = TocTocApiClient("test", base_url=toctoc.url)
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROLE_DATA = {
+    "registerReference": {
+        "registerCommune": 13101,
+        "registerBlock": 1234,
+        "registerSite": 22,
+        "registerCommuneCommonProperty": 0,
+        "registerBlockCommonProperty": 0,
+        "registerSiteCommonProperty": 0,
+    },
+    "address": {
+        "nameCommune": "Santiago",
+        "idCommune": 13101,
+        "region": 13,
+        "street": "Av. Libertador Bernardo O'Higgins 1234",
+    },
+    "finances": {
+        "fiscalAppraisal": 85000000.0,
+        "semiannualContribution": 120000.0,
+        "exemptAppraisal": 0.0,
+    },
+    "information": {
+        "totalArea": 120.0,
+        "areaofConstructionLine": 95.0,
+        "minYearofConstruction": 2010,
+        "maxYearofConstruction": 2010,
+    },
+    "housingType": {
+        "housingTypeName": "Departamento",
+        "housingTypeCode": "D",
+        "housingTypeId": 2,
+    },
+    "location": {"coordinates": [-70.6483, -33.4569]},
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class MockServer:
+    """
+    Base class of the mock servers, serving from a background thread.
+
+    Attributes:
+        latency (float): Seconds waited before answering.
+        jitter (float): Maximum extra seconds added at random to the latency.
+        error_rate (float): Fraction of requests answered with a 500.
+        rate_limit_rate (float): Fraction of requests answered with a 429.
+        requests (int): Requests received.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        port: int = 0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                server._handle(self, json.loads(self.rfile.read(length) or b"{}"))
+
+        self._server = _Server(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name=type(self).__name__, daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, request: BaseHTTPRequestHandler, body) -> None:
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            draw = self._random.random()
+        time.sleep(delay)
+
+        if draw < self.error_rate:
+            self._send_json(request, 500, {"error": "injected failure"})
+        elif draw < self.error_rate + self.rate_limit_rate:
+            self._send_json(
+                request, 429, {"error": "rate limited"}, {"Retry-After": "0"}
+            )
+        else:
+            self.respond(request, body)
+
+    def respond(self, request: BaseHTTPRequestHandler, body) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def _send_json(request, status: int, data, headers=None) -> None:
+        payload = json.dumps(data).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+
+class MockOpenAIServer(MockServer):
+    """
+    Answers `POST /v1/chat/completions`, streamed or not.
+
+    Requests with `functions` get a function call, the others a short text.
+    Requests with `tools` get one call of every tool at once, with the
+    arguments of `TOOL_ARGUMENTS`, until the last message is a tool result.
+    Token usage is approximated from the request size.
+    """
+
+    CONTENT_CHUNKS = ["Hola", ", ¿en qué", " comuna", " buscas?"]
+    ARGUMENT_CHUNKS = ['{"lat": -33.45', ', "long": -70.64', ', "usableArea": 80}']
+    TOOL_ARGUMENTS = {
+        "tasar_propiedad": {
+            "lat": -33.45,
+            "long": -70.64,
+            "propertyFamilyTypeId": 2,
+            "usableArea": 80,
+        },
+        "consultar_rol": {"role": "1234-22", "idCommune": 13101},
+    }
+
+    def __init__(self, *args, stream_interval: float = 0.0, **kwargs):
+        """
+        Initializes the server.
+
+        Args:
+            stream_interval (float): Seconds between streamed chunks.
+            *args, **kwargs: See MockServer.
+        """
+        super().__init__(*args, **kwargs)
+        self.stream_interval = stream_interval
+
+    @property
+    def chat_completions_url(self) -> str:
+        return f"{self.url}/v1/chat/completions"
+
+    def respond(self, request: BaseHTTPRequestHandler, body) -> None:
+        if urlparse(request.path).path != "/v1/chat/completions" or body is None:
+            self._send_json(request, 404, {"error": "not found"})
+            return
+
+        calls_function = bool(body.get("functions"))
+        prompt_tokens = int(request.headers.get("Content-Length") or 0) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": 12,
+            "total_tokens": prompt_tokens + 12,
+        }
+
+        if body.get("tools") and not body.get("stream"):
+            if body["messages"] and body["messages"][-1].get("role") == "tool":
+                message = {"role": "assistant", "content": "".join(self.CONTENT_CHUNKS)}
+            else:
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{index}",
+                            "type": "function",
+                            "function": {
+                                "name": name,
+                                "arguments": json.dumps(
+                                    self.TOOL_ARGUMENTS.get(name, {})
+                                ),
+                            },
+                        }
+                        for index, name in enumerate(
+                            tool["function"]["name"] for tool in body["tools"]
+                        )
+                    ],
+                }
+            self._send_json(
+                request,
+                200,
+                {
+                    "choices": [
+                        {"index": 0, "message": message, "finish_reason": "stop"}
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        if not body.get("stream"):
+            if calls_function:
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "function_call": {
+                        "name": body["functions"][0]["name"],
+                        "arguments": "".join(self.ARGUMENT_CHUNKS),
+                    },
+                }
+            else:
+                message = {"role": "assistant", "content": "".join(self.CONTENT_CHUNKS)}
+            self._send_json(
+                request,
+                200,
+                {
+                    "choices": [
+                        {"index": 0, "message": message, "finish_reason": "stop"}
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        if calls_function:
+            deltas = [{"function_call": {"name": body["functions"][0]["name"]}}]
+            deltas += [
+                {"function_call": {"arguments": chunk}}
+                for chunk in self.ARGUMENT_CHUNKS
+            ]
+        else:
+            deltas = [{"content": chunk} for chunk in self.CONTENT_CHUNKS]
+
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Connection", "close")
+        request.end_headers()
+        for delta in deltas:
+            event = {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            request.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            request.wfile.flush()
+            if self.stream_interval:
+                time.sleep(self.stream_interval)
+        events = [{"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({"choices": [], "usage": usage})
+        for event in events:
+            request.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        request.wfile.write(b"data: [DONE]\n\n")
+        request.close_connection = True
+
+
+class MockTocTocServer(MockServer):
+    """
+    Answers the TocToc gateway endpoints used by TocTocApiClient.
+
+    `/valorization/appraisal/sale` returns an appraisal proportional to the
+    usable area and `/info/role` the same role for every request. Other paths
+    echo their query parameters.
+    """
+
+    def respond(self, request: BaseHTTPRequestHandler, body) -> None:
+        url = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        if path.endswith("/valorization/appraisal/sale"):
+            area = float(query.get("usableArea", 0))
+            data = {"data": {"appraisal": {"value": round(area * 55.5, 2)}}}
+        elif path.endswith("/info/role"):
+            data = {"data": ROLE_DATA}
+        else:
+            data = {"path": url.path, "query": query, "body": body}
+        self._send_json(request, 200, data)
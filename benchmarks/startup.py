@@ -0,0 +1,238 @@
+"""
+Import time and memory of the project modules, each in a fresh interpreter.
+
+For every case a new Python process imports the module (and, for some cases,
+runs a first call such as starting a span) and reports the wall time, the
+resident memory added and which heavy dependencies ended up imported. Each
+case runs several times and the median is reported. Run from the repository
+root:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --check  # fail on regressions
+
+With `--check`, results are compared with `benchmarks/startup_thresholds.json`
+(`max_import_ms`, `max_rss_mb` and the `not_imported` modules per case) and
+the run exits with status 1 if any threshold is not met.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THRESHOLDS_FILE = os.path.join(os.path.dirname(__file__), "startup_thresholds.json")
+
+# Dependencies that should only be imported when they are used.
+HEAVY_MODULES = [
+    "phoenix",
+    "opentelemetry.sdk",
+    "opentelemetry.exporter",
+    "google.protobuf",
+    "numpy",
+    "sentence_transformers",
+    "torch",
+    "gradio",
+    "openai",
+    "http.server",
+]
+
+# Case name -> (statement timed, then statement timed after the import).
+CASES: Dict[str, Tuple[str, str]] = {
+    "toctoc.metrics": ("import toctoc.metrics", ""),
+    "toctoc.tracing": ("import toctoc.tracing", ""),
+    "toctoc.openai_client": ("import toctoc.openai_client", ""),
+    "toctoc.openai_client+first_span": (
+        "import toctoc.openai_client",
+        "toctoc.openai_client.TRACER.start_span('startup').end()",
+    ),
+    "client.api_client": ("import client.api_client", ""),
+    "chat.template": ("import chat.template", ""),
+    "chat.chatbot_client": ("import chat.chatbot_client", ""),
+    "chat.intent_router": ("import chat.intent_router", ""),
+}
+
+# Runs in the child process; prints one JSON line with the measurements.
+_PROBE = """
+import json, sys, time
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+before = rss_kb()
+started = time.perf_counter()
+exec({setup!r})
+imported = time.perf_counter()
+exec({first_call!r})
+finished = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_call_ms": (finished - imported) * 1000,
+    "rss_mb": rss_kb() / 1024,
+    "rss_delta_mb": (rss_kb() - before) / 1024,
+    "loaded": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+@dataclass
+class StartupResult:
+    """Median measurements of one case over several fresh processes."""
+
+    case: str
+    runs: int
+    import_ms: float
+    first_call_ms: float
+    rss_mb: float
+    rss_delta_mb: float
+    loaded: List[str]
+
+
+def measure(case: str, setup: str, first_call: str, env: Dict[str, str]) -> dict:
+    """
+    Runs one case in a new interpreter.
+
+    Returns:
+        dict: The measurements printed by the child process.
+
+    Raises:
+        RuntimeError: If the child process fails.
+    """
+    code = _PROBE.format(setup=setup, first_call=first_call, heavy=HEAVY_MODULES)
+    process = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"{case} failed:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run_case(case: str, repeat: int, env: Dict[str, str]) -> StartupResult:
+    """
+    Measures a case `repeat` times and keeps the median of each value.
+    """
+    setup, first_call = CASES[case]
+    samples = [measure(case, setup, first_call, env) for _ in range(repeat)]
+    return StartupResult(
+        case=case,
+        runs=repeat,
+        import_ms=statistics.median(s["import_ms"] for s in samples),
+        first_call_ms=statistics.median(s["first_call_ms"] for s in samples),
+        rss_mb=statistics.median(s["rss_mb"] for s in samples),
+        rss_delta_mb=statistics.median(s["rss_delta_mb"] for s in samples),
+        loaded=samples[-1]["loaded"],
+    )
+
+
+def check_thresholds(results: List[StartupResult], path: str) -> List[str]:
+    """
+    Compares the results with the thresholds of a JSON file.
+
+    The file maps case names to `max_import_ms`, `max_rss_mb` and
+    `not_imported` (modules that must not be loaded by the case).
+
+    Returns:
+        List[str]: One message per threshold not met.
+    """
+    with open(path) as file:
+        thresholds = json.load(file)
+    by_case = {result.case: result for result in results}
+    failures = []
+    for case, limits in thresholds.items():
+        result = by_case.get(case)
+        if result is None:
+            continue
+        if "max_import_ms" in limits and result.import_ms > limits["max_import_ms"]:
+            failures.append(
+                f"{case}: import {result.import_ms:.1f} ms "
+                f"> {limits['max_import_ms']} ms"
+            )
+        if "max_rss_mb" in limits and result.rss_mb > limits["max_rss_mb"]:
+            failures.append(
+                f"{case}: RSS {result.rss_mb:.1f} MB > {limits['max_rss_mb']} MB"
+            )
+        eager = sorted(set(limits.get("not_imported", [])) & set(result.loaded))
+        if eager:
+            failures.append(f"{case}: imports {', '.join(eager)}")
+    return failures
+
+
+def print_header() -> None:
+    print(
+        f"{'case':<34} {'import ms':>10} {'first ms':>9} {'RSS MB':>8} "
+        f"{'+RSS MB':>8}  heavy modules loaded"
+    )
+
+
+def print_row(r: StartupResult) -> None:
+    print(
+        f"{r.case:<34} {r.import_ms:>10.1f} {r.first_call_ms:>9.1f} "
+        f"{r.rss_mb:>8.1f} {r.rss_delta_mb:>8.1f}  {', '.join(r.loaded) or '-'}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Startup benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    parser.add_argument("--only", help="Run only the cases starting with this")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--check", action="store_true", help="Fail on regressions")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (ROOT, env.get("PYTHONPATH")) if path
+    )
+    # Spans started by the cases go to a throwaway spool, not a collector.
+    env["TOCTOC_SPAN_SPOOL"] = tempfile.mkdtemp(prefix="spans-")
+    # Compile once so the first run does not pay for the bytecode.
+    subprocess.run(
+        [sys.executable, "-m", "compileall", "-q", "toctoc", "chat", "client"],
+        cwd=ROOT,
+        check=False,
+    )
+
+    results = []
+    print_header()
+    for case in CASES:
+        if args.only and not case.startswith(args.only):
+            continue
+        result = run_case(case, args.repeat, env)
+        results.append(result)
+        print_row(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump([asdict(result) for result in results], file, indent=2)
+
+    if args.check:
+        failures = check_thresholds(results, args.thresholds)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        if failures:
+            return 1
+        print("All thresholds met")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,86 @@
 import requests
-from typing import List, Dict
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional
+from urllib.parse import urlparse
+
+from chat.compaction import HistoryCompactor
+from chat.template import TEMPLATES, template_key
+from toctoc.metrics import CONVERSATIONS, RequestTimer, record_token_usage
+from toctoc.streaming import (
+    OPENAI_CHAT_COMPLETIONS_URL,
+    ChatCompletionStream,
+    open_chat_completion_stream,
+)
+
+if TYPE_CHECKING:
+    # numpy and sentence-transformers are only needed when a cache is used.
+    from chat.prefetch import AppraisalPrefetcher
+    from chat.semantic_cache import SemanticCache
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client(api_key: str, api_url: str):
+    """
+    Return an AsyncOpenAI client shared by every Chatbot with the same key.
+
+    Args:
+        api_key (str): Your OpenAI API key
+        api_url (str): The chat completions endpoint
+
+    Returns:
+        openai.AsyncOpenAI: The client, pooling connections across sessions
+    """
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=api_key, base_url=api_url.removesuffix("/chat/completions")
+    )
 
 
 class Chatbot:
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-3.5-turbo",
+        compactor: Optional[HistoryCompactor] = None,
+        semantic_cache: Optional["SemanticCache"] = None,
+        api_url: str = OPENAI_CHAT_COMPLETIONS_URL,
+        prefetcher: Optional["AppraisalPrefetcher"] = None,
+    ):
         """
         Initialize the chatbot with OpenAI API key and model.
 
         Args:
             api_key (str): Your OpenAI API key
             model (str): The model to use (default: gpt-3.5-turbo)
+            compactor (Optional[HistoryCompactor]): Keeps the history under a
+                token budget. If None, the history grows without limit
+            semantic_cache (Optional[SemanticCache]): Reuses answers to opening
+                messages similar to ones already answered for the same template
+            api_url (str): The chat completions endpoint
+            prefetcher (Optional[AppraisalPrefetcher]): Watches the messages of
+                the conversation and fetches role and appraisal data as soon
+                as enough slots are known
         """
         self.api_key = api_key
+        self.api_url = api_url
         self.model = model
+        self.compactor = compactor
+        self.semantic_cache = semantic_cache
+        self.prefetcher = prefetcher
         self.conversation_history: List[Dict[str, str]] = []
+        # Template of the current conversation, used as the metrics label
+        self.template_name = "none"
+        self._reset_compaction_state()
+
+    def _reset_compaction_state(self) -> None:
+        # Messages added before the first user turn are the template prefix.
+        self.prefix_length: Optional[int] = None
+        self.slots: Dict = {}
+        self.summary: Optional[str] = None
+        self.history_tokens = 0
+        self._token_counts: List[int] = []
+        self._has_memory = False
 
     def add_message(self, role: str, content: str) -> None:
         """
@@ -23,7 +90,58 @@ class Chatbot:
             role (str): The role of the message sender ("user" or "assistant")
             content (str): The message content
         """
-        self.conversation_history.append({"role": role, "content": content})
+        message = {"role": role, "content": content}
+        self.conversation_history.append(message)
+        if self.compactor is not None:
+            tokens = self.compactor.count_message(message)
+            self._token_counts.append(tokens)
+            self.history_tokens += tokens
+        # Template messages (before the first user turn) hold no slots.
+        if self.prefetcher is not None and self.prefix_length is not None:
+            self.prefetcher.observe(message)
+
+    def use_template(self, template_name: str) -> None:
+        """
+        Start a new conversation with a template's system prompt and examples.
+
+        Args:
+            template_name (str): Template file name (e.g. "busqueda.json")
+        """
+        self.clear_history()
+        template = TEMPLATES.get(template_name)
+        self.template_name = template.name
+        CONVERSATIONS.inc(template.name)
+        for message in template.messages:
+            self.add_message(message["role"], message["content"])
+
+    def _add_user_message(self, message: str) -> None:
+        """
+        Add a user message and compact the history if it exceeds the budget.
+        """
+        if self.prefix_length is None:
+            self.prefix_length = len(self.conversation_history)
+        self.add_message("user", message)
+
+        if self.compactor is None:
+            return
+        if self.history_tokens <= self.compactor.token_budget:
+            return
+
+        history = self.compactor.compact(
+            self.conversation_history,
+            self._token_counts,
+            self.prefix_length,
+            self._has_memory,
+            self.slots,
+            self.summary,
+        )
+        if history[0] is self.conversation_history:
+            return
+        self.conversation_history, self._token_counts, self.slots, self.summary = (
+            history
+        )
+        self._has_memory = True
+        self.history_tokens = sum(self._token_counts)
 
     def get_response(self, message: str) -> str:
         """
@@ -35,8 +153,27 @@ class Chatbot:
         Returns:
             str: The chatbot's response
         """
+        # Only the opening message is cached, later turns depend on the history
+        cache_key = None
+        if self.semantic_cache is not None and (
+            self.prefix_length in (None, len(self.conversation_history))
+        ):
+            cache_key = template_key(self.conversation_history, self.model)
+
         # Add user message to history
-        self.add_message("user", message)
+        self._add_user_message(message)
+
+        if cache_key is not None:
+            try:
+                embedding = self.semantic_cache.embed(message)
+                cached = self.semantic_cache.lookup(cache_key, message, embedding)
+            except Exception:
+                # The cache is only a shortcut: if the embedding model cannot
+                # be loaded or fails, answer as on a miss, without storing.
+                cache_key, cached = None, None
+            if cached is not None:
+                self.add_message("assistant", cached)
+                return cached
 
         try:
             # Make direct API request to OpenAI
@@ -51,29 +188,131 @@ class Chatbot:
                 "temperature": 0.7,
             }
 
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-            )
+            with RequestTimer("openai", urlparse(self.api_url).path) as timer:
+                response = requests.post(
+                    self.api_url,
+                    headers=headers,
+                    json=payload,
+                )
+                timer.status = response.status_code
 
             response.raise_for_status()  # Raise exception for bad status codes
             data = response.json()
+            record_token_usage(self.template_name, data.get("usage"))
 
             # Extract the response text
             bot_response = data["choices"][0]["message"]["content"]
 
             # Add bot response to history
             self.add_message("assistant", bot_response)
+            if cache_key is not None:
+                self.semantic_cache.store(cache_key, message, bot_response, embedding)
 
             return bot_response
 
         except Exception as e:
             return f"Error: {str(e)}"
 
+    def stream_response(self, message: str) -> ChatCompletionStream:
+        """
+        Get a streamed response from the chatbot for the given message.
+
+        Iterating the returned stream (with `for` or `async for`) yields the
+        response text as it is generated. The full response is added to the
+        conversation history once the stream is exhausted.
+
+        Args:
+            message (str): The user's message
+
+        Returns:
+            ChatCompletionStream: The stream of response deltas
+
+        Raises:
+            Exception: If the API request fails
+        """
+        self._add_user_message(message)
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        payload = {
+            "model": self.model,
+            "messages": self.conversation_history,
+            "temperature": 0.7,
+        }
+
+        def on_close(stream: ChatCompletionStream) -> None:
+            record_token_usage(self.template_name, stream.usage)
+            if stream.error is None and stream.finish_reason is not None:
+                self.add_message("assistant", stream.content)
+
+        return open_chat_completion_stream(
+            self.api_url,
+            headers,
+            payload,
+            on_close=on_close,
+        )
+
+    async def astream_response(self, message: str) -> AsyncIterator[str]:
+        """
+        Get a streamed response without blocking the event loop.
+
+        Same as `stream_response`, but the request is made with the shared
+        AsyncOpenAI client, so a single event loop can serve many users.
+
+        Args:
+            message (str): The user's message
+
+        Yields:
+            str: The response text as it is generated
+
+        Raises:
+            openai.OpenAIError: If the API request fails
+        """
+        import openai
+
+        self._add_user_message(message)
+        client = get_async_openai_client(self.api_key, self.api_url)
+
+        content, finished, status = "", False, None
+        timer = RequestTimer("openai", urlparse(self.api_url).path).start()
+        try:
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=self.conversation_history,
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    record_token_usage(self.template_name, chunk.usage.model_dump())
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finished = finished or choice.finish_reason is not None
+                if choice.delta.content:
+                    content += choice.delta.content
+                    yield choice.delta.content
+            status = 200
+        except openai.APIStatusError as e:
+            status = e.status_code
+            raise
+        finally:
+            timer.finish(status)
+
+        if finished:
+            self.add_message("assistant", content)
+
     def clear_history(self) -> None:
         """Clear the conversation history."""
         self.conversation_history = []
+        if self.prefetcher is not None:
+            self.prefetcher.reset()
+        self.template_name = "none"
+        self._reset_compaction_state()
 
     def get_history(self) -> List[Dict[str, str]]:
         """
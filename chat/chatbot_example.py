@@ -1,5 +1,4 @@
-from chatbot_client import Chatbot
-from template import load_template
+from chat.chatbot_client import Chatbot
 import os
 from dotenv import load_dotenv
 
@@ -12,16 +11,8 @@ def main():
     api_key = os.getenv("OPENAI_API_KEY")
     chatbot = Chatbot(api_key)
 
-    # Load a template for real estate queries
-    template_data = load_template("busqueda.json")
-
-    # Add the system message from template
-    chatbot.add_message("system", template_data["content"])
-
-    # Add example conversations if present
-    if "examples" in template_data:
-        for example in template_data["examples"]:
-            chatbot.add_message(example["role"], example["content"])
+    # Load a template for real estate queries (system message and examples)
+    chatbot.use_template("busqueda.json")
 
     while True:
         # Get user input
@@ -0,0 +1,204 @@
+import json
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from toctoc.tools.tools import extract_json_objects
+
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def approximate_token_count(text: str) -> int:
+    """
+    Approximate the number of tokens of a text (about 4 characters per token).
+
+    Args:
+        text (str): The text to measure
+
+    Returns:
+        int: The approximate token count
+    """
+    return (len(text) + 3) // 4
+
+
+def keep_user_turns(messages: List[Dict[str, str]]) -> str:
+    """
+    Default summary of dropped turns: what the client wrote, verbatim.
+
+    Slot answers given as plain text (e.g. "3 dormitorios") are kept without
+    an extra model call. The assistant's questions are dropped.
+
+    Args:
+        messages (List[Dict[str, str]]): The dropped messages, preceded by the
+            previous summary as a system message, if any
+
+    Returns:
+        str: The previous summary followed by one line per user message
+    """
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if not content:
+            continue
+        if message.get("role") == "system":
+            lines.append(content)
+        elif message.get("role") == "user":
+            lines.append(f"Cliente: {content}")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    """
+    Keeps a conversation history under a token budget.
+
+    The template prefix (system prompt and examples) and the most recent
+    messages are kept verbatim. Older messages are replaced by a single system
+    message holding the slot values already collected (JSON objects found in
+    the dropped messages) and a summary of the dropped turns, which by default
+    keeps the client's messages (see `keep_user_turns`).
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 3000,
+        keep_recent: int = 6,
+        count_tokens: Callable[[str], int] = approximate_token_count,
+        summarize: Optional[Callable[[List[Dict[str, str]]], str]] = keep_user_turns,
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            token_budget (int): Maximum tokens of the history sent to the API
+            keep_recent (int): Number of recent messages always kept verbatim,
+                unless they alone exceed the budget
+            count_tokens (Callable[[str], int]): Token counter for a text
+            summarize (Optional[Callable]): Receives the messages being dropped
+                (preceded by the previous summary, if any) and returns a summary.
+                Defaults to `keep_user_turns`. If None, dropped turns are only
+                kept through their JSON slot values
+        """
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summarize = summarize
+        self._count_text = lru_cache(maxsize=4096)(count_tokens)
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        """
+        Count the tokens of a message, caching the result per content.
+
+        Args:
+            message (Dict[str, str]): A chat message
+
+        Returns:
+            int: The token count, including the per-message overhead
+        """
+        return self._count_text(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def memory_message(self, slots: Dict, summary: Optional[str]) -> Dict[str, str]:
+        """
+        Build the system message replacing the dropped turns.
+
+        Args:
+            slots (Dict): Slot values collected so far
+            summary (Optional[str]): Summary of the dropped turns
+
+        Returns:
+            Dict[str, str]: The system message
+        """
+        parts = []
+        if summary:
+            parts.append(f"Resumen de la conversación anterior: {summary}")
+        if slots:
+            parts.append(
+                "Datos ya recopilados del cliente: "
+                + json.dumps(slots, ensure_ascii=False)
+            )
+        return {"role": "system", "content": "\n".join(parts)}
+
+    def compact(
+        self,
+        history: List[Dict[str, str]],
+        token_counts: List[int],
+        prefix_length: int,
+        has_memory: bool,
+        slots: Dict,
+        summary: Optional[str],
+    ) -> Tuple[List[Dict[str, str]], List[int], Dict, Optional[str]]:
+        """
+        Drop older turns until the history fits the token budget, memory
+        message included.
+
+        Args:
+            history (List[Dict[str, str]]): The conversation history
+            token_counts (List[int]): Token count of each message in `history`
+            prefix_length (int): Number of leading template messages to keep
+            has_memory (bool): Whether `history[prefix_length]` is a memory
+                message from a previous compaction
+            slots (Dict): Slot values collected so far
+            summary (Optional[str]): Summary from a previous compaction
+
+        Returns:
+            Tuple: The new history, its token counts, the updated slots and the
+            updated summary. The history includes a memory message right after
+            the prefix whenever something was dropped
+        """
+        start = prefix_length + (1 if has_memory else 0)
+        prefix_tokens = sum(token_counts[:prefix_length])
+
+        keep = min(self.keep_recent, len(history) - start)
+        # Fewer recent messages are kept only if they alone exceed the budget.
+        while keep > 1 and (
+            prefix_tokens + sum(token_counts[len(history) - keep :])
+            > self.token_budget
+        ):
+            keep -= 1
+        if len(history) - keep == start:
+            return history, token_counts, slots, summary
+
+        # The memory grows with each message dropped, so keep fewer recent
+        # messages until the memory fits too (`summarize` runs once per try).
+        while True:
+            dropped_until = len(history) - keep
+            memory, new_slots, new_summary = self._memory(
+                history[start:dropped_until], slots, summary
+            )
+            memory_tokens = self.count_message(memory)
+            total = prefix_tokens + memory_tokens + sum(token_counts[dropped_until:])
+            if total <= self.token_budget or keep <= 1:
+                break
+            keep -= 1
+
+        new_history = (
+            history[:prefix_length] + [memory] + history[dropped_until:]
+        )
+        new_counts = (
+            token_counts[:prefix_length]
+            + [memory_tokens]
+            + token_counts[dropped_until:]
+        )
+        return new_history, new_counts, new_slots, new_summary
+
+    def _memory(
+        self,
+        dropped: List[Dict[str, str]],
+        slots: Dict,
+        summary: Optional[str],
+    ) -> Tuple[Dict[str, str], Dict, Optional[str]]:
+        """
+        Build the memory message of the dropped messages.
+
+        Returns:
+            Tuple: The memory message, the updated slots and the updated summary
+        """
+        slots = dict(slots)
+        for message in dropped:
+            for found in extract_json_objects(message.get("content") or ""):
+                slots.update(found)
+
+        if self.summarize is not None:
+            previous = (
+                [{"role": "system", "content": summary}] if summary else []
+            )
+            summary = self.summarize(previous + dropped)
+
+        return self.memory_message(slots, summary), slots, summary
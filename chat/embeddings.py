@@ -0,0 +1,26 @@
+from threading import Lock
+from typing import Dict
+
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+_MODELS: Dict[str, object] = {}
+_MODELS_LOCK = Lock()
+
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL):
+    """
+    Load a sentence-transformers model once per process.
+
+    Args:
+        model_name (str): Name or path of the model
+
+    Returns:
+        SentenceTransformer: The shared model instance
+    """
+    if model_name not in _MODELS:
+        with _MODELS_LOCK:
+            if model_name not in _MODELS:
+                from sentence_transformers import SentenceTransformer
+
+                _MODELS[model_name] = SentenceTransformer(model_name)
+    return _MODELS[model_name]
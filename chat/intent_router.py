@@ -0,0 +1,176 @@
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from chat.embeddings import DEFAULT_MODEL, get_embedding_model
+from chat.template import TEMPLATES, get_openai_response
+
+# Example opening messages for each agent of the BASE template.
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "BUSQUEDA": [
+        "Quiero comprar una casa",
+        "Busco un departamento en arriendo en Providencia",
+        "Estoy buscando una casa con 3 habitaciones y jardín",
+        "¿Qué propiedades tienen disponibles en Viña del Mar?",
+        "Necesito un departamento cerca del metro",
+        "Quiero arrendar una oficina en Santiago Centro",
+        "Busco terreno para construir en el sur",
+        "Casa grande cerca de Valparaíso",
+    ],
+    "HIPOTECARIO": [
+        "Necesito un crédito para mi casa",
+        "¿Cuánto me prestan para comprar un departamento?",
+        "Quiero simular un crédito hipotecario",
+        "¿Qué tasa de interés tienen los préstamos para vivienda?",
+        "¿Cuánto pie necesito para comprar?",
+        "Quiero financiar la compra de una propiedad",
+        "¿A cuántos años puedo pedir el crédito?",
+        "Me interesa un préstamo hipotecario con mi sueldo",
+    ],
+    "TASAR": [
+        "¿Cuánto vale mi departamento?",
+        "Quiero tasar una propiedad",
+        "Necesito saber el precio de mi casa",
+        "¿En cuánto puedo vender mi casa?",
+        "Quiero una tasación de mi departamento en Ñuñoa",
+        "¿Cuál es el valor comercial de mi propiedad?",
+        "Quiero valorizar un terreno",
+        "¿Cuánto cuesta mi casa según el mercado?",
+    ],
+}
+
+
+def classify_with_llm(message: str) -> str:
+    """
+    Classify a message with the BASE template (one chat completion).
+
+    Args:
+        message (str): The user's first message
+
+    Returns:
+        str: The intent answered by the model
+    """
+    response = get_openai_response(message, TEMPLATES.get("base.json"), max_tokens=5)
+    return response.strip().strip(".").upper()
+
+
+@dataclass(slots=True)
+class RouteResult:
+    """
+    Intent chosen for a message.
+
+    Attributes:
+        intent (str): BUSQUEDA, HIPOTECARIO or TASAR
+        score (float): Cosine similarity with the intent centroid
+        margin (float): Difference with the second best intent
+        source (str): "embedding", or "llm" if the fallback decided
+    """
+
+    intent: str
+    score: float
+    margin: float
+    source: str
+
+
+class IntentRouter:
+    """
+    Local replacement for the BASE classification call.
+
+    Messages are embedded and compared with the centroid of each intent's
+    example messages. When the best intent does not win by at least
+    `min_margin`, the `fallback` classifier (by default the BASE template on
+    the LLM) decides instead.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        examples: Optional[Dict[str, List[str]]] = None,
+        min_margin: float = 0.05,
+        fallback: Optional[Callable[[str], str]] = classify_with_llm,
+        default_intent: str = "BUSQUEDA",
+    ):
+        """
+        Initialize the router. The model and centroids are loaded on first use.
+
+        Args:
+            model_name (str): sentence-transformers model used for embeddings
+            examples (Optional[Dict[str, List[str]]]): Example messages per
+                intent. Defaults to INTENT_EXAMPLES
+            min_margin (float): Minimum margin to trust the embedding decision
+            fallback (Optional[Callable[[str], str]]): Classifier used for low
+                margin messages. If None, the best intent is always returned
+            default_intent (str): Intent used when the fallback answers
+                something unknown, as the BASE template does
+        """
+        self.model_name = model_name
+        self.examples = examples or INTENT_EXAMPLES
+        self.min_margin = min_margin
+        self.fallback = fallback
+        self.default_intent = default_intent
+        self.intents = list(self.examples)
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = Lock()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        model = get_embedding_model(self.model_name)
+        return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """Normalized centroid of each intent, in the order of `intents`."""
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    centroids = np.stack(
+                        [
+                            self._encode(self.examples[intent]).mean(axis=0)
+                            for intent in self.intents
+                        ]
+                    )
+                    norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                    self._centroids = centroids / norms
+        return self._centroids
+
+    def route(self, message: str) -> RouteResult:
+        """
+        Choose the agent for a user's first message.
+
+        Args:
+            message (str): The user's first message
+
+        Returns:
+            RouteResult: The chosen intent
+        """
+        return self.route_batch([message])[0]
+
+    def route_batch(self, messages: List[str]) -> List[RouteResult]:
+        """
+        Choose the agent for several messages with a single embedding pass.
+
+        Args:
+            messages (List[str]): The messages to classify
+
+        Returns:
+            List[RouteResult]: One result per message, in the same order
+        """
+        if not messages:
+            return []
+        scores = self._encode(list(messages)) @ self.centroids.T
+        ranking = np.argsort(-scores, axis=1)
+
+        results = []
+        for message, row, order in zip(messages, scores, ranking):
+            best = float(row[order[0]])
+            margin = best - float(row[order[1]]) if len(order) > 1 else best
+            result = RouteResult(self.intents[order[0]], best, margin, "embedding")
+            if margin < self.min_margin and self.fallback is not None:
+                intent = self.fallback(message)
+                if intent not in self.examples:
+                    intent = self.default_intent
+                result.intent = intent
+                result.source = "llm"
+            results.append(result)
+        return results
@@ -0,0 +1,293 @@
+import re
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import astuple
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from client.api_client import (
+    APPRAISAL_PARAMETERS,
+    PropertyDetails,
+    RoleInformation,
+    TocTocApiClient,
+)
+from toctoc.metrics import METRICS
+from toctoc.tools.tools import extract_json_objects
+
+PREFETCHES = METRICS.counter(
+    "toctoc_prefetch_total",
+    "Speculative gateway calls by kind (role, appraisal) and outcome.",
+    ("kind", "outcome"),
+)
+
+# "-33.4569, -70.6483" written by the user.
+_COORDINATES = re.compile(r"(-?\d{1,2}\.\d{3,})\s*[,;]\s*(-?\d{1,3}\.\d{3,})")
+# "rol 1234-22", "el rol es el 1234-22".
+_ROLE = re.compile(r"\brol\b\D{0,20}?(\d{1,6}-\d{1,4})\b", re.IGNORECASE)
+
+SLOT_NAMES = set(APPRAISAL_PARAMETERS) | {"communeId", "idCommune"}
+
+
+@lru_cache(maxsize=None)
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    """
+    Return the worker pool shared by every AppraisalPrefetcher.
+
+    Returns:
+        ThreadPoolExecutor: A small pool, so speculative calls from many
+            sessions cannot flood the gateway
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="toctoc-prefetch")
+
+
+def extract_appraisal_slots(message: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Find appraisal slot values in a message.
+
+    JSON objects in any message contribute their appraisal fields (e.g. the
+    summary the TASAR agent prints for confirmation). User messages also
+    contribute coordinates and roles written as plain text.
+
+    Args:
+        message (Dict[str, str]): A conversation message
+
+    Returns:
+        Dict[str, Any]: Gateway parameter names (e.g. "usableArea") and values
+    """
+    content = message.get("content") or ""
+    slots: Dict[str, Any] = {}
+    if message.get("role") == "user":
+        coordinates = _COORDINATES.search(content)
+        if coordinates is not None:
+            lat, long = float(coordinates.group(1)), float(coordinates.group(2))
+            if -90 <= lat <= 90 and -180 <= long <= 180:
+                slots["lat"], slots["long"] = lat, long
+        role = _ROLE.search(content)
+        if role is not None:
+            slots["role"] = role.group(1)
+    if "{" in content:
+        for found in extract_json_objects(content):
+            slots.update(
+                (key, value)
+                for key, value in found.items()
+                if key in SLOT_NAMES and value not in (None, "")
+            )
+    return slots
+
+
+class _Prefetch:
+    __slots__ = ("key", "future", "started_at", "used")
+
+    def __init__(self, key: Hashable, future: Future):
+        self.key = key
+        self.future = future
+        self.started_at = time.monotonic()
+        self.used = False
+
+
+class AppraisalPrefetcher:
+    """
+    Speculatively fetches role and appraisal data while a TASAR conversation
+    is still collecting slots.
+
+    Each observed message updates the slots. As soon as the role and commune
+    are known, `get_role_information` starts in the background, and as soon
+    as the coordinates, property type and usable area are known,
+    `get_sale_appraisal` does too. When a slot changes, the outdated call is
+    cancelled (or, if already sent, counted as wasted) and a new one starts.
+    Failed calls and calls older than `max_age` are refreshed.
+
+    The final lookups (`get_sale_appraisal`, `get_role_information`) use the
+    prefetched result when it was made with the same inputs (a hit) and call
+    the gateway otherwise (a miss).
+    """
+
+    def __init__(
+        self,
+        api_client: TocTocApiClient,
+        executor: Optional[Executor] = None,
+        max_age: float = 300.0,
+    ):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            api_client (TocTocApiClient): The client making the calls
+            executor (Optional[Executor]): Runs the calls. Defaults to a pool
+                shared by every prefetcher, see `get_prefetch_executor`
+            max_age (float): Seconds after which a prefetched result is
+                fetched again
+        """
+        self.api_client = api_client
+        self.executor = executor or get_prefetch_executor()
+        self.max_age = max_age
+        self.slots: Dict[str, Any] = {}
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self._prefetches: Dict[str, _Prefetch] = {}
+        self._lock = Lock()
+
+    def _count(self, kind: str, outcome: str) -> None:
+        self.counts[(kind, outcome)] = self.counts.get((kind, outcome), 0) + 1
+        PREFETCHES.inc(kind, outcome)
+
+    def observe(self, message: Dict[str, str]) -> None:
+        """
+        Update the slots with a new conversation message and refresh the
+        prefetched calls.
+
+        Args:
+            message (Dict[str, str]): The message added to the conversation
+        """
+        slots = extract_appraisal_slots(message)
+        if slots:
+            self.update(slots)
+
+    def update(self, slots: Dict[str, Any]) -> None:
+        """
+        Merge slot values and refresh the prefetched calls.
+
+        Args:
+            slots (Dict[str, Any]): Gateway parameter names and values
+        """
+        with self._lock:
+            self.slots.update(slots)
+            role_key = self.role_key()
+            if role_key is not None:
+                role, id_commune = role_key
+                self._prefetch(
+                    "role",
+                    role_key,
+                    lambda: self.api_client.get_role_information(role, id_commune),
+                )
+            details = self.property_details()
+            if details is not None:
+                self._prefetch(
+                    "appraisal",
+                    astuple(details),
+                    lambda: self.api_client.get_sale_appraisal(details),
+                )
+
+    def role_key(self) -> Optional[Tuple[str, int]]:
+        """The (role, id_commune) of the current slots, if both are known."""
+        commune = self.slots.get("idCommune", self.slots.get("communeId"))
+        if self.slots.get("role") is None or commune is None:
+            return None
+        try:
+            return str(self.slots["role"]), int(commune)
+        except (TypeError, ValueError):
+            return None
+
+    def property_details(self) -> Optional[PropertyDetails]:
+        """The details of the current slots, if enough are known to appraise."""
+        try:
+            details = PropertyDetails.from_params(self.slots)
+            if -90 <= details.latitude <= 90 and -180 <= details.longitude <= 180:
+                return details
+        except (TypeError, ValueError):
+            pass
+        return None
+
+    def _prefetch(self, kind: str, key: Hashable, fetch: Callable[[], Any]) -> None:
+        """
+        Start a call for `key`, unless an up to date one is running or done.
+        """
+        current = self._prefetches.get(kind)
+        if current is not None:
+            fresh = time.monotonic() - current.started_at < self.max_age
+            failed = current.future.done() and (
+                current.future.cancelled() or current.future.exception() is not None
+            )
+            if current.key == key and fresh and not failed:
+                return
+            self._discard(kind, current)
+        self._prefetches[kind] = _Prefetch(key, self.executor.submit(fetch))
+        self._count(kind, "started")
+
+    def _discard(self, kind: str, prefetch: _Prefetch) -> None:
+        if prefetch.used:
+            return
+        if prefetch.future.cancel():
+            self._count(kind, "cancelled")
+        else:
+            self._count(kind, "wasted")
+
+    def _take(self, kind: str, key: Hashable) -> Optional[Future]:
+        """Return the prefetched call made with `key`, marking it used."""
+        with self._lock:
+            prefetch = self._prefetches.get(kind)
+            if prefetch is None or prefetch.key != key or prefetch.future.cancelled():
+                self._count(kind, "miss")
+                return None
+            prefetch.used = True
+            self._count(kind, "hit")
+            return prefetch.future
+
+    def get_role_information(self, role: str, id_commune: int) -> RoleInformation:
+        """
+        Get role information, from the prefetched call if it matches.
+
+        Raises:
+            RoleNotFoundError: If the role does not exist in the commune
+            requests.exceptions.RequestException: If the API request fails
+        """
+        future = self._take("role", (str(role), int(id_commune)))
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # Speculative failures are retried below, like a miss.
+        return self.api_client.get_role_information(role, id_commune)
+
+    def get_sale_appraisal(
+        self, property_details: Optional[PropertyDetails] = None
+    ) -> Dict[Any, Any]:
+        """
+        Get the sale appraisal, from the prefetched call if it matches.
+
+        Args:
+            property_details (Optional[PropertyDetails]): The property to
+                appraise. Defaults to the details of the current slots
+
+        Raises:
+            ValueError: If no details are given and the slots are incomplete
+            requests.exceptions.RequestException: If the API request fails
+        """
+        if property_details is None:
+            property_details = PropertyDetails.from_params(self.slots)
+        future = self._take("appraisal", astuple(property_details))
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # Speculative failures are retried below, like a miss.
+        return self.api_client.get_sale_appraisal(property_details)
+
+    def reset(self) -> None:
+        """
+        Forget the slots and discard the calls not used, e.g. when a new
+        conversation starts.
+        """
+        with self._lock:
+            for kind, prefetch in self._prefetches.items():
+                self._discard(kind, prefetch)
+            self._prefetches = {}
+            self.slots = {}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return, per kind, the calls started, hits, misses, wasted and
+        cancelled calls, and the hit rate of the final lookups.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+        stats = {}
+        for kind in ("role", "appraisal"):
+            values = {
+                outcome: counts.get((kind, outcome), 0)
+                for outcome in ("started", "hit", "miss", "wasted", "cancelled")
+            }
+            lookups = values["hit"] + values["miss"]
+            values["hit_rate"] = values["hit"] / lookups if lookups else 0.0
+            stats[kind] = values
+        return stats
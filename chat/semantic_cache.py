@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from chat.embeddings import DEFAULT_MODEL, get_embedding_model
+
+
+class _TemplateIndex:
+    """Embeddings and answers cached for one template."""
+
+    def __init__(self, dimension: int, capacity: int = 64):
+        self.embeddings = np.empty((capacity, dimension), dtype=np.float32)
+        self.size = 0
+        self.prompts: List[str] = []
+        self.responses: List[str] = []
+        self.created: List[float] = []
+        self.last_used: List[float] = []
+
+    def add(self, embedding: np.ndarray, prompt: str, response: str, now: float):
+        if self.size == len(self.embeddings):
+            grown = np.empty(
+                (2 * len(self.embeddings), self.embeddings.shape[1]), dtype=np.float32
+            )
+            grown[: self.size] = self.embeddings[: self.size]
+            self.embeddings = grown
+        self.embeddings[self.size] = embedding
+        self.size += 1
+        self.prompts.append(prompt)
+        self.responses.append(response)
+        self.created.append(now)
+        self.last_used.append(now)
+
+    def remove(self, position: int) -> None:
+        # Swap with the last entry so removal stays O(1).
+        last = self.size - 1
+        self.embeddings[position] = self.embeddings[last]
+        for values in (self.prompts, self.responses, self.created, self.last_used):
+            values[position] = values[last]
+            values.pop()
+        self.size -= 1
+
+
+class SemanticCache:
+    """
+    Cache of completions for prompts that mean the same thing.
+
+    Prompts are embedded with sentence-transformers and compared (cosine
+    similarity) with the prompts already answered for the same template key.
+    A cached answer is reused when the similarity reaches `threshold`.
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`. The cache can be saved to and loaded from an
+    `.npz` file.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        ttl: float = 24 * 3600,
+        model_name: str = DEFAULT_MODEL,
+    ):
+        """
+        Initialize the cache, loading `path` if it exists.
+
+        Args:
+            path (Optional[str]): `.npz` file used by `save` and `load`
+            threshold (float): Minimum cosine similarity for a hit
+            max_entries (int): Maximum cached answers across all templates
+            ttl (float): Seconds an answer stays valid
+            model_name (str): sentence-transformers model used for embeddings
+        """
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_name = model_name
+
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[str, _TemplateIndex] = {}
+        self._size = 0
+        self._lock = Lock()
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def embed(self, prompt: str) -> np.ndarray:
+        """Return the normalized embedding of a prompt."""
+        model = get_embedding_model(self.model_name)
+        return model.encode(
+            [prompt], normalize_embeddings=True, convert_to_numpy=True
+        )[0].astype(np.float32)
+
+    def lookup(
+        self, key: str, prompt: str, embedding: Optional[np.ndarray] = None
+    ) -> Optional[str]:
+        """
+        Return the cached answer of the most similar prompt, if close enough.
+
+        Args:
+            key (str): Template key, see `chat.template.template_key`
+            prompt (str): The user's prompt
+            embedding (Optional[np.ndarray]): Precomputed `embed(prompt)`
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss
+        """
+        if embedding is None:
+            embedding = self.embed(prompt)
+        now = time.time()
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.size:
+                scores = index.embeddings[: index.size] @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    if now - index.created[best] <= self.ttl:
+                        index.last_used[best] = now
+                        self.hits += 1
+                        return index.responses[best]
+                    index.remove(best)
+                    self._size -= 1
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        key: str,
+        prompt: str,
+        response: str,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Cache the answer to a prompt.
+
+        Args:
+            key (str): Template key, see `chat.template.template_key`
+            prompt (str): The user's prompt
+            response (str): The completion to reuse for similar prompts
+            embedding (Optional[np.ndarray]): Precomputed `embed(prompt)`
+        """
+        if embedding is None:
+            embedding = self.embed(prompt)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = _TemplateIndex(len(embedding))
+            index.add(embedding, prompt, response, time.time())
+            self._size += 1
+            while self._size > self.max_entries:
+                self._evict_one()
+
+    def _evict_one(self) -> None:
+        """Remove the least recently used entry across all templates."""
+        oldest_key, oldest_position, oldest_time = None, -1, float("inf")
+        for key, index in self._indexes.items():
+            if not index.size:
+                continue
+            position = int(np.argmin(index.last_used))
+            if index.last_used[position] < oldest_time:
+                oldest_key, oldest_position = key, position
+                oldest_time = index.last_used[position]
+        self._indexes[oldest_key].remove(oldest_position)
+        self._size -= 1
+
+    def get_or_compute(self, key: str, prompt: str, compute: Callable[[], str]) -> str:
+        """
+        Return the cached answer for a prompt, or compute and cache it.
+
+        Args:
+            key (str): Template key, see `chat.template.template_key`
+            prompt (str): The user's prompt
+            compute (Callable[[], str]): Produces the answer on a miss
+
+        Returns:
+            str: The cached or computed answer
+        """
+        embedding = self.embed(prompt)
+        response = self.lookup(key, prompt, embedding)
+        if response is None:
+            response = compute()
+            self.store(key, prompt, response, embedding)
+        return response
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, hit rate and number of cached answers."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+            "templates": len(self._indexes),
+        }
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write every non-expired entry to an `.npz` file."""
+        path = path or self.path
+        now = time.time()
+        embeddings, meta = [], []
+        with self._lock:
+            for key, index in self._indexes.items():
+                for i in range(index.size):
+                    if now - index.created[i] > self.ttl:
+                        continue
+                    embeddings.append(index.embeddings[i])
+                    meta.append(
+                        [key, index.prompts[i], index.responses[i], index.created[i]]
+                    )
+        with open(path, "wb") as file:
+            np.savez(
+                file,
+                embeddings=np.array(embeddings, dtype=np.float32),
+                meta=np.array(json.dumps(meta, ensure_ascii=False)),
+            )
+
+    def load(self, path: Optional[str] = None) -> None:
+        """Add the non-expired entries of an `.npz` file to the cache."""
+        path = path or self.path
+        now = time.time()
+        with np.load(path) as data:
+            embeddings = data["embeddings"]
+            meta = json.loads(str(data["meta"]))
+        with self._lock:
+            for embedding, (key, prompt, response, created) in zip(embeddings, meta):
+                if now - created > self.ttl:
+                    continue
+                index = self._indexes.get(key)
+                if index is None:
+                    index = self._indexes[key] = _TemplateIndex(len(embedding))
+                index.add(embedding, prompt, response, created)
+                self._size += 1
+            while self._size > self.max_entries:
+                self._evict_one()
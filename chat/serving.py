@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from toctoc.metrics import METRICS
+
+QUEUE_DEPTH = METRICS.gauge(
+    "toctoc_chat_queue_depth", "Chat requests waiting for a worker."
+)
+ACTIVE_REQUESTS = METRICS.gauge(
+    "toctoc_chat_active_requests", "Chat requests being answered."
+)
+QUEUE_WAIT_SECONDS = METRICS.histogram(
+    "toctoc_chat_queue_wait_seconds", "Time chat requests waited for a worker."
+)
+SHED_REQUESTS = METRICS.counter(
+    "toctoc_chat_shed_total",
+    "Chat requests rejected because the queue was full.",
+    ("reason",),
+)
+
+
+class QueueFullError(Exception):
+    """Raised when a chat request is rejected to protect the service."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Chat request rejected: {reason}")
+        self.reason = reason
+
+
+class ChatScheduler:
+    """
+    Admission control for chat requests served from one event loop.
+
+    At most `max_concurrency` requests are answered at a time. Requests beyond
+    that wait in a queue of at most `max_queue` entries and are rejected with
+    QueueFullError when it is full, or when their user already has
+    `max_queued_per_user` requests waiting. Free workers are handed out round
+    robin across users, so one busy user cannot starve the others.
+
+    Usage:
+        async with scheduler.slot(user_id):
+            ...
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue: int = 64,
+        max_queued_per_user: int = 2,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency (int): Requests answered at the same time
+            max_queue (int): Requests allowed to wait for a worker
+            max_queued_per_user (int): Requests one user may have waiting
+
+        Raises:
+            ValueError: If max_concurrency is lower than 1
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+
+        self.active = 0
+        self.queued = 0
+        self.served = 0
+        self.shed = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def slot(self, user_id: str) -> "_Slot":
+        """Return an async context manager holding a worker for `user_id`."""
+        return _Slot(self, user_id)
+
+    def _reject(self, reason: str) -> None:
+        self.shed += 1
+        SHED_REQUESTS.inc(reason)
+        raise QueueFullError(reason)
+
+    async def acquire(self, user_id: str) -> None:
+        """
+        Wait for a worker.
+
+        Raises:
+            QueueFullError: If the request is rejected
+        """
+        if self.active < self.max_concurrency and not self.queued:
+            self._start()
+            QUEUE_WAIT_SECONDS.observe(0.0)
+            return
+
+        if self.queued >= self.max_queue:
+            self._reject("queue_full")
+        waiting = self._waiting.get(user_id)
+        if waiting is not None and len(waiting) >= self.max_queued_per_user:
+            self._reject("user_limit")
+
+        future = asyncio.get_running_loop().create_future()
+        if waiting is None:
+            waiting = self._waiting[user_id] = deque()
+        waiting.append(future)
+        self.queued += 1
+        QUEUE_DEPTH.inc()
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The worker was handed over just before the cancellation.
+                self.release()
+            else:
+                self._forget(user_id, future)
+            raise
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+    def _forget(self, user_id: str, future: asyncio.Future) -> None:
+        waiting = self._waiting.get(user_id)
+        if waiting is not None and future in waiting:
+            waiting.remove(future)
+            self.queued -= 1
+            QUEUE_DEPTH.dec()
+            if not waiting:
+                del self._waiting[user_id]
+
+    def _start(self) -> None:
+        self.active += 1
+        ACTIVE_REQUESTS.inc()
+
+    def release(self) -> None:
+        """Free a worker and hand it to the next user in round robin order."""
+        self.active -= 1
+        self.served += 1
+        ACTIVE_REQUESTS.dec()
+        while self._waiting and self.active < self.max_concurrency:
+            user_id, waiting = next(iter(self._waiting.items()))
+            future = waiting.popleft()
+            self.queued -= 1
+            QUEUE_DEPTH.dec()
+            # The user goes to the back of the line.
+            del self._waiting[user_id]
+            if waiting:
+                self._waiting[user_id] = waiting
+            if not future.done():
+                self._start()
+                future.set_result(None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of active, queued, served and shed requests."""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "served": self.served,
+            "shed": self.shed,
+            "users_waiting": len(self._waiting),
+        }
+
+
+class _Slot:
+    __slots__ = ("scheduler", "user_id")
+
+    def __init__(self, scheduler: ChatScheduler, user_id: str):
+        self.scheduler = scheduler
+        self.user_id = user_id
+
+    async def __aenter__(self) -> None:
+        await self.scheduler.acquire(self.user_id)
+
+    async def __aexit__(self, *exc_info) -> Optional[bool]:
+        self.scheduler.release()
+        return None
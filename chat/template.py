@@ -1,30 +1,179 @@
+import hashlib
 import json
 import os
+import time
+from dataclasses import dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Dict, List, Tuple, Mapping
+from urllib.parse import urlparse
+
 import requests
 from dotenv import load_dotenv
 
+from toctoc.metrics import RequestTimer, record_token_usage
+from toctoc.streaming import OPENAI_CHAT_COMPLETIONS_URL
+
 # Load environment variables
 load_dotenv()
 
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
+
+
+def template_key(messages: List[Dict[str, str]], model: str = "") -> str:
+    """
+    Build the cache key of a prompt prefix (system prompt and examples).
+
+    Args:
+        messages (List[Dict[str, str]]): The messages sent before the prompt
+        model (str): The completion model, answers are not shared across models
+
+    Returns:
+        str: A short stable hash of the prefix and model
+    """
+    data = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True, slots=True)
+class Template:
+    """
+    A parsed template with its prebuilt message prefix.
+
+    Attributes:
+        name (str): File name of the template (e.g. "busqueda.json")
+        content (str): The system prompt
+        messages (Tuple[Mapping[str, str], ...]): Read-only system prompt and
+            example messages, in the order they are sent to the API
+    """
+
+    name: str
+    content: str
+    messages: Tuple[Mapping[str, str], ...]
+
+    def prefix(self) -> List[Dict[str, str]]:
+        """Return a mutable copy of the message prefix."""
+        return [dict(message) for message in self.messages]
+
+    def to_dict(self) -> dict:
+        """Return the template in the JSON file format."""
+        data = {"role": "system", "content": self.content}
+        if len(self.messages) > 1:
+            data["examples"] = self.prefix()[1:]
+        return data
+
+
+def _build_template(name: str, data: dict) -> Template:
+    messages = [{"role": "system", "content": data["content"]}]
+    messages.extend(data.get("examples", []))
+    return Template(
+        name=name,
+        content=data["content"],
+        messages=tuple(MappingProxyType(dict(m)) for m in messages),
+    )
+
+
+class TemplateRegistry:
+    """
+    Loads every template of a directory once and reloads it when it changes.
 
-def get_openai_response(prompt, template_data, model="gpt-3.5-turbo", max_tokens=150):
+    File modification times are checked at most every `check_interval`
+    seconds, so getting a template usually costs a dict lookup. The returned
+    Template objects are immutable and shared, which keeps prefixes identical
+    across requests.
+    """
+
+    def __init__(self, directory: str = TEMPLATES_DIR, check_interval: float = 1.0):
+        """
+        Initialize the registry. Templates are loaded on first use.
+
+        Args:
+            directory (str): Directory containing the `*.json` templates
+            check_interval (float): Minimum seconds between mtime checks
+        """
+        self.directory = directory
+        self.check_interval = check_interval
+        self._templates: Dict[str, Tuple[Template, int]] = {}
+        self._last_check = float("-inf")
+        self._lock = Lock()
+
+    def _refresh(self) -> None:
+        loaded = {}
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, file_name)
+            mtime = os.stat(path).st_mtime_ns
+            current = self._templates.get(file_name)
+            if current is not None and current[1] == mtime:
+                loaded[file_name] = current
+                continue
+            with open(path, "r") as file:
+                loaded[file_name] = (_build_template(file_name, json.load(file)), mtime)
+        self._templates = loaded
+
+    def get(self, template_name: str) -> Template:
+        """
+        Get a template by file name, with or without the `.json` extension.
+
+        Args:
+            template_name (str): e.g. "busqueda.json" or "busqueda"
+
+        Returns:
+            Template: The parsed template
+
+        Raises:
+            KeyError: If there is no such template
+        """
+        if not template_name.endswith(".json"):
+            template_name = f"{template_name}.json"
+        self._check()
+        return self._templates[template_name][0]
+
+    def names(self) -> List[str]:
+        """Return the file names of the available templates."""
+        self._check()
+        return sorted(self._templates)
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            with self._lock:
+                if now - self._last_check >= self.check_interval:
+                    self._refresh()
+                    self._last_check = now
+
+
+TEMPLATES = TemplateRegistry()
+
+
+def get_openai_response(
+    prompt, template_data, model="gpt-3.5-turbo", max_tokens=150, cache=None
+):
     """
     Get response from OpenAI API using template data
+
+    `template_data` is either a Template from the registry or a template dict
+    as returned by `load_template`.
+
+    If a SemanticCache is given, prompts similar enough to one already answered
+    for the same template, model and max_tokens reuse the cached answer.
     """
     # API configuration
     api_key = os.getenv("OPENAI_API_KEY")
-    url = "https://api.openai.com/v1/chat/completions"
+    url = OPENAI_CHAT_COMPLETIONS_URL
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
     # Create messages array using template
-    messages = [
-        {"role": "system", "content": template_data["content"]},
-        {"role": "user", "content": prompt},
-    ]
-
-    # Add example conversations if present in template
-    if "examples" in template_data:
-        messages[1:1] = template_data["examples"]
+    if isinstance(template_data, Template):
+        messages = template_data.prefix()
+        template_name = template_data.name
+    else:
+        template_name = template_data.get("name", "custom")
+        messages = [{"role": "system", "content": template_data["content"]}]
+        # Add example conversations if present in template
+        messages.extend(template_data.get("examples", []))
+    messages.append({"role": "user", "content": prompt})
 
     # Request payload
     data = {
@@ -33,32 +182,37 @@ def get_openai_response(prompt, template_data, model="gpt-3.5-turbo", max_tokens
         "max_tokens": max_tokens,
     }
 
-    # Make API request
-    response = requests.post(url, headers=headers, json=data)
+    def request():
+        # Make API request
+        with RequestTimer("openai", urlparse(url).path) as timer:
+            response = requests.post(url, headers=headers, json=data)
+            timer.status = response.status_code
 
-    if response.status_code == 200:
-        response_data = response.json()
-        return response_data["choices"][0]["message"]["content"].strip()
-    else:
-        raise Exception(f"API error: {response.status_code}\n{response.text}")
+        if response.status_code == 200:
+            response_data = response.json()
+            record_token_usage(template_name, response_data.get("usage"))
+            return response_data["choices"][0]["message"]["content"].strip()
+        else:
+            raise Exception(f"API error: {response.status_code}\n{response.text}")
+
+    if cache is not None:
+        key = template_key(messages[:-1], f"{model}:{max_tokens}")
+        return cache.get_or_compute(key, prompt, request)
+    return request()
 
 
 def load_template(template_name):
     """
     Load JSON template from templates directory
     """
-    template_path = os.path.join(
-        os.path.dirname(__file__), "..", "templates", template_name
-    )
-    with open(template_path, "r") as file:
-        return json.load(file)
+    return TEMPLATES.get(template_name).to_dict()
 
 
 def main():
     try:
         # Load template first
-        template_data = load_template("busqueda.json")
-        print(template_data)
+        template_data = TEMPLATES.get("busqueda.json")
+        print(template_data.to_dict())
         # Example usage with template
         prompt = "quiero una casa en santiago centro, 3 habitaciones, 2 baños, 2 estacionamientos"
         response = get_openai_response(prompt, template_data)
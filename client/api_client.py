@@ -1,7 +1,58 @@
 import requests
-from typing import Optional, Dict, Any, List, TypedDict
+from typing import Optional, Dict, Any, List, TypedDict, TYPE_CHECKING
 from dataclasses import dataclass
 
+from client.single_flight import SingleFlight, request_key
+from toctoc.metrics import RequestTimer
+
+if TYPE_CHECKING:
+    from client.appraisal_cache import AppraisalCache
+    from client.policy import RequestPolicy
+    from client.role_cache import RoleCache
+
+
+# Appraisal query parameters of the gateway and their PropertyDetails fields.
+APPRAISAL_PARAMETERS = {
+    "lat": "latitude",
+    "long": "longitude",
+    "propertyFamilyTypeId": "property_family_type_id",
+    "usableArea": "usable_area",
+    "balconyArea": "balcony_area",
+    "parkingLots": "parking_lots",
+    "bedrooms": "bedrooms",
+    "bathrooms": "bathrooms",
+    "yearConstruction": "year_construction",
+    "warehouse": "warehouse",
+    "commonExpense": "common_expense",
+    "role": "role",
+}
+REQUIRED_APPRAISAL_PARAMETERS = ("lat", "long", "propertyFamilyTypeId", "usableArea")
+
+
+def _as_int(value: Any) -> int:
+    """Convert an integer written as a number or a string (e.g. "2", 2.0)."""
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"Not an integer: {value!r}")
+    return int(number)
+
+
+# Converters of the appraisal parameters to their PropertyDetails field types.
+APPRAISAL_PARAMETER_TYPES = {
+    "lat": float,
+    "long": float,
+    "propertyFamilyTypeId": _as_int,
+    "usableArea": float,
+    "balconyArea": float,
+    "parkingLots": _as_int,
+    "bedrooms": _as_int,
+    "bathrooms": _as_int,
+    "yearConstruction": _as_int,
+    "warehouse": _as_int,
+    "commonExpense": float,
+    "role": str,
+}
+
 
 @dataclass
 class PropertyDetails:
@@ -18,8 +69,37 @@ class PropertyDetails:
     common_expense: Optional[float] = None
     role: Optional[str] = None
 
+    @classmethod
+    def from_params(cls, params: Dict[str, Any]) -> "PropertyDetails":
+        """Build the details from gateway parameter names (e.g. "usableArea").
 
-@dataclass
+        Values are converted to the field types, so values written as
+        strings (e.g. "lat": "-33.4") are accepted. Unknown and None
+        parameters are ignored.
+
+        Raises:
+            ValueError: If a required parameter is missing or a value cannot
+                be converted
+        """
+        missing = [
+            name for name in REQUIRED_APPRAISAL_PARAMETERS if params.get(name) is None
+        ]
+        if missing:
+            raise ValueError(f"Missing appraisal parameters: {', '.join(missing)}")
+        values = {}
+        for name, field in APPRAISAL_PARAMETERS.items():
+            if params.get(name) is None:
+                continue
+            try:
+                values[field] = APPRAISAL_PARAMETER_TYPES[name](params[name])
+            except (TypeError, ValueError):
+                raise ValueError(
+                    f"Invalid appraisal parameter {name}: {params[name]!r}"
+                ) from None
+        return cls(**values)
+
+
+@dataclass(slots=True)
 class RegisterReference:
     register_commune: int
     register_block: int
@@ -29,7 +109,7 @@ class RegisterReference:
     register_site_common_property: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Address:
     name_commune: str
     id_commune: int
@@ -37,14 +117,14 @@ class Address:
     street: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Finances:
     fiscal_appraisal: float
     semiannual_contribution: float
     exempt_appraisal: float
 
 
-@dataclass
+@dataclass(slots=True)
 class Information:
     total_area: float
     area_of_construction_line: float
@@ -52,19 +132,19 @@ class Information:
     max_year_of_construction: int
 
 
-@dataclass
+@dataclass(slots=True)
 class HousingType:
     housing_type_name: str
     housing_type_code: str
     housing_type_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Location:
     coordinates: List[float]
 
 
-@dataclass
+@dataclass(slots=True)
 class RoleInformation:
     register_reference: RegisterReference
     address: Address
@@ -74,17 +154,105 @@ class RoleInformation:
     location: Location
 
 
+def parse_role_information(data: Dict[str, Any]) -> RoleInformation:
+    """Build a RoleInformation from the `data` payload of `/info/role`.
+
+    Args:
+        data (Dict[str, Any]): The `data` field of the API response
+
+    Returns:
+        RoleInformation: Detailed information about the property
+    """
+    register_reference = data["registerReference"]
+    address = data["address"]
+    finances = data["finances"]
+    information = data["information"]
+    housing_type = data["housingType"]
+
+    return RoleInformation(
+        register_reference=RegisterReference(
+            register_commune=register_reference["registerCommune"],
+            register_block=register_reference["registerBlock"],
+            register_site=register_reference["registerSite"],
+            register_commune_common_property=register_reference[
+                "registerCommuneCommonProperty"
+            ],
+            register_block_common_property=register_reference[
+                "registerBlockCommonProperty"
+            ],
+            register_site_common_property=register_reference[
+                "registerSiteCommonProperty"
+            ],
+        ),
+        address=Address(
+            name_commune=address["nameCommune"],
+            id_commune=address["idCommune"],
+            region=address["region"],
+            street=address["street"],
+        ),
+        finances=Finances(
+            fiscal_appraisal=finances["fiscalAppraisal"],
+            semiannual_contribution=finances["semiannualContribution"],
+            exempt_appraisal=finances["exemptAppraisal"],
+        ),
+        information=Information(
+            total_area=information["totalArea"],
+            area_of_construction_line=information["areaofConstructionLine"],
+            min_year_of_construction=information["minYearofConstruction"],
+            max_year_of_construction=information["maxYearofConstruction"],
+        ),
+        housing_type=HousingType(
+            housing_type_name=housing_type["housingTypeName"],
+            housing_type_code=housing_type["housingTypeCode"],
+            housing_type_id=housing_type["housingTypeId"],
+        ),
+        location=Location(coordinates=data["location"]["coordinates"]),
+    )
+
+
+class RoleNotFoundError(requests.exceptions.HTTPError):
+    """Raised when the API has no information for a role and commune."""
+
+    def __init__(self, role: str, id_commune: int):
+        super().__init__(f"Role {role} not found in commune {id_commune}")
+        self.role = role
+        self.id_commune = id_commune
+
+
 class TocTocApiClient:
     """Client for interacting with the property valuation API."""
 
     BASE_URL = "https://gw.toctoc.com/1.0"
 
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        appraisal_cache: Optional["AppraisalCache"] = None,
+        role_cache: Optional["RoleCache"] = None,
+        policy: Optional["RequestPolicy"] = None,
+        base_url: Optional[str] = None,
+        coalesce: bool = True,
+    ):
         """Initialize the client with authentication token.
 
         Args:
             access_token (str): Bearer token for API authentication
+            appraisal_cache (Optional[AppraisalCache]): Cache consulted before
+                requesting a sale appraisal
+            role_cache (Optional[RoleCache]): Cache consulted before requesting
+                role information, including roles known not to exist
+            policy (Optional[RequestPolicy]): Rate limit, concurrency and retry
+                policy applied to every request
+            base_url (Optional[str]): Gateway URL, defaults to BASE_URL
+            coalesce (bool): Share one request between concurrent identical
+                GET calls, see `SingleFlight`
         """
+        if base_url is not None:
+            self.BASE_URL = base_url.rstrip("/")
+        self.appraisal_cache = appraisal_cache
+        self.role_cache = role_cache
+        self.policy = policy
+        self.single_flight = SingleFlight() if coalesce else None
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -110,6 +278,11 @@ class TocTocApiClient:
             property_details.latitude, property_details.longitude
         )
 
+        if self.appraisal_cache is not None:
+            cached = self.appraisal_cache.get(property_details)
+            if cached is not None:
+                return cached
+
         params = {
             "lat": property_details.latitude,
             "long": property_details.longitude,
@@ -131,12 +304,10 @@ class TocTocApiClient:
 
         params.update({k: v for k, v in optional_params.items() if v is not None})
 
-        response = self.session.get(
-            f"{self.BASE_URL}/valorization/appraisal/sale", params=params
-        )
-        response.raise_for_status()
-
-        return response.json()
+        appraisal = self.call_endpoint("/valorization/appraisal/sale", params=params)
+        if self.appraisal_cache is not None:
+            self.appraisal_cache.set(property_details, appraisal)
+        return appraisal
 
     def _validate_coordinates(self, lat: float, long: float) -> None:
         """Validate that coordinates are within valid ranges.
@@ -168,51 +339,35 @@ class TocTocApiClient:
             RoleInformation: Detailed information about the property
 
         Raises:
+            RoleNotFoundError: If the role does not exist in the commune
             requests.exceptions.RequestException: If the API request fails
         """
         params = {"role": role, "idCommune": id_commune}
-        response = self.call_endpoint("/info/role", params=params)
-        data = response["data"]
-
-        return RoleInformation(
-            register_reference=RegisterReference(
-                register_commune=data["registerReference"]["registerCommune"],
-                register_block=data["registerReference"]["registerBlock"],
-                register_site=data["registerReference"]["registerSite"],
-                register_commune_common_property=data["registerReference"][
-                    "registerCommuneCommonProperty"
-                ],
-                register_block_common_property=data["registerReference"][
-                    "registerBlockCommonProperty"
-                ],
-                register_site_common_property=data["registerReference"][
-                    "registerSiteCommonProperty"
-                ],
-            ),
-            address=Address(
-                name_commune=data["address"]["nameCommune"],
-                id_commune=data["address"]["idCommune"],
-                region=data["address"]["region"],
-                street=data["address"]["street"],
-            ),
-            finances=Finances(
-                fiscal_appraisal=data["finances"]["fiscalAppraisal"],
-                semiannual_contribution=data["finances"]["semiannualContribution"],
-                exempt_appraisal=data["finances"]["exemptAppraisal"],
-            ),
-            information=Information(
-                total_area=data["information"]["totalArea"],
-                area_of_construction_line=data["information"]["areaofConstructionLine"],
-                min_year_of_construction=data["information"]["minYearofConstruction"],
-                max_year_of_construction=data["information"]["maxYearofConstruction"],
-            ),
-            housing_type=HousingType(
-                housing_type_name=data["housingType"]["housingTypeName"],
-                housing_type_code=data["housingType"]["housingTypeCode"],
-                housing_type_id=data["housingType"]["housingTypeId"],
-            ),
-            location=Location(coordinates=data["location"]["coordinates"]),
-        )
+
+        if self.role_cache is not None:
+            cached = self.role_cache.get(role, id_commune)
+            if cached is not None:
+                return cached
+
+        try:
+            response = self.call_endpoint("/info/role", params=params)
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                if self.role_cache is not None:
+                    self.role_cache.set_not_found(role, id_commune)
+                raise RoleNotFoundError(role, id_commune) from e
+            raise
+
+        data = response.get("data")
+        if not data:
+            if self.role_cache is not None:
+                self.role_cache.set_not_found(role, id_commune)
+            raise RoleNotFoundError(role, id_commune)
+
+        role_information = parse_role_information(data)
+        if self.role_cache is not None:
+            self.role_cache.set(role, id_commune, data, role_information)
+        return role_information
 
     def call_endpoint(
         self,
@@ -223,6 +378,9 @@ class TocTocApiClient:
     ) -> Dict[Any, Any]:
         """Make a generic API call to any endpoint.
 
+        Concurrent identical GET calls (same endpoint and parameters) share a
+        single request and its result or error.
+
         Args:
             endpoint (str): The API endpoint path (e.g., "/info/role")
             method (str): HTTP method to use (GET, POST, PUT, etc.)
@@ -235,12 +393,38 @@ class TocTocApiClient:
         Raises:
             requests.exceptions.RequestException: If the API request fails
         """
+        if self.single_flight is not None and self.single_flight.coalesces(method):
+            return self.single_flight.do(
+                request_key(method, endpoint, params, data),
+                lambda: self._send(endpoint, method, params, data),
+                endpoint,
+            )
+        return self._send(endpoint, method, params, data)
+
+    def _send(
+        self,
+        endpoint: str,
+        method: str,
+        params: Optional[Dict[str, Any]],
+        data: Optional[Dict[str, Any]],
+    ) -> Dict[Any, Any]:
+        """Send one request to the gateway, through the policy if any."""
         url = f"{self.BASE_URL}{endpoint}"
-        response = self.session.request(
-            method=method.upper(),
-            url=url,
-            params=params,
-            json=data,
-        )
+
+        def send() -> requests.Response:
+            with RequestTimer("toctoc", endpoint) as timer:
+                response = self.session.request(
+                    method=method.upper(),
+                    url=url,
+                    params=params,
+                    json=data,
+                )
+                timer.status = response.status_code
+            return response
+
+        if self.policy is not None:
+            response = self.policy.execute(method, send)
+        else:
+            response = send()
         response.raise_for_status()
         return response.json()
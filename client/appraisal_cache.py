@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import fields
+from threading import Lock
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+
+class AppraisalCache:
+    """Two-tier cache for sale appraisals keyed on normalized property details.
+
+    Coordinates are rounded to `precision` decimals (4 decimals is ~11 m) and
+    only the optional fields that are set take part in the key, so requests
+    that would hit the API with the same parameters share one entry.
+
+    Lookups go to an in-memory LRU first and then to an optional SQLite file.
+    Entries in both tiers expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        precision: int = 4,
+        max_memory_entries: int = 10_000,
+        ttl: float = 7 * 24 * 3600,
+    ):
+        """Initialize the cache.
+
+        Args:
+            path (Optional[str]): SQLite file for the persistent tier. If None,
+                only the in-memory tier is used
+            precision (int): Number of decimals kept from latitude and longitude
+            max_memory_entries (int): Capacity of the in-memory LRU tier
+            ttl (float): Seconds an entry stays valid
+        """
+        self.precision = precision
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS appraisals ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+
+    def canonical_details(self, property_details) -> Dict[str, Any]:
+        """Return the normalized fields of a PropertyDetails used for the key."""
+        details = {}
+        for field in fields(property_details):
+            value = getattr(property_details, field.name)
+            if value is None:
+                continue
+            if field.name in ("latitude", "longitude"):
+                value = round(float(value), self.precision)
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            details[field.name] = value
+        return details
+
+    def key(self, property_details) -> str:
+        """Return the cache key of a PropertyDetails."""
+        return json.dumps(
+            self.canonical_details(property_details),
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+
+    def get(self, property_details) -> Optional[Dict[Any, Any]]:
+        """Return the cached appraisal for these details, or None on a miss."""
+        key = self.key(property_details)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(entry[0])
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM appraisals "
+                    "WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def set(self, property_details, appraisal: Dict[Any, Any]) -> None:
+        """Store an appraisal response for these details in every tier."""
+        key = self.key(property_details)
+        value = json.dumps(appraisal)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO appraisals VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def iter_entries(self) -> Iterator[Tuple[Dict[str, Any], Dict[Any, Any]]]:
+        """Yield (canonical details, appraisal) for every non-expired entry."""
+        now = time.time()
+        with self._lock:
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key, value FROM appraisals WHERE expires_at > ?",
+                    (now,),
+                ).fetchall()
+            else:
+                rows = [
+                    (key, value)
+                    for key, (value, expires_at) in self._memory.items()
+                    if expires_at > now
+                ]
+        for key, value in rows:
+            yield json.loads(key), json.loads(value)
+
+    def purge_expired(self) -> int:
+        """Delete expired entries from both tiers.
+
+        Returns:
+            int: Number of entries removed from the persistent tier
+        """
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (_, exp) in self._memory.items() if exp <= now]:
+                del self._memory[key]
+            if self._db is None:
+                return 0
+            cursor = self._db.execute(
+                "DELETE FROM appraisals WHERE expires_at <= ?", (now,)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the overall hit rate."""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Close the persistent tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
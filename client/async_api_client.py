@@ -0,0 +1,227 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Sequence, Callable, TypeVar
+
+from requests.adapters import HTTPAdapter
+
+from client.api_client import TocTocApiClient, PropertyDetails, RoleInformation
+from client.appraisal_cache import AppraisalCache
+from client.policy import RequestPolicy
+from client.role_cache import RoleCache
+from client.single_flight import request_key
+
+T = TypeVar("T")
+
+
+class AsyncTocTocApiClient:
+    """Asyncio client for the property valuation API with bounded concurrency.
+
+    Each call is run on a dedicated worker pool on top of a regular
+    `TocTocApiClient`, so responses, validation and errors are identical to the
+    blocking client. At most `max_in_flight` requests are sent at the same time.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        max_in_flight: int = 16,
+        appraisal_cache: Optional[AppraisalCache] = None,
+        role_cache: Optional[RoleCache] = None,
+        policy: Optional[RequestPolicy] = None,
+        base_url: Optional[str] = None,
+        coalesce: bool = True,
+    ):
+        """Initialize the client with authentication token and concurrency limit.
+
+        Args:
+            access_token (str): Bearer token for API authentication
+            max_in_flight (int): Maximum number of concurrent requests
+            appraisal_cache (Optional[AppraisalCache]): Cache consulted before
+                requesting a sale appraisal
+            role_cache (Optional[RoleCache]): Cache consulted before requesting
+                role information
+            policy (Optional[RequestPolicy]): Rate limit, concurrency and retry
+                policy applied to every request
+            base_url (Optional[str]): Gateway URL, defaults to
+                TocTocApiClient.BASE_URL
+            coalesce (bool): Share one request between concurrent identical
+                GET calls, from tasks and from worker threads alike
+
+        Raises:
+            ValueError: If max_in_flight is lower than 1
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+        self.max_in_flight = max_in_flight
+        self._client = TocTocApiClient(
+            access_token,
+            appraisal_cache=appraisal_cache,
+            role_cache=role_cache,
+            policy=policy,
+            base_url=base_url,
+            coalesce=coalesce,
+        )
+        self.single_flight = self._client.single_flight
+
+        # Keep one pooled connection per in-flight request instead of the
+        # default 10, otherwise extra connections are opened and discarded.
+        adapter = HTTPAdapter(pool_maxsize=max_in_flight)
+        self._client.session.mount("https://", adapter)
+        self._client.session.mount("http://", adapter)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="toctoc-api"
+        )
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def __aenter__(self) -> "AsyncTocTocApiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking client call on the worker pool once a slot is free."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, lambda: fn(*args, **kwargs)
+            )
+
+    async def get_sale_appraisal(
+        self, property_details: PropertyDetails
+    ) -> Dict[Any, Any]:
+        """Get property sale appraisal based on location and specifications.
+
+        Args:
+            property_details (PropertyDetails): Details of the property to evaluate
+
+        Returns:
+            dict: API response containing the property valuation
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+            ValueError: If required parameters are invalid
+        """
+        return await self._run(self._client.get_sale_appraisal, property_details)
+
+    async def get_role_information(self, role: str, id_commune: int) -> RoleInformation:
+        """Get detailed information for a specific role and commune.
+
+        Args:
+            role (str): The role identifier (e.g., "1234-22")
+            id_commune (int): The commune identifier
+
+        Returns:
+            RoleInformation: Detailed information about the property
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        return await self._run(self._client.get_role_information, role, id_commune)
+
+    async def call_endpoint(
+        self,
+        endpoint: str,
+        method: str = "GET",
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ) -> Dict[Any, Any]:
+        """Make a generic API call to any endpoint.
+
+        Concurrent identical GET calls share a single request, before taking
+        an in-flight slot.
+
+        Args:
+            endpoint (str): The API endpoint path (e.g., "/info/role")
+            method (str): HTTP method to use (GET, POST, PUT, etc.)
+            params (Optional[Dict[str, Any]]): Query parameters
+            data (Optional[Dict[str, Any]]): Request body data for POST/PUT requests
+
+        Returns:
+            Dict[Any, Any]: API response data
+
+        Raises:
+            requests.exceptions.RequestException: If the API request fails
+        """
+        if self.single_flight is not None and self.single_flight.coalesces(method):
+            return await self.single_flight.ado(
+                request_key(method, endpoint, params, data),
+                lambda: self._run(self._client._send, endpoint, method, params, data),
+                endpoint,
+            )
+        return await self._run(
+            self._client.call_endpoint,
+            endpoint,
+            method=method,
+            params=params,
+            data=data,
+        )
+
+    async def _gather(self, calls: List[Any], return_exceptions: bool) -> List[Any]:
+        """Run calls concurrently, cancelling the rest when one fails.
+
+        With `return_exceptions`, every call runs to completion. Otherwise the
+        first failure cancels the calls still waiting for an in-flight slot
+        and is raised; requests already sent cannot be interrupted and finish
+        on the worker pool, their results discarded.
+        """
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        if return_exceptions:
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Wait for the cancellations, so no task outlives the batch.
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def gather_sale_appraisals(
+        self,
+        properties: Sequence[PropertyDetails],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Appraise many properties concurrently.
+
+        Args:
+            properties (Sequence[PropertyDetails]): Properties to evaluate
+            return_exceptions (bool): If True, failed appraisals are returned as
+                exception instances. If False, the first failure is raised and
+                the appraisals not sent yet are cancelled
+
+        Returns:
+            List[Any]: Appraisal responses in the same order as `properties`
+        """
+        return await self._gather(
+            [self.get_sale_appraisal(p) for p in properties], return_exceptions
+        )
+
+    async def gather_role_information(
+        self,
+        roles: Sequence[Tuple[str, int]],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """Fetch many roles concurrently.
+
+        Args:
+            roles (Sequence[Tuple[str, int]]): (role, id_commune) pairs
+            return_exceptions (bool): If True, failed lookups are returned as
+                exception instances. If False, the first failure is raised and
+                the lookups not sent yet are cancelled
+
+        Returns:
+            List[Any]: `RoleInformation` objects in the same order as `roles`
+        """
+        return await self._gather(
+            [self.get_role_information(role, commune) for role, commune in roles],
+            return_exceptions,
+        )
+
+    async def close(self) -> None:
+        """Wait for pending requests and close the session."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+        self._client.close()
@@ -0,0 +1,252 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+import typing
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from itertools import islice
+from typing import Optional, Dict, Any, Iterator
+
+from dotenv import load_dotenv
+
+from client.api_client import TocTocApiClient, PropertyDetails, _as_int
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class BulkAppraisalStats:
+    """Counters reported by a BulkAppraisalPipeline run."""
+
+    rows_done: int = 0
+    rows_failed: int = 0
+    rows_skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _field_casts() -> Dict[str, type]:
+    """Map each PropertyDetails field to the scalar type it should be cast to."""
+    hints = typing.get_type_hints(PropertyDetails)
+    casts = {}
+    for field in fields(PropertyDetails):
+        hint = hints[field.name]
+        args = [a for a in typing.get_args(hint) if a is not type(None)]
+        casts[field.name] = args[0] if args else hint
+    return casts
+
+
+_FIELD_CASTS = _field_casts()
+
+
+def parse_property_row(row: Dict[str, Any]) -> PropertyDetails:
+    """Build a PropertyDetails from a CSV/JSONL row keyed by field name.
+
+    Empty values are treated as missing and unknown columns are ignored.
+
+    Args:
+        row (Dict[str, Any]): Raw row, values may be strings (CSV) or JSON scalars
+
+    Returns:
+        PropertyDetails: The parsed property
+
+    Raises:
+        ValueError: If a value cannot be converted or a required field is missing
+    """
+    values = {}
+    for name, cast in _FIELD_CASTS.items():
+        value = row.get(name)
+        if value is None or value == "":
+            continue
+        try:
+            values[name] = _as_int(value) if cast is int else cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {name}: {value!r}")
+    try:
+        return PropertyDetails(**values)
+    except TypeError as e:
+        raise ValueError(f"Missing required field: {e}")
+
+
+def iter_property_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream raw rows from a CSV or JSONL file without loading it in memory.
+
+    Args:
+        path (str): Path to a `.csv` or `.jsonl` file
+
+    Yields:
+        Dict[str, Any]: One raw row per input record
+    """
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class BulkAppraisalPipeline:
+    """Resumable bulk appraisal of properties read from a CSV or JSONL file.
+
+    Rows are appraised on a worker pool and written to a JSONL output file in
+    input order. Progress is checkpointed next to the output file, so running
+    the pipeline again after a crash resumes from the last checkpoint. At most
+    `window` rows are held in memory at any time.
+    """
+
+    def __init__(
+        self,
+        client: TocTocApiClient,
+        workers: int = 8,
+        window: Optional[int] = None,
+        checkpoint_every: int = 500,
+        report_every: float = 10.0,
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            client (TocTocApiClient): Client used for the appraisals
+            workers (int): Number of concurrent appraisal requests
+            window (Optional[int]): Maximum rows pending at once. Defaults to
+                4 times the number of workers
+            checkpoint_every (int): Number of written rows between checkpoints
+            report_every (float): Seconds between throughput log lines
+        """
+        self.client = client
+        self.workers = workers
+        self.window = window or workers * 4
+        self.checkpoint_every = checkpoint_every
+        self.report_every = report_every
+
+    def _appraise(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            property_details = parse_property_row(row)
+            self.client._validate_coordinates(
+                property_details.latitude, property_details.longitude
+            )
+            return {"result": self.client.get_sale_appraisal(property_details)}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def _checkpoint_path(output_path: str) -> str:
+        return f"{output_path}.checkpoint"
+
+    def _load_checkpoint(self, output_path: str) -> Dict[str, int]:
+        try:
+            with open(self._checkpoint_path(output_path), "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"rows_done": 0, "output_offset": 0}
+
+    def _save_checkpoint(self, output_path: str, output_file, rows_done: int) -> None:
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        path = self._checkpoint_path(output_path)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump({"rows_done": rows_done, "output_offset": output_file.tell()}, file)
+        os.replace(f"{path}.tmp", path)
+
+    def run(self, input_path: str, output_path: str) -> BulkAppraisalStats:
+        """Appraise every row of `input_path` and write results to `output_path`.
+
+        Each output line is a JSON object with the input `row` index and either
+        the API `result` or an `error` message.
+
+        Args:
+            input_path (str): CSV or JSONL file with PropertyDetails rows
+            output_path (str): JSONL file receiving the results
+
+        Returns:
+            BulkAppraisalStats: Counters for the rows processed in this run
+        """
+        checkpoint = self._load_checkpoint(output_path)
+        stats = BulkAppraisalStats(rows_skipped=checkpoint["rows_done"])
+        rows_done = checkpoint["rows_done"]
+        if rows_done:
+            LOGGER.info(f"Resuming {input_path} from row {rows_done}")
+
+        start = last_report = time.monotonic()
+        pending: "deque[Future]" = deque()
+
+        mode = "r+b" if os.path.exists(output_path) else "wb"
+        with open(output_path, mode) as output_file, ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="bulk-appraisal"
+        ) as executor:
+            # Drop anything written after the last checkpoint, it will be redone.
+            output_file.seek(checkpoint["output_offset"])
+            output_file.truncate()
+
+            def write_head() -> None:
+                nonlocal rows_done, last_report
+                record = pending.popleft().result()
+                record = {"row": rows_done, **record}
+                output_file.write(
+                    (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                )
+                rows_done += 1
+                stats.rows_done += 1
+                stats.rows_failed += "error" in record
+
+                if rows_done % self.checkpoint_every == 0:
+                    self._save_checkpoint(output_path, output_file, rows_done)
+                now = time.monotonic()
+                if now - last_report >= self.report_every:
+                    last_report = now
+                    LOGGER.info(
+                        f"{rows_done} rows done, "
+                        f"{stats.rows_done / (now - start):.1f} rows/sec"
+                    )
+
+            rows = islice(iter_property_rows(input_path), rows_done, None)
+            for row in rows:
+                pending.append(executor.submit(self._appraise, row))
+                if len(pending) >= self.window:
+                    write_head()
+            while pending:
+                write_head()
+
+            self._save_checkpoint(output_path, output_file, rows_done)
+
+        stats.elapsed = time.monotonic() - start
+        LOGGER.info(
+            f"Finished {input_path}: {stats.rows_done} rows "
+            f"({stats.rows_failed} failed) at {stats.rows_per_second:.1f} rows/sec"
+        )
+        return stats
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Bulk property appraisal")
+    parser.add_argument("input", help="CSV or JSONL file with PropertyDetails rows")
+    parser.add_argument("output", help="JSONL output file")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checkpoint-every", type=int, default=500)
+    parser.add_argument("--report-every", type=float, default=10.0)
+    args = parser.parse_args()
+
+    client = TocTocApiClient(os.getenv("TOCTOC_TOKEN"))
+    try:
+        BulkAppraisalPipeline(
+            client,
+            workers=args.workers,
+            checkpoint_every=args.checkpoint_every,
+            report_every=args.report_every,
+        ).run(args.input, args.output)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import math
+from typing import Dict, Any, Sequence, Tuple, Callable
+
+import numpy as np
+
+from client.api_client import PropertyDetails, RoleInformation
+
+# Coordinates are decoded in GeoJSON order, i.e. [longitude, latitude].
+ROLE_DTYPE = np.dtype(
+    [
+        ("id_commune", np.int32),
+        ("region", np.int16),
+        ("housing_type_id", np.int32),
+        ("total_area", np.float64),
+        ("area_of_construction_line", np.float64),
+        ("min_year_of_construction", np.int16),
+        ("max_year_of_construction", np.int16),
+        ("fiscal_appraisal", np.float64),
+        ("semiannual_contribution", np.float64),
+        ("exempt_appraisal", np.float64),
+        ("longitude", np.float64),
+        ("latitude", np.float64),
+    ]
+)
+
+# Optional PropertyDetails fields are stored as float so missing values are NaN.
+APPRAISAL_DTYPE = np.dtype(
+    [
+        ("latitude", np.float64),
+        ("longitude", np.float64),
+        ("property_family_type_id", np.int32),
+        ("usable_area", np.float64),
+        ("balcony_area", np.float64),
+        ("bedrooms", np.float64),
+        ("bathrooms", np.float64),
+        ("year_construction", np.float64),
+        ("appraisal", np.float64),
+    ]
+)
+
+_ROLE_PAYLOAD_GETTERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "id_commune": lambda d: d["address"]["idCommune"],
+    "region": lambda d: d["address"]["region"],
+    "housing_type_id": lambda d: d["housingType"]["housingTypeId"],
+    "total_area": lambda d: d["information"]["totalArea"],
+    "area_of_construction_line": lambda d: d["information"]["areaofConstructionLine"],
+    "min_year_of_construction": lambda d: d["information"]["minYearofConstruction"],
+    "max_year_of_construction": lambda d: d["information"]["maxYearofConstruction"],
+    "fiscal_appraisal": lambda d: d["finances"]["fiscalAppraisal"],
+    "semiannual_contribution": lambda d: d["finances"]["semiannualContribution"],
+    "exempt_appraisal": lambda d: d["finances"]["exemptAppraisal"],
+    "longitude": lambda d: d["location"]["coordinates"][0],
+    "latitude": lambda d: d["location"]["coordinates"][1],
+}
+
+_ROLE_ATTRIBUTE_GETTERS: Dict[str, Callable[[RoleInformation], Any]] = {
+    "id_commune": lambda r: r.address.id_commune,
+    "region": lambda r: r.address.region,
+    "housing_type_id": lambda r: r.housing_type.housing_type_id,
+    "total_area": lambda r: r.information.total_area,
+    "area_of_construction_line": lambda r: r.information.area_of_construction_line,
+    "min_year_of_construction": lambda r: r.information.min_year_of_construction,
+    "max_year_of_construction": lambda r: r.information.max_year_of_construction,
+    "fiscal_appraisal": lambda r: r.finances.fiscal_appraisal,
+    "semiannual_contribution": lambda r: r.finances.semiannual_contribution,
+    "exempt_appraisal": lambda r: r.finances.exempt_appraisal,
+    "longitude": lambda r: r.location.coordinates[0],
+    "latitude": lambda r: r.location.coordinates[1],
+}
+
+
+def _decode_columns(items: Sequence[Any], getters, dtype: np.dtype) -> np.ndarray:
+    out = np.empty(len(items), dtype=dtype)
+    for name, getter in getters.items():
+        out[name] = [getter(item) for item in items]
+    return out
+
+
+def decode_role_payloads(payloads: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Decode `/info/role` `data` payloads into a structured array.
+
+    The payloads are read column by column without building any
+    `RoleInformation` object.
+
+    Args:
+        payloads (Sequence[Dict[str, Any]]): `data` fields of `/info/role`
+            responses
+
+    Returns:
+        np.ndarray: One record per payload with dtype `ROLE_DTYPE`
+    """
+    return _decode_columns(payloads, _ROLE_PAYLOAD_GETTERS, ROLE_DTYPE)
+
+
+def decode_roles(roles: Sequence[RoleInformation]) -> np.ndarray:
+    """Decode already parsed `RoleInformation` objects into a structured array.
+
+    Args:
+        roles (Sequence[RoleInformation]): Roles returned by the client or cache
+
+    Returns:
+        np.ndarray: One record per role with dtype `ROLE_DTYPE`
+    """
+    return _decode_columns(roles, _ROLE_ATTRIBUTE_GETTERS, ROLE_DTYPE)
+
+
+def _get_path(response: Dict[str, Any], path: Tuple[str, ...]) -> float:
+    value = response
+    for key in path:
+        if not isinstance(value, dict) or value.get(key) is None:
+            return math.nan
+        value = value[key]
+    return value
+
+
+def _or_nan(value):
+    return math.nan if value is None else value
+
+
+def decode_appraisals(
+    properties: Sequence[PropertyDetails],
+    responses: Sequence[Dict[str, Any]],
+    value_path: Tuple[str, ...],
+) -> np.ndarray:
+    """Decode appraisal requests and responses into a structured array.
+
+    Args:
+        properties (Sequence[PropertyDetails]): Appraised properties
+        responses (Sequence[Dict[str, Any]]): Matching `get_sale_appraisal`
+            responses, in the same order as `properties`
+        value_path (Tuple[str, ...]): Keys leading to the appraised value in a
+            response. Responses without that value get NaN
+
+    Returns:
+        np.ndarray: One record per property with dtype `APPRAISAL_DTYPE`
+
+    Raises:
+        ValueError: If `properties` and `responses` have different lengths
+    """
+    if len(properties) != len(responses):
+        raise ValueError("properties and responses must have the same length")
+
+    out = np.empty(len(properties), dtype=APPRAISAL_DTYPE)
+    for name in ("latitude", "longitude", "property_family_type_id", "usable_area"):
+        out[name] = [getattr(p, name) for p in properties]
+    for name in ("balcony_area", "bedrooms", "bathrooms", "year_construction"):
+        out[name] = [_or_nan(getattr(p, name)) for p in properties]
+    out["appraisal"] = [_get_path(r, value_path) for r in responses]
+    return out
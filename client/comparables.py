@@ -0,0 +1,212 @@
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple, Dict
+
+import numpy as np
+
+from client.api_client import PropertyDetails
+from client.appraisal_cache import AppraisalCache
+from client.bulk_decode import decode_appraisals
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+
+
+@dataclass(slots=True)
+class ComparablesEstimate:
+    """Appraisal interpolated from nearby comparable properties.
+
+    Attributes:
+        value (float): Estimated appraisal of the property
+        confidence (float): Score between 0 and 1, higher is more reliable
+        indices (np.ndarray): Positions of the comparables in the index arrays
+        distances_km (np.ndarray): Distance from the property to each comparable
+    """
+
+    value: float
+    confidence: float
+    indices: np.ndarray
+    distances_km: np.ndarray
+
+
+class ComparablesIndex:
+    """Grid index over appraised properties for nearest-comparable queries.
+
+    Points are bucketed in square lat/long cells of `cell_size` degrees and
+    stored sorted by cell, so a query only looks at the few cells around the
+    property. Build it from cached appraisals with `from_cache`, or from a
+    structured array produced by `decode_appraisals` with `from_array`.
+    """
+
+    def __init__(self, appraisals: np.ndarray, cell_size: float = 0.01):
+        """Build the index.
+
+        Args:
+            appraisals (np.ndarray): Array with `APPRAISAL_DTYPE` records.
+                Records without an appraised value are ignored
+            cell_size (float): Grid cell size in degrees (0.01 is ~1.1 km)
+        """
+        valid = np.isfinite(appraisals["appraisal"]) & (appraisals["usable_area"] > 0)
+        appraisals = appraisals[valid]
+
+        self.cell_size = cell_size
+        self._columns = int(math.ceil(360 / cell_size)) + 1
+
+        keys = self._cell_key(appraisals["latitude"], appraisals["longitude"])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self.latitude = np.ascontiguousarray(appraisals["latitude"][order])
+        self.longitude = np.ascontiguousarray(appraisals["longitude"][order])
+        self.family_type = np.ascontiguousarray(
+            appraisals["property_family_type_id"][order]
+        )
+        self.usable_area = np.ascontiguousarray(appraisals["usable_area"][order])
+        self.value = np.ascontiguousarray(appraisals["appraisal"][order])
+        self.price_per_m2 = self.value / self.usable_area
+
+        unique, starts = np.unique(keys, return_index=True)
+        ends = np.append(starts[1:], len(keys))
+        self._cells: Dict[int, Tuple[int, int]] = {
+            int(k): (int(s), int(e)) for k, s, e in zip(unique, starts, ends)
+        }
+
+    @classmethod
+    def from_array(cls, appraisals: np.ndarray, cell_size: float = 0.01):
+        """Build the index from a `decode_appraisals` structured array."""
+        return cls(appraisals, cell_size=cell_size)
+
+    @classmethod
+    def from_cache(
+        cls,
+        cache: AppraisalCache,
+        value_path: Tuple[str, ...],
+        cell_size: float = 0.01,
+    ) -> "ComparablesIndex":
+        """Build the index from every non-expired entry of an appraisal cache.
+
+        Args:
+            cache (AppraisalCache): Cache filled by `get_sale_appraisal`
+            value_path (Tuple[str, ...]): Keys leading to the appraised value in
+                a response
+            cell_size (float): Grid cell size in degrees
+
+        Returns:
+            ComparablesIndex: The index over the cached appraisals
+        """
+        properties, responses = [], []
+        for details, response in cache.iter_entries():
+            properties.append(PropertyDetails(**details))
+            responses.append(response)
+        return cls(decode_appraisals(properties, responses, value_path), cell_size)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def _cell_key(self, latitude, longitude):
+        row = np.floor((np.asarray(latitude) + 90) / self.cell_size).astype(np.int64)
+        col = np.floor((np.asarray(longitude) + 180) / self.cell_size).astype(np.int64)
+        return row * self._columns + col
+
+    def _candidates(self, latitude: float, longitude: float, radius_km: float):
+        lat_cells = int(math.ceil(radius_km / KM_PER_DEGREE_LAT / self.cell_size))
+        lon_km = KM_PER_DEGREE_LON * max(math.cos(math.radians(latitude)), 1e-6)
+        lon_cells = int(math.ceil(radius_km / lon_km / self.cell_size))
+
+        center = int(self._cell_key(latitude, longitude))
+        ranges = []
+        for d_row in range(-lat_cells, lat_cells + 1):
+            for d_col in range(-lon_cells, lon_cells + 1):
+                cell = self._cells.get(center + d_row * self._columns + d_col)
+                if cell is not None:
+                    ranges.append(np.arange(*cell))
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(ranges)
+
+    def nearest(
+        self,
+        property_details: PropertyDetails,
+        k: int = 10,
+        area_band: float = 0.25,
+        max_distance_km: float = 2.0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the k nearest comparables of a property.
+
+        Comparables must share `property_family_type_id` and have a usable area
+        within `area_band` (relative) of the property.
+
+        Args:
+            property_details (PropertyDetails): Property to compare
+            k (int): Maximum number of comparables
+            area_band (float): Allowed relative difference of usable area
+            max_distance_km (float): Search radius
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Indices of the comparables and their
+            distances in km, closest first
+        """
+        lat, lon = property_details.latitude, property_details.longitude
+        idx = self._candidates(lat, lon, max_distance_km)
+
+        area = property_details.usable_area
+        mask = (self.family_type[idx] == property_details.property_family_type_id) & (
+            np.abs(self.usable_area[idx] - area) <= area_band * area
+        )
+        idx = idx[mask]
+
+        lon_km = KM_PER_DEGREE_LON * math.cos(math.radians(lat))
+        dy = (self.latitude[idx] - lat) * KM_PER_DEGREE_LAT
+        dx = (self.longitude[idx] - lon) * lon_km
+        distances = np.hypot(dx, dy)
+        within = distances <= max_distance_km
+        idx, distances = idx[within], distances[within]
+
+        if len(idx) > k:
+            top = np.argpartition(distances, k)[:k]
+            idx, distances = idx[top], distances[top]
+        order = np.argsort(distances)
+        return idx[order], distances[order]
+
+    def estimate(
+        self,
+        property_details: PropertyDetails,
+        k: int = 10,
+        area_band: float = 0.25,
+        max_distance_km: float = 2.0,
+    ) -> Optional[ComparablesEstimate]:
+        """Interpolate an appraisal from the nearest comparables.
+
+        The estimate is the inverse-distance weighted price per m2 of the
+        comparables times the usable area of the property. Confidence drops
+        with fewer than `k` comparables, with distance, and with the spread of
+        their price per m2, so callers can skip the API call above a threshold.
+
+        Args:
+            property_details (PropertyDetails): Property to appraise
+            k (int): Number of comparables to use
+            area_band (float): Allowed relative difference of usable area
+            max_distance_km (float): Search radius
+
+        Returns:
+            Optional[ComparablesEstimate]: The estimate, or None if no
+            comparable was found
+        """
+        idx, distances = self.nearest(property_details, k, area_band, max_distance_km)
+        if len(idx) == 0:
+            return None
+
+        prices = self.price_per_m2[idx]
+        weights = 1.0 / (distances + 0.05)
+        price = float(np.average(prices, weights=weights))
+
+        coverage = len(idx) / k
+        proximity = math.exp(-float(distances.mean()) / max_distance_km)
+        spread = float(prices.std() / prices.mean()) if prices.mean() > 0 else 1.0
+        confidence = coverage * proximity / (1.0 + spread)
+
+        return ComparablesEstimate(
+            value=price * property_details.usable_area,
+            confidence=confidence,
+            indices=idx,
+            distances_km=distances,
+        )
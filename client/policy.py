@@ -0,0 +1,281 @@
+import logging
+import random
+import time
+from threading import Condition, Lock
+from typing import Optional, Dict, Callable, FrozenSet
+
+import requests
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every thread using the client."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """Initialize the bucket.
+
+        Args:
+            rate (float): Requests allowed per second on average
+            burst (Optional[int]): Bucket capacity. Defaults to one second of rate
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Reserve the token now, possibly going negative, so concurrent
+            # callers queue up behind each other instead of all waking at once.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AIMDLimiter:
+    """Concurrency window with additive increase and multiplicative decrease.
+
+    The window grows by roughly one slot per window of successful requests and
+    shrinks when the gateway answers 429/5xx or latency goes above target.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_target: Optional[float] = None,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.9,
+    ):
+        """Initialize the limiter.
+
+        Args:
+            initial (int): Starting number of concurrent requests
+            min_limit (int): Lower bound of the window
+            max_limit (int): Upper bound of the window
+            latency_target (Optional[float]): Seconds above which a successful
+                request counts as a congestion signal. Disabled if None
+            backoff (float): Factor applied to the window on 429/5xx
+            latency_backoff (float): Factor applied when latency is over target
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._condition = Condition()
+        self._last_decrease = 0.0
+
+    def acquire(self) -> None:
+        """Wait until a slot is free in the current window."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        """Free a slot and adapt the window to the outcome of the request.
+
+        Args:
+            latency (float): Seconds the request took
+            overloaded (bool): True if the gateway signalled overload (429/5xx)
+        """
+        with self._condition:
+            self.in_flight -= 1
+            slow = self.latency_target is not None and latency > self.latency_target
+            if overloaded or slow:
+                # Decrease at most once per round trip, a burst of errors from
+                # the same window is a single congestion event.
+                now = time.monotonic()
+                if now - self._last_decrease > latency:
+                    factor = self.backoff if overloaded else self.latency_backoff
+                    self.limit = max(self.min_limit, self.limit * factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RetryPolicy:
+    """Retries with jittered exponential backoff.
+
+    Idempotent methods are retried on connection errors and on
+    `retry_statuses`. Other methods are only retried on 429, where the gateway
+    rejected the request without processing it.
+    """
+
+    IDEMPOTENT_METHODS: FrozenSet[str] = frozenset(
+        {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+    )
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 0.2,
+        max_delay: float = 10.0,
+        retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504}),
+    ):
+        """Initialize the retry policy.
+
+        Args:
+            max_attempts (int): Total attempts per call, including the first one
+            base_delay (float): Backoff ceiling of the first retry in seconds
+            max_delay (float): Maximum backoff in seconds
+            retry_statuses (FrozenSet[int]): HTTP statuses worth retrying
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+
+    def should_retry(
+        self,
+        method: str,
+        attempt: int,
+        response: Optional[requests.Response],
+    ) -> bool:
+        """Whether a failed attempt (response None on connection error) is retried."""
+        if attempt >= self.max_attempts:
+            return False
+        if response is not None and response.status_code == 429:
+            return True
+        if method not in self.IDEMPOTENT_METHODS:
+            return False
+        return response is None or response.status_code in self.retry_statuses
+
+    def delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Seconds to wait before the next attempt, honouring Retry-After."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    return min(self.max_delay, float(retry_after))
+                except ValueError:
+                    pass
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+class RequestPolicy:
+    """Rate limit, adaptive concurrency and retries around gateway requests.
+
+    Every part is optional; a `RequestPolicy()` with no arguments sends each
+    request once, like a client without policy. The same instance can be
+    shared by several clients and worker threads.
+    """
+
+    def __init__(
+        self,
+        rate_limit: Optional[TokenBucket] = None,
+        limiter: Optional[AIMDLimiter] = None,
+        retry: Optional[RetryPolicy] = None,
+    ):
+        """Initialize the policy.
+
+        Args:
+            rate_limit (Optional[TokenBucket]): Limits requests per second
+            limiter (Optional[AIMDLimiter]): Limits concurrent requests
+            retry (Optional[RetryPolicy]): Retries failed requests
+        """
+        self.rate_limit = rate_limit
+        self.limiter = limiter
+        self.retry = retry
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.rate_limited_seconds = 0.0
+        self._lock = Lock()
+
+    def execute(
+        self, method: str, send: Callable[[], requests.Response]
+    ) -> requests.Response:
+        """Send a request through the policy.
+
+        Args:
+            method (str): HTTP method, used to decide whether retries are safe
+            send (Callable[[], requests.Response]): Performs one attempt
+
+        Returns:
+            requests.Response: The last response received
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed to
+                get a response
+        """
+        method = method.upper()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limit is not None:
+                waited = self.rate_limit.acquire()
+                with self._lock:
+                    self.rate_limited_seconds += waited
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            start = time.monotonic()
+            response = None
+            error = None
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                overloaded = response is None or response.status_code == 429 or (
+                    response.status_code >= 500
+                )
+                if self.limiter is not None:
+                    self.limiter.release(time.monotonic() - start, overloaded)
+
+            with self._lock:
+                self.requests += 1
+                self.throttled += response is not None and response.status_code == 429
+
+            failed = error is not None or response.status_code >= 400
+            if not failed or self.retry is None:
+                break
+            if not self.retry.should_retry(method, attempt, response):
+                break
+
+            delay = self.retry.delay(attempt, response)
+            with self._lock:
+                self.retries += 1
+            LOGGER.debug(f"Retrying {method} in {delay:.2f}s (attempt {attempt})")
+            time.sleep(delay)
+
+        if error is not None:
+            raise error
+        return response
+
+    def metrics(self) -> Dict[str, float]:
+        """Return the current limits and request counters."""
+        metrics = {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rate_limited_seconds": self.rate_limited_seconds,
+        }
+        if self.rate_limit is not None:
+            metrics["rate_limit"] = self.rate_limit.rate
+        if self.limiter is not None:
+            metrics["concurrency_limit"] = int(self.limiter.limit)
+            metrics["in_flight"] = self.limiter.in_flight
+        return metrics
@@ -0,0 +1,277 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Optional, Dict, Any, Tuple, Iterable, TYPE_CHECKING
+
+from client.api_client import RoleInformation, RoleNotFoundError, parse_role_information
+
+if TYPE_CHECKING:
+    from client.api_client import TocTocApiClient
+
+# Cached role information (None for a role known not to exist) and expiry.
+_Entry = Tuple[Optional[RoleInformation], float]
+
+
+class RoleCache:
+    """Cache of `/info/role` lookups, including roles known not to exist.
+
+    Parsed `RoleInformation` objects are kept in an in-memory LRU keyed by
+    (role, id_commune), so repeated lookups are served from memory without
+    rebuilding the dataclasses. Raw `data` payloads are optionally persisted
+    in a SQLite file and parsed again on the first lookup after a restart.
+
+    Not-found results are cached as well, with their own (shorter) TTL.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 30 * 24 * 3600,
+        negative_ttl: float = 24 * 3600,
+        max_memory_entries: int = 10_000,
+    ):
+        """Initialize the cache.
+
+        Args:
+            path (Optional[str]): SQLite file for the persistent tier. If None,
+                only the in-memory tier is used
+            ttl (float): Seconds a found role stays valid
+            negative_ttl (float): Seconds a not-found role stays valid
+            max_memory_entries (int): Capacity of the in-memory LRU tier
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_memory_entries = max_memory_entries
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+        # None as value marks a role known not to exist.
+        self._memory: "OrderedDict[Tuple[str, int], _Entry]" = OrderedDict()
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS roles ("
+                "role TEXT, id_commune INTEGER, data TEXT, expires_at REAL, "
+                "PRIMARY KEY (role, id_commune))"
+            )
+            self._db.commit()
+
+    def get(self, role: str, id_commune: int) -> Optional[RoleInformation]:
+        """Return the cached information for a role, or None on a miss.
+
+        Args:
+            role (str): The role identifier (e.g., "1234-22")
+            id_commune (int): The commune identifier
+
+        Returns:
+            Optional[RoleInformation]: The cached information, or None if the
+            role has to be requested
+
+        Raises:
+            RoleNotFoundError: If the role is cached as not found
+        """
+        key = (role, int(id_commune))
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+            else:
+                if entry is not None:
+                    del self._memory[key]
+                entry = self._load(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+
+        if entry[0] is None:
+            raise RoleNotFoundError(role, id_commune)
+        return entry[0]
+
+    def _load(self, key: Tuple[str, int], now: float):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT data, expires_at FROM roles "
+            "WHERE role = ? AND id_commune = ? AND expires_at > ?",
+            (*key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (self._parse(row[0]), row[1])
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: Tuple[str, int], entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _parse(raw: Optional[str]) -> Optional[RoleInformation]:
+        return None if raw is None else parse_role_information(json.loads(raw))
+
+    def set(
+        self,
+        role: str,
+        id_commune: int,
+        data: Dict[str, Any],
+        role_information: Optional[RoleInformation] = None,
+    ) -> None:
+        """Store the `data` payload of a role.
+
+        Args:
+            role (str): The role identifier
+            id_commune (int): The commune identifier
+            data (Dict[str, Any]): The `data` field of the `/info/role` response
+            role_information (Optional[RoleInformation]): Already parsed `data`,
+                to avoid parsing it twice
+        """
+        if role_information is None:
+            role_information = parse_role_information(data)
+        self._store(role, id_commune, role_information, json.dumps(data), self.ttl)
+
+    def set_not_found(self, role: str, id_commune: int) -> None:
+        """Remember that a role does not exist in a commune."""
+        self._store(role, id_commune, None, None, self.negative_ttl)
+
+    def _store(self, role, id_commune, value, raw, ttl) -> None:
+        key = (role, int(id_commune))
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, (value, expires_at))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO roles VALUES (?, ?, ?, ?)",
+                    (*key, raw, expires_at),
+                )
+                self._db.commit()
+
+    def load_commune(self, id_commune: int) -> int:
+        """Load every persisted role of a commune into memory.
+
+        Beyond `max_memory_entries`, the least recently used roles are evicted
+        from memory (they stay in the persistent tier).
+
+        Returns:
+            int: Number of roles loaded
+        """
+        if self._db is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, data, expires_at FROM roles "
+                "WHERE id_commune = ? AND expires_at > ?",
+                (int(id_commune), now),
+            ).fetchall()
+            for role, raw, expires_at in rows:
+                self._remember((role, int(id_commune)), (self._parse(raw), expires_at))
+        return len(rows)
+
+    def warmup(
+        self,
+        client: "TocTocApiClient",
+        roles: Iterable[Tuple[str, int]],
+        workers: int = 8,
+    ) -> Dict[str, int]:
+        """Request every role that is not cached yet.
+
+        The client must use this cache as its `role_cache`, so the responses
+        (and not-found results) are stored as they arrive.
+
+        Args:
+            client (TocTocApiClient): Client used for the missing roles
+            roles (Iterable[Tuple[str, int]]): (role, id_commune) pairs
+            workers (int): Number of concurrent requests
+
+        Returns:
+            Dict[str, int]: Number of roles found, not found and failed
+        """
+        counts = {"found": 0, "not_found": 0, "failed": 0}
+
+        def fetch(pair: Tuple[str, int]) -> str:
+            try:
+                client.get_role_information(*pair)
+                return "found"
+            except RoleNotFoundError:
+                return "not_found"
+            except Exception:
+                return "failed"
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for outcome in executor.map(fetch, roles):
+                counts[outcome] += 1
+        return counts
+
+    def warmup_from_file(
+        self,
+        path: str,
+        client: Optional["TocTocApiClient"] = None,
+        workers: int = 8,
+    ) -> Dict[str, int]:
+        """Preload roles listed in a JSONL file.
+
+        Each line holds `role` and `id_commune`, and optionally the `data`
+        payload of a previous `/info/role` response (or `"data": null` for a
+        role known not to exist). Lines with a `data` key are stored directly;
+        the others are requested through `client` when one is given.
+
+        Args:
+            path (str): JSONL file with one role per line
+            client (Optional[TocTocApiClient]): Client used for roles without data
+            workers (int): Number of concurrent requests
+
+        Returns:
+            Dict[str, int]: Number of roles loaded, found, not found and failed
+        """
+        loaded = 0
+        to_fetch = []
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                role, id_commune = record["role"], record["id_commune"]
+                if "data" not in record:
+                    to_fetch.append((role, id_commune))
+                elif record["data"]:
+                    self.set(role, id_commune, record["data"])
+                    loaded += 1
+                else:
+                    self.set_not_found(role, id_commune)
+                    loaded += 1
+
+        counts = {"found": 0, "not_found": 0, "failed": 0}
+        if client is not None and to_fetch:
+            counts = self.warmup(client, to_fetch, workers=workers)
+        return {"loaded": loaded, **counts}
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the number of roles held in memory."""
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Close the persistent tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
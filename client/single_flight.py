@@ -0,0 +1,185 @@
+import asyncio
+import copy
+import json
+from threading import Event, Lock
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Optional,
+    Tuple,
+)
+
+from toctoc.metrics import METRICS
+
+COALESCED_CALLS = METRICS.counter(
+    "toctoc_coalesced_calls_total",
+    "Calls answered by an identical request already in flight.",
+    ("service", "endpoint"),
+)
+
+
+def request_key(
+    method: str,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    data: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, str, str]:
+    """Build the coalescing key of a request.
+
+    Parameters are serialized with sorted keys, so the same request built with
+    a different parameter order gets the same key.
+
+    Returns:
+        Tuple[str, str, str]: Method, endpoint and canonical parameters
+    """
+    canonical = json.dumps([params, data], sort_keys=True, default=str)
+    return method.upper(), endpoint, canonical
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent identical calls.
+
+    The first caller of a key (the leader) runs the call; callers arriving
+    with the same key before it finishes wait for it. Every caller, the
+    leader included, gets its own copy of the result, or the exception, so
+    no caller sees the changes another makes to its result. Nothing is
+    cached: once the call finishes the next caller starts a new one. Only
+    safe methods are coalesced, see `COALESCED_METHODS`.
+
+    Blocking callers coalesce with `do` across threads, and asyncio tasks with
+    `ado` within their event loop.
+    """
+
+    COALESCED_METHODS: FrozenSet[str] = frozenset({"GET", "HEAD", "OPTIONS"})
+
+    def __init__(self, service: str = "toctoc"):
+        """Initialize the coalescer.
+
+        Args:
+            service (str): Service label of the saved calls metric
+        """
+        self.service = service
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, "asyncio.Future"] = {}
+        self._lock = Lock()
+
+    def coalesces(self, method: str) -> bool:
+        """Whether calls with this HTTP method may be shared."""
+        return method.upper() in self.COALESCED_METHODS
+
+    def _count(self, endpoint: str) -> None:
+        with self._lock:
+            self.coalesced += 1
+        COALESCED_CALLS.inc(self.service, endpoint)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], endpoint: str = "") -> Any:
+        """Run `fn`, or wait for the identical call already running.
+
+        Args:
+            key (Hashable): Identifies identical calls, see `request_key`
+            fn (Callable[[], Any]): Performs the call
+            endpoint (str): Endpoint label of the saved calls metric
+
+        Returns:
+            Any: The result of the call
+
+        Raises:
+            Exception: Whatever the shared call raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as error:
+                call.error = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            self._count(endpoint)
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        # The shared result is never handed out, only copies of it: callers
+        # may modify what they get.
+        return copy.deepcopy(call.result)
+
+    async def ado(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        endpoint: str = "",
+    ) -> Any:
+        """Await `fn()`, or the identical call already running in this loop.
+
+        The call runs in its own task, so cancelling one caller does not
+        cancel it for the others.
+
+        Args:
+            key (Hashable): Identifies identical calls, see `request_key`
+            fn (Callable[[], Awaitable[Any]]): Performs the call
+            endpoint (str): Endpoint label of the saved calls metric
+
+        Returns:
+            Any: The result of the call
+
+        Raises:
+            Exception: Whatever the shared call raised
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        if task is None:
+            task = self._tasks[task_key] = loop.create_task(fn())
+            with self._lock:
+                self.leaders += 1
+            task.add_done_callback(lambda _: self._forget(task_key, task))
+        else:
+            self._count(endpoint)
+
+        result = await asyncio.shield(task)
+        # Every caller, the leader included, gets its own copy.
+        return copy.deepcopy(result)
+
+    def _forget(self, task_key: Hashable, task: "asyncio.Future") -> None:
+        if self._tasks.get(task_key) is task:
+            del self._tasks[task_key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled.
+            task.exception()
+
+    def stats(self) -> Dict[str, float]:
+        """Return the calls made, the calls saved and the saved fraction."""
+        with self._lock:
+            leaders, coalesced = self.leaders, self.coalesced
+            in_flight = len(self._calls) + len(self._tasks)
+        total = leaders + coalesced
+        return {
+            "calls": leaders,
+            "coalesced": coalesced,
+            "in_flight": in_flight,
+            "saved_ratio": coalesced / total if total else 0.0,
+        }
@@ -1,120 +1,166 @@
+import asyncio
+import html
+import json
+import logging
+import os
+import sys
+
 import openai
 import gradio as gr
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from chat.chatbot_client import Chatbot
+from chat.intent_router import IntentRouter
+from chat.prefetch import AppraisalPrefetcher
+from chat.serving import ChatScheduler, QueueFullError
+from client.api_client import PropertyDetails, TocTocApiClient
+from toctoc.metrics import start_metrics_server
+from toctoc.tools.tools import extract_json_objects
+
 openai.api_key = ""
 
-# Definir plantillas
-BASE = """Eres un agente de clasificación para una inmobiliaria. 
-Tu única tarea es analizar el mensaje inicial del usuario y determinar cuál de los siguientes agentes especializados debe manejar la conversación:\n\n
-1. BUSQUEDA: Si el usuario está buscando una propiedad o quiere información sobre propiedades disponibles.\n
-2. HIPOTECARIO: Si el usuario tiene preguntas sobre créditos hipotecarios, financiamiento o préstamos para vivienda.\n
-3. TASAR: Si el usuario quiere tasar, valuar o conocer el precio de una propiedad.\n\n
-Debes responder únicamente con una de estas tres palabras: BUSQUEDA, HIPOTECARIO, o TASAR.\n\n
-Ejemplos:\n
-- \"Quiero comprar una casa\": BUSQUEDA\n
-- \"Necesito un crédito para mi casa\": HIPOTECARIO\n
-- \"¿Cuánto vale mi departamento?\": TASAR\n\n
-Si el mensaje no se ajusta claramente a ninguna categoría o es ambiguo, responde con BUSQUEDA como opción por defecto. 
-Ten en cuenta la fecha, el país y el idioma de la conversación. No debes responder en otro idioma más que el indicado.\n
-Fecha actual: viernes 10 de enero del 2025.\n
-País: Chile.\n
-Idioma: Español."""
-
-
-BUSQUEDA = """"Eres un agente especializado en búsqueda de propiedades.
-Tu tarea principal es ayudar al cliente a identificar las características de la propiedad que busca.
-Debes interactuar de manera amigable y profesional, haciendo preguntas relevantes para recopilar información sobre sus preferencias.
-Sigue estas reglas: 1. Haz preguntas claras y específicas para recopilar datos sobre:
-- Ubicación o ciudad deseada.
-- Tipo de arriendo (venta, arriendo, etc.).
-- Tipo de propiedad (casa, departamento, terreno, etc.).
-- Cantidad de habitaciones.
-- Cantidad de baños.
-- Otras características deseadas (jardín, piscina, estacionamiento, etc.). 
-- Rango de precio estimado. 
-2. Confirma cada respuesta del cliente para asegurarte de que la información es correcta y ofrece la oportunidad de ajustar detalles si es necesario. 
-3. Si el cliente no sabe qué responder a una pregunta, ofrécele ejemplos o categorías comunes para ayudarlo a decidir. 
-4. Finaliza las preguntas cuando el cliente indique que no tiene más información que agregar o si confirmas que todos los datos necesarios han sido recopilados. 
-5. Al finalizar, organiza toda la información en un formato JSON estructurado y devuelve ese JSON como resultado. 
-Ejemplo de JSON final: {\"ubicacion\":\"Ciudad X\",\"tipo_de_propiedad\":\"Casa\",\"habitaciones\":3,\"banos\":2,\"caracteristicas_adicionales\":[\"jardín\",\"piscina\"],\"rango_de_precio\":\"100,000 - 150,000 USD\"} 
-En cada interacción, prioriza la claridad y guía al cliente hacia respuestas útiles. 
-Si detectas información contradictoria o confusa, pregunta amablemente para clarificar. 
-Mantén el enfoque en los intereses y necesidades del cliente."""
-
-HIPOTECARIO = """Eres un agente especializado en créditos hipotecarios. 
-Tu tarea principal es ayudar al cliente a recopilar la información necesaria para su solicitud de crédito. 
-Debes interactuar de manera amigable y profesional, haciendo preguntas relevantes para obtener los datos requeridos. 
-Sigue estas reglas: 
-1. Haz preguntas claras y específicas para recopilar datos sobre: - Ingreso mensual del solicitante - Valor de la propiedad - Monto solicitado del préstamo - Monto del enganche - Plazo del crédito - Tipo de propiedad 
-2. Confirma cada respuesta del cliente para asegurarte de que la información es correcta y ofrece la oportunidad de ajustar detalles si es necesario. 
-3. Si el cliente no sabe qué responder a una pregunta, ofrécele ejemplos o rangos comunes para ayudarlo a decidir. 
-4. Al finalizar, organiza la información en un formato JSON estructurado según este ejemplo: {\"borrowerInfo\":{\"monthlyIncome\":\"30000\"},\"mortgageDetails\":{\"propertyValue\":\"1500000\",\"requestedAmount\":\"1200000\",\"downPayment\":\"300000\",\"term\":\"20\",\"propertyType\":\"Casa\"}} 
-5. Mantén un tono profesional pero accesible, y guía al cliente en cada paso del proceso de solicitud del crédito hipotecario."""
-
-TASAR = """Eres un agente especializado en tasación inmobiliaria. 
-Tu tarea principal es ayudar a los clientes a proporcionar toda la información necesaria para calcular una tasación precisa de una propiedad. 
-Debes ser claro y específico en las preguntas, asegurándote de recopilar datos relevantes y completos para realizar la tasación. 
-Aquí están las reglas a seguir: \n\n
-1. Haz preguntas claras y específicas para obtener la siguiente información: \n   
-- Ubicación exacta de la propiedad (latitud y longitud). \n   
-- Tipo de propiedad (Casa, Departamento, Bodega, Estacionamiento, etc.). \n   
-- Cantidad de habitaciones. \n   
-- Cantidad de baños. \n   
-- Año de construcción. \n   
-- Área útil de la propiedad. \n   
-- Área del balcón (si aplica). \n   
-- Cantidad de estacionamientos disponibles. \n   
-- Si la propiedad tiene bodega. \n   
-- Expensas comunes (si aplica). \n   
-- Role de la propiedad (si aplica, como propiedad comercial o residencial). \n\n
-2. Confirma siempre la exactitud de las respuestas del cliente, preguntando si toda la información es correcta antes de proceder. Si es necesario, ofrece ejemplos o opciones comunes para guiar al cliente. \n\n
-3. Si el cliente no sabe responder alguna de las preguntas, ofrece sugerencias comunes o ejemplos que puedan ayudar a decidir, como áreas estándar de estacionamientos o tamaños de viviendas. \n\n
-4. Recuerda que para calcular la tasación, la latitud y longitud de la ubicación son esenciales. \n\n
-5. Al finalizar, organiza toda la información recopilada en un formato JSON estructurado, que será enviado a la API de tasación. 
-El JSON debe incluir los siguientes campos: \n   - lat (latitud de la ubicación). \n   - long (longitud de la ubicación). \n   - propertyFamilyTypeId (tipo de propiedad, por ejemplo: 1 para Casa, 2 para Departamento). \n   - communeId (ID del municipio o comuna). \n   - balconyArea (área del balcón, si aplica). \n   - parkingLots (cantidad de estacionamientos). \n   - bedrooms (número de habitaciones). \n   - bathrooms (número de baños). \n   - yearConstruction (año de construcción). \n   - warehouse (si tiene bodega, 1 para sí, 0 para no). \n   - commonExpense (expensas comunes, si aplica). \n   - usableArea (área útil de la propiedad). \n\n
-6. Al final, confirma con el cliente que toda la información está completa y precisa antes de enviar la solicitud de tasación. 
-Si es necesario, permite que el cliente realice ajustes antes de enviar los datos."""
-
-
-# Inicializar mensajes
-messages = []
-
-def CustomChatGPT(user_input, template_choice):
-    global messages
-    if not messages:  # Añadir la plantilla inicial solo la primera vez
-        if template_choice == "BUSQUEDA":
-            messages.append({"role": "system", "content": BUSQUEDA})
-        elif template_choice == "HIPOTECARIO":
-            messages.append({"role": "system", "content": HIPOTECARIO})
-        elif template_choice == "TASAR":
-            messages.append({"role": "system", "content": TASAR})
-        elif template_choice == "BASE":
-            messages.append({"role": "system", "content": BASE})
-
-    # Añadir entrada del usuario
-    messages.append({"role": "user", "content": user_input})
-
-    # Llamar al modelo de OpenAI
+LOGGER = logging.getLogger(__name__)
+
+# Plantillas compartidas con el resto del proyecto (templates/*.json)
+TEMPLATE_FILES = {
+    "BASE": "base.json",
+    "BUSQUEDA": "busqueda.json",
+    "HIPOTECARIO": "hipotecario.json",
+    "TASAR": "tasar.json",
+}
+
+# Atención concurrente: respuestas simultáneas, cola máxima y cola por usuario
+SCHEDULER = ChatScheduler(
+    max_concurrency=int(os.getenv("TOCTOC_CHAT_WORKERS", "8")),
+    max_queue=int(os.getenv("TOCTOC_CHAT_QUEUE", "64")),
+    max_queued_per_user=int(os.getenv("TOCTOC_CHAT_QUEUE_PER_USER", "2")),
+)
+
+BUSY_MESSAGE = (
+    "<p>Estamos atendiendo a muchas personas en este momento. "
+    "Por favor intenta nuevamente en unos segundos.</p>"
+)
+
+# Cliente del gateway para tasar; sin token, TASAR solo conversa
+API_CLIENT = (
+    TocTocApiClient(os.getenv("TOCTOC_TOKEN")) if os.getenv("TOCTOC_TOKEN") else None
+)
+
+# Clasificador local de intención (reemplaza la llamada al LLM con BASE).
+# Los mensajes ambiguos se clasifican con la plantilla BASE (classify_with_llm)
+ROUTER = IntentRouter()
+
+
+async def appraise(chatbot, reply):
+    """
+    Tasa la propiedad cuando el agente TASAR entrega el JSON final.
+
+    Solo se tasa si la respuesta del agente trae el JSON con los datos
+    requeridos por la API de tasación. La tasación usa la consulta que
+    AppraisalPrefetcher inició al conocerse los datos, así el usuario no
+    espera al gateway. Devuelve None si no corresponde tasar.
+    """
+    prefetcher = chatbot.prefetcher
+    if prefetcher is None or "{" not in reply:
+        return None
+    summary = {}
+    for found in extract_json_objects(reply):
+        summary.update(found)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages
-        )
-        ChatGPT_reply = response["choices"][0]["message"]["content"]
-        messages.append({"role": "assistant", "content": ChatGPT_reply})
-
-        # Construir historial en formato HTML
-        chat_history = ""
-        for msg in messages:
-            if msg["role"] == "user":
-                chat_history += f"<p><strong>👤 Usuario:</strong> {msg['content']}</p>"
-            elif msg["role"] == "assistant":
-                chat_history += f"<p><strong>🤖 TocToc IA:</strong> {msg['content']}</p>"
-
-        # Agregar un contenedor para que JavaScript haga scroll
-        return f"<div id='chat-history-container'>{chat_history}</div>", ""
+        details = PropertyDetails.from_params(summary)
+    except ValueError:
+        return None  # No es el resumen final (faltan datos o son inválidos)
+    try:
+        appraisal = await asyncio.to_thread(prefetcher.get_sale_appraisal, details)
     except Exception as e:
-        return f"<p>Error en la comunicación con OpenAI: {str(e)}</p>", ""
+        return f"No se pudo obtener la tasación: {e}"
+    return f"Tasación: {json.dumps(appraisal, ensure_ascii=False)}"
+
+
+def render_turn(user_input, reply):
+    """Devuelve el HTML de un solo turno (mensaje del usuario y respuesta)"""
+    return (
+        "<div class='chat-turn'>"
+        f"<p><strong>👤 Usuario:</strong> {html.escape(user_input)}</p>"
+        f"<p><strong>🤖 TocToc IA:</strong> {html.escape(reply)}</p>"
+        "</div>"
+    )
+
+
+async def CustomChatGPT(user_input, template_choice, chatbot, request: gr.Request):
+    """
+    Responde un mensaje transmitiendo los tokens a medida que llegan.
+
+    Cada sesión tiene su propio Chatbot (gr.State), creado con la plantilla
+    elegida en el primer mensaje. Solo se envía el HTML del turno actual; el
+    navegador lo agrega al historial al terminar (ver APPEND_TURN_JS), así el
+    tamaño de cada respuesta no crece con el largo de la conversación.
+
+    Las respuestas pasan por SCHEDULER: si la cola está llena se responde
+    BUSY_MESSAGE en vez de acumular trabajo.
+    """
+    user_id = request.session_hash if request is not None else "anonymous"
+    try:
+        async with SCHEDULER.slot(user_id):
+            if chatbot is None:  # Añadir la plantilla inicial solo la primera vez
+                if template_choice == "BASE":
+                    # Clasificar localmente y pasar directo al agente especializado
+                    try:
+                        route = await asyncio.to_thread(ROUTER.route, user_input)
+                        template_choice = route.intent
+                    except Exception as e:
+                        # Igual que la plantilla BASE ante un mensaje ambiguo
+                        LOGGER.warning(f"No se pudo clasificar el mensaje: {e}")
+                        template_choice = ROUTER.default_intent
+                # TASAR consulta el gateway mientras se recopilan los datos
+                prefetcher = (
+                    AppraisalPrefetcher(API_CLIENT)
+                    if template_choice == "TASAR" and API_CLIENT is not None
+                    else None
+                )
+                chatbot = Chatbot(
+                    os.getenv("OPENAI_API_KEY", openai.api_key), prefetcher=prefetcher
+                )
+                chatbot.use_template(TEMPLATE_FILES[template_choice])
+
+            reply = ""
+            yield render_turn(user_input, reply), "", chatbot
+
+            # Llamar al modelo de OpenAI y transmitir la respuesta
+            try:
+                async for delta in chatbot.astream_response(user_input):
+                    reply += delta
+                    yield render_turn(user_input, reply), "", chatbot
+
+                # Si el agente TASAR entregó el JSON final, agregar la tasación
+                appraisal = await appraise(chatbot, reply)
+                if appraisal is not None:
+                    chatbot.add_message("assistant", appraisal)
+                    reply += f"\n\n{appraisal}"
+                    yield render_turn(user_input, reply), "", chatbot
+            except Exception as e:
+                yield (
+                    f"<p>Error en la comunicación con OpenAI: {str(e)}</p>",
+                    "",
+                    chatbot,
+                )
+    except QueueFullError:
+        # Se conserva el mensaje para que el usuario pueda reenviarlo
+        yield BUSY_MESSAGE, user_input, chatbot
+
+
+# Mueve el turno terminado al historial y hace scroll hasta el final
+APPEND_TURN_JS = """
+() => {
+    const history = document.getElementById('chat-history-container');
+    const turn = document.getElementById('current-turn');
+    if (!history || !turn) return;
+    history.querySelectorAll('.chat-placeholder').forEach((p) => p.remove());
+    turn.querySelectorAll('.chat-turn').forEach((t) => history.appendChild(t));
+    history.scrollTop = history.scrollHeight;
+}
+"""
 
 # CSS personalizado
 css = """
@@ -191,10 +237,15 @@ with gr.Blocks(css=css) as demo:
 
     # Contenedor principal
     with gr.Column(elem_id="chat-container"):
+        # El servidor nunca reenvía el historial: el navegador agrega cada turno
         chat_history = gr.HTML(
-            value="<div id='chat-history-container'><p>El historial aparecerá aquí.</p></div>",  # Contenedor inicial con mensaje
+            value="<p class='chat-placeholder'>El historial aparecerá aquí.</p>",
             elem_id="chat-history-container"
         )
+        # Turno en curso, actualizado token a token
+        current_turn = gr.HTML(elem_id="current-turn")
+        # Chatbot de la sesión (historial, plantilla y compactación por usuario)
+        session_chatbot = gr.State(None)
         user_input = gr.Textbox(
             placeholder="Escribe tu mensaje...", 
             label="Tu Mensaje", 
@@ -202,17 +253,17 @@ with gr.Blocks(css=css) as demo:
             elem_id="user-input"
         )
         template_dropdown = gr.Dropdown(
-            ["BASE", "BUSQUEDA", "HIPOTECARIO", "TASAR"], 
+            list(TEMPLATE_FILES),
             label="Selecciona una plantilla",
             value="BASE",
             elem_id="template-dropdown"
         )
         send_button = gr.Button("Enviar", elem_id="send-button")
         send_button.click(
-            CustomChatGPT, 
-            inputs=[user_input, template_dropdown], 
-            outputs=[chat_history, user_input]  # Limpia el cuadro de entrada
-        )
+            CustomChatGPT,
+            inputs=[user_input, template_dropdown, session_chatbot],
+            outputs=[current_turn, user_input, session_chatbot]  # Limpia el cuadro de entrada
+        ).then(None, js=APPEND_TURN_JS)
 
 # Incluir JavaScript para el autoscroll
 scroll_script = """
@@ -226,4 +277,13 @@ scroll_script = """
     setInterval(scrollToBottom, 100); // Revisa el scroll cada 100ms
 </script>
 """
+# Métricas en formato Prometheus en http://127.0.0.1:<puerto>/metrics
+if os.getenv("TOCTOC_METRICS_PORT"):
+    start_metrics_server(int(os.getenv("TOCTOC_METRICS_PORT")))
+
+# Gradio despacha todo de inmediato; SCHEDULER limita la concurrencia
+demo.queue(
+    default_concurrency_limit=None,
+    max_size=SCHEDULER.max_concurrency + SCHEDULER.max_queue,
+)
 demo.launch(share=True) + scroll_script
\ No newline at end of file
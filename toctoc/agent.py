@@ -0,0 +1,346 @@
+import dataclasses
+import json
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from openinference.semconv.trace import OpenInferenceSpanKindValues, SpanAttributes
+from opentelemetry import trace as trace_api
+from pydantic import BaseModel
+
+from toctoc.metrics import METRICS
+from toctoc.openai_client import (
+    TRACER,
+    ChatMessage,
+    FunctionSchema,
+    OpenAIClient,
+    ToolCall,
+    ToolResultMessage,
+)
+from toctoc.tracing import record_error, set_lazy_attributes
+
+LOGGER = logging.getLogger(__name__)
+
+TOOL_SECONDS = METRICS.histogram(
+    "toctoc_tool_duration_seconds", "Duration of agent tool calls.", ("tool",)
+)
+TOOL_CALLS = METRICS.counter(
+    "toctoc_tool_calls_total",
+    "Agent tool calls by outcome (ok, error, timeout).",
+    ("tool", "status"),
+)
+
+
+class ToolLoopLimitError(Exception):
+    """Raised when the model still requests tools after `max_steps` turns."""
+
+
+class Tool(BaseModel):
+    """
+    A function the agent can call on behalf of the model.
+
+    Attributes:
+        definition (FunctionSchema): The definition sent to the model.
+        handler (Callable[..., Any]): Called with the arguments of the model
+        as keyword arguments. Its result is sent back as JSON.
+        timeout (float): Seconds after which the call is reported to the
+        model as timed out.
+    """
+
+    definition: FunctionSchema
+    handler: Callable[..., Any]
+    timeout: float = 10.0
+
+    @property
+    def name(self) -> str:
+        return self.definition.name
+
+
+class ToolResult(BaseModel):
+    """
+    The outcome of one tool call.
+
+    Attributes:
+        call (ToolCall): The call requested by the model.
+        content (str): The JSON sent back to the model.
+        status (str): "ok", "error" or "timeout".
+        duration (float): Seconds until the result or the timeout.
+    """
+
+    call: ToolCall
+    content: str
+    status: str
+    duration: float
+
+
+class AgentResult(BaseModel):
+    """
+    The final answer of an agent run.
+
+    Attributes:
+        content (Optional[str]): The text answer of the model.
+        messages (list[ChatMessage]): The conversation, including the tool
+        calls and their results.
+        steps (int): Model round trips made.
+        tool_results (list[ToolResult]): Every tool call made, in order.
+    """
+
+    content: Optional[str]
+    messages: list[ChatMessage]
+    steps: int
+    tool_results: list[ToolResult]
+
+
+def _to_json(value: Any) -> str:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        value = dataclasses.asdict(value)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class _ToolRun:
+    """
+    One tool call in flight, finished by its worker or by its timeout.
+    """
+
+    def __init__(self, call: ToolCall, span: trace_api.Span):
+        self.name = call.function_name
+        self.call = call
+        self.span = span
+        self.started = time.perf_counter()
+        self.result: Optional[ToolResult] = None
+        self._lock = Lock()
+
+    def run(self, handler: Callable[..., Any]) -> None:
+        with trace_api.use_span(self.span, end_on_exit=False):
+            try:
+                value = handler(**self.call.arguments)
+            except Exception as e:
+                self.finish("error", {"error": f"{type(e).__name__}: {e}"}, e)
+                return
+        self.finish("ok", value)
+
+    def finish(
+        self, status: str, value: Any, error: Optional[BaseException] = None
+    ) -> ToolResult:
+        """
+        Records the outcome, once; later outcomes (e.g. a handler finishing
+        after its timeout) are ignored.
+        """
+        with self._lock:
+            if self.result is not None:
+                return self.result
+            duration = time.perf_counter() - self.started
+            try:
+                content = _to_json(value)
+            except (TypeError, ValueError) as e:
+                status, error = "error", e
+                content = _to_json({"error": f"Unserializable result: {e}"})
+            self.result = ToolResult(
+                call=self.call, content=content, status=status, duration=duration
+            )
+
+        TOOL_SECONDS.observe(duration, self.name)
+        TOOL_CALLS.inc(self.name, status)
+        set_lazy_attributes(
+            self.span,
+            lambda: {
+                SpanAttributes.OUTPUT_VALUE: content,
+                "tool.status": status,
+            },
+        )
+        if error is not None:
+            record_error(self.span, error, self.name, _tool_attributes(self.name))
+        self.span.end()
+        return self.result
+
+
+def _tool_attributes(name: str) -> dict:
+    """
+    Attributes set when a tool span starts, used for sampling.
+    """
+    return {
+        SpanAttributes.OPENINFERENCE_SPAN_KIND: OpenInferenceSpanKindValues.TOOL.value,
+        SpanAttributes.TOOL_NAME: name,
+    }
+
+
+class ToolAgent:
+    """
+    Runs the tool calls requested by the model until it answers with text.
+
+    Each turn, every tool call requested by the model is dispatched at once to
+    a thread pool, and all their results are sent back in the next request,
+    so independent lookups cost a single model round trip. A call that does
+    not finish within its tool's timeout, that raises, or whose arguments
+    are malformed, is reported to the model as an error instead of failing
+    the run.
+
+    Usage:
+        agent = ToolAgent(client, "gpt-4o-mini", toctoc_tools(api_client))
+        result = agent.run([ChatMessage(role="user", content="...")])
+    """
+
+    def __init__(
+        self,
+        client: OpenAIClient,
+        model: str,
+        tools: list[Tool],
+        max_steps: int = 5,
+        max_workers: int = 8,
+        temperature: float = 1.0,
+        template: str = "agent",
+    ):
+        """
+        Initializes the agent.
+
+        Args:
+            client (OpenAIClient): The client used for the model requests.
+            model (str): The model to use.
+            tools (list[Tool]): The tools the model may call.
+            max_steps (int): Maximum model round trips per run.
+            max_workers (int): Tool calls running at the same time.
+            temperature (float): The temperature parameter for the API.
+            template (str): Template label of the token usage metrics, e.g.
+            "TASAR" for an agent serving TASAR conversations.
+        """
+        self.client = client
+        self.model = model
+        self.tools = {tool.name: tool for tool in tools}
+        self.definitions = [tool.definition for tool in tools]
+        self.max_steps = max_steps
+        self.temperature = temperature
+        self.template = template
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="toctoc-tool"
+        )
+
+    def run(self, messages: list[ChatMessage]) -> AgentResult:
+        """
+        Runs the conversation until the model answers with text.
+
+        Args:
+            messages (list[ChatMessage]): The conversation so far. It is not
+            modified; the extended conversation is returned.
+
+        Returns:
+            AgentResult: The answer, the conversation and the tool results.
+
+        Raises:
+            ToolLoopLimitError: If the model requested tools in every one of
+            the `max_steps` round trips.
+        """
+        messages = list(messages)
+        tool_results: list[ToolResult] = []
+        with TRACER.start_as_current_span(
+            "Agent",
+            attributes={
+                SpanAttributes.OPENINFERENCE_SPAN_KIND: OpenInferenceSpanKindValues.AGENT.value,
+                SpanAttributes.LLM_MODEL_NAME: self.model,
+            },
+        ) as span:
+            for step in range(1, self.max_steps + 1):
+                output = self.client.tool_call(
+                    self.model,
+                    messages,
+                    self.definitions,
+                    self.temperature,
+                    template=self.template,
+                )
+                messages.append(output.message())
+                if not output.tool_calls:
+                    set_lazy_attributes(
+                        span,
+                        lambda: {
+                            SpanAttributes.OUTPUT_VALUE: output.content or "",
+                            "agent.steps": step,
+                            "agent.tool_calls": len(tool_results),
+                        },
+                    )
+                    return AgentResult(
+                        content=output.content,
+                        messages=messages,
+                        steps=step,
+                        tool_results=tool_results,
+                    )
+
+                results = self.dispatch(output.tool_calls)
+                tool_results.extend(results)
+                messages.extend(
+                    ToolResultMessage(
+                        role="tool",
+                        content=result.content,
+                        tool_call_id=result.call.id,
+                    )
+                    for result in results
+                )
+        raise ToolLoopLimitError(
+            f"The model still requested tools after {self.max_steps} steps"
+        )
+
+    def dispatch(self, calls: list[ToolCall]) -> list[ToolResult]:
+        """
+        Runs tool calls concurrently and waits for all of them.
+
+        Each call gets its own span, child of the current one. The timeout of
+        each call counts from the moment it is dispatched. Calls with an
+        unknown tool or malformed arguments are reported as errors without
+        running.
+
+        A timed out call that is still queued is cancelled, but a handler
+        already running cannot be interrupted: it keeps its worker thread
+        until it returns, and its result is discarded.
+
+        Args:
+            calls (list[ToolCall]): The calls requested by the model.
+
+        Returns:
+            list[ToolResult]: One result per call, in the same order.
+        """
+        runs: list[tuple[_ToolRun, Optional[Tool], Optional[Future]]] = []
+        for call in calls:
+            span = TRACER.start_span(
+                call.function_name, attributes=_tool_attributes(call.function_name)
+            )
+            set_lazy_attributes(
+                span,
+                lambda arguments=call.arguments: {
+                    SpanAttributes.INPUT_VALUE: _to_json(arguments)
+                },
+            )
+            run = _ToolRun(call, span)
+            tool = self.tools.get(call.function_name)
+            if tool is None or call.arguments_error is not None:
+                if tool is None:
+                    error = KeyError(f"Unknown tool: {call.function_name}")
+                else:
+                    error = ValueError(call.arguments_error)
+                run.finish("error", {"error": str(error)}, error)
+                runs.append((run, None, None))
+            else:
+                runs.append((run, tool, self._executor.submit(run.run, tool.handler)))
+
+        results = []
+        for run, tool, future in runs:
+            if future is not None:
+                remaining = run.started + tool.timeout - time.perf_counter()
+                try:
+                    future.result(timeout=max(0.0, remaining))
+                except FutureTimeoutError:
+                    # Calls still queued behind `max_workers` never start.
+                    future.cancel()
+                    LOGGER.warning(f"Tool {run.name} timed out after {tool.timeout}s")
+                    error = TimeoutError(
+                        f"{run.name} did not finish in {tool.timeout}s"
+                    )
+                    run.finish("timeout", {"error": str(error)}, error)
+            results.append(run.result)
+        return results
+
+    def close(self) -> None:
+        """
+        Stops the tool threads, without waiting for timed out calls.
+        """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,369 @@
+import bisect
+import logging
+import time
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+LOGGER = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base class of the metrics, holding one value per combination of labels.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock = Lock()
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            lines.extend(self._render_value(values, value))
+        return lines
+
+    def _render_value(self, values: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, values)} {value}"]
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, such as a number of requests.
+    """
+
+    kind = "counter"
+
+    def inc(self, *values, amount: float = 1) -> None:
+        """
+        Increments the counter of the given label values.
+        """
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def snapshot(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    """
+    A value that goes up and down, such as the requests in flight.
+    """
+
+    kind = "gauge"
+
+    def dec(self, *values, amount: float = 1) -> None:
+        """
+        Decrements the gauge of the given label values.
+        """
+        self.inc(*values, amount=-amount)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in fixed buckets, such as latencies.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *values) -> None:
+        """
+        Records an observation for the given label values.
+        """
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._values.get(values)
+            if histogram is None:
+                histogram = self._values[values] = _HistogramValue(
+                    len(self.buckets) + 1
+                )
+            histogram.buckets[position] += 1
+            histogram.count += 1
+            histogram.sum += value
+
+    def _render_value(self, values: tuple, value: _HistogramValue) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), value.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(self.labels, values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, values)
+        lines.append(f"{self.name}_sum{labels} {value.sum}")
+        lines.append(f"{self.name}_count{labels} {value.count}")
+        return lines
+
+    def quantile(self, value: _HistogramValue, q: float) -> float:
+        """
+        Estimates a quantile by linear interpolation inside its bucket.
+        """
+        if not value.count:
+            return 0.0
+        rank = q * value.count
+        cumulative = 0
+        for position, count in enumerate(value.buckets):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[position - 1] if position else 0.0
+                if position == len(self.buckets):
+                    return lower
+                upper = self.buckets[position]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict[tuple, dict[str, float]]:
+        with self._lock:
+            items = [
+                (values, value.count, value.sum, list(value.buckets))
+                for values, value in self._values.items()
+            ]
+        result = {}
+        for values, count, total, buckets in items:
+            value = _HistogramValue(0)
+            value.count, value.sum, value.buckets = count, total, buckets
+            result[values] = {
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else 0.0,
+                "p50": self.quantile(value, 0.5),
+                "p90": self.quantile(value, 0.9),
+                "p99": self.quantile(value, 0.99),
+            }
+        return result
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered together for Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels=()) -> Counter:
+        return self._register(Counter(name, description, tuple(labels)))
+
+    def gauge(self, name: str, description: str, labels=()) -> Gauge:
+        return self._register(Gauge(name, description, tuple(labels)))
+
+    def histogram(
+        self, name: str, description: str, labels=(), buckets=LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, description, tuple(labels), buckets))
+
+    def render_prometheus(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        """
+        Returns the current value of every metric.
+
+        Returns:
+            dict[str, list[dict]]: For each metric name, one entry per
+            combination of labels, with the labels and the value (or, for
+            histograms, the count, sum, mean and estimated percentiles).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {}
+        for metric in metrics:
+            entries = []
+            for values, value in metric.snapshot().items():
+                entry = dict(zip(metric.labels, values))
+                if isinstance(value, dict):
+                    entry.update(value)
+                else:
+                    entry["value"] = value
+                entries.append(entry)
+            result[metric.name] = entries
+        return result
+
+
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.histogram(
+    "toctoc_request_duration_seconds",
+    "Duration of outbound HTTP requests.",
+    ("service", "endpoint"),
+)
+RESPONSES = METRICS.counter(
+    "toctoc_responses_total",
+    "Outbound HTTP responses by status code.",
+    ("service", "endpoint", "status"),
+)
+IN_FLIGHT = METRICS.gauge(
+    "toctoc_requests_in_flight",
+    "Outbound HTTP requests waiting for a response.",
+    ("service", "endpoint"),
+)
+LLM_TOKENS = METRICS.counter(
+    "toctoc_llm_tokens_total",
+    "Tokens used by chat completions, by template.",
+    ("template", "type"),
+)
+CONVERSATIONS = METRICS.counter(
+    "toctoc_conversations_total",
+    "Conversations started, by template.",
+    ("template",),
+)
+
+
+class RequestTimer:
+    """
+    Records the latency, status and in-flight count of an outbound request.
+
+    Use it as a context manager around the request and set `status` to the
+    response status code; requests failing with an exception are counted with
+    the "error" status. Streamed requests call `start` and `finish` instead.
+    """
+
+    __slots__ = ("service", "endpoint", "status", "_started_at")
+
+    def __init__(self, service: str, endpoint: str):
+        self.service = service
+        self.endpoint = endpoint
+        self.status: Optional[int] = None
+        self._started_at: Optional[float] = None
+
+    def start(self) -> "RequestTimer":
+        IN_FLIGHT.inc(self.service, self.endpoint)
+        self._started_at = time.perf_counter()
+        return self
+
+    def finish(self, status=None) -> None:
+        """
+        Records the request, once.
+        """
+        if self._started_at is None:
+            return
+        elapsed = time.perf_counter() - self._started_at
+        self._started_at = None
+        IN_FLIGHT.dec(self.service, self.endpoint)
+        REQUEST_SECONDS.observe(elapsed, self.service, self.endpoint)
+        RESPONSES.inc(self.service, self.endpoint, status or self.status or "error")
+
+    def __enter__(self) -> "RequestTimer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.finish(self.status if exc_type is None else None)
+
+
+def record_token_usage(template: str, usage: Optional[dict]) -> None:
+    """
+    Counts the prompt and completion tokens of a chat completion.
+
+    Args:
+        template (str): The template of the conversation.
+        usage (Optional[dict]): The `usage` object of the API response.
+    """
+    if not usage:
+        return
+    LLM_TOKENS.inc(template, "prompt", amount=usage.get("prompt_tokens", 0))
+    LLM_TOKENS.inc(template, "completion", amount=usage.get("completion_tokens", 0))
+
+
+def start_metrics_server(
+    port: int = 9464, host: str = "127.0.0.1", registry: MetricsRegistry = METRICS
+) -> "ThreadingHTTPServer":
+    """
+    Serves the metrics at `http://host:port/metrics` from a daemon thread.
+
+    Args:
+        port (int): The port to listen on.
+        host (str): The interface to listen on.
+        registry (MetricsRegistry): The metrics to serve.
+
+    Returns:
+        ThreadingHTTPServer: The server, stopped with `shutdown()`.
+    """
+    # Imported here, http.server is only needed by processes serving metrics.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header(
+                "Content-Type", "text/plain; version=0.0.4; charset=utf-8"
+            )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            LOGGER.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    LOGGER.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
@@ -1,13 +1,26 @@
 import json
+from collections import OrderedDict
+from threading import Lock
 from typing import Optional, Any
+from urllib.parse import urlparse
 
 import requests
 from pydantic import BaseModel
 from openinference.semconv.trace import OpenInferenceSpanKindValues, SpanAttributes
 
-from toctoc.tracing import TracerProvider
+from toctoc.metrics import RequestTimer, record_token_usage
+from toctoc.streaming import (
+    OPENAI_CHAT_COMPLETIONS_URL,
+    ChatCompletionStream,
+    open_chat_completion_stream,
+)
+from toctoc.tracing import DeferredTracer, record_error, set_lazy_attributes
 
-TRACER = TracerProvider.get_tracer("toctoc-test")
+# Set up when the first span starts, see DeferredTracer.
+TRACER = DeferredTracer("toctoc-test")
+
+# Default template label of the tokens used by function calls.
+FUNCTION_CALL_TEMPLATE = "function_call"
 
 
 class ChatMessage(BaseModel):
@@ -23,6 +36,28 @@ class ChatMessage(BaseModel):
     content: Optional[str] = None
 
 
+class ToolCallsMessage(ChatMessage):
+    """
+    An assistant message requesting one or more tool calls.
+
+    Attributes:
+        tool_calls (list[dict]): The tool calls, as returned by the API.
+    """
+
+    tool_calls: list[dict[str, Any]]
+
+
+class ToolResultMessage(ChatMessage):
+    """
+    The result of a tool call, sent back to the model.
+
+    Attributes:
+        tool_call_id (str): The id of the tool call answered.
+    """
+
+    tool_call_id: str
+
+
 class FunctionSchema(BaseModel):
     """
     Represents a function definition for OpenAI API function calling.
@@ -51,6 +86,131 @@ class FunctionCallOutput(BaseModel):
     arguments: dict
 
 
+class ToolCall(BaseModel):
+    """
+    Represents one tool call requested by the model.
+
+    Attributes:
+        id (str): The id of the call, echoed in its ToolResultMessage.
+        function_name (str): The name of the function to call.
+        arguments (dict): The arguments to pass to the function.
+        arguments_error (Optional[str]): Why the arguments written by the
+        model could not be parsed, in which case `arguments` is empty.
+    """
+
+    id: str
+    function_name: str
+    arguments: dict
+    arguments_error: Optional[str] = None
+
+    @classmethod
+    def from_response(cls, call: dict) -> "ToolCall":
+        """
+        Builds the call from a `tool_calls` item of the API response.
+
+        Malformed arguments do not raise: they are reported in
+        `arguments_error`, so the error can be sent back to the model.
+        """
+        function = call.get("function")
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+            if not isinstance(arguments, dict):
+                raise ValueError(f"expected an object, got {type(arguments).__name__}")
+        except ValueError as e:
+            return cls(
+                id=call.get("id"),
+                function_name=function.get("name"),
+                arguments={},
+                arguments_error=f"Invalid arguments: {e}",
+            )
+        return cls(
+            id=call.get("id"), function_name=function.get("name"), arguments=arguments
+        )
+
+
+class ToolCallsOutput(BaseModel):
+    """
+    Represents the output of a tool call request from the OpenAI API.
+
+    Attributes:
+        content (Optional[str]): The text answer, if the model answered.
+        tool_calls (list[ToolCall]): The tool calls requested, possibly
+        several to run in parallel.
+    """
+
+    content: Optional[str] = None
+    tool_calls: list[ToolCall] = []
+
+    def message(self) -> ChatMessage:
+        """
+        Returns the assistant message to append to the conversation.
+        """
+        if not self.tool_calls:
+            return ChatMessage(role="assistant", content=self.content)
+        return ToolCallsMessage(
+            role="assistant",
+            content=self.content,
+            tool_calls=[
+                {
+                    "id": call.id,
+                    "type": "function",
+                    "function": {
+                        "name": call.function_name,
+                        "arguments": json.dumps(call.arguments),
+                    },
+                }
+                for call in self.tool_calls
+            ],
+        )
+
+
+class FunctionCallStream(ChatCompletionStream):
+    """
+    A streamed function call, consumed as an iterator of argument deltas.
+    """
+
+    @property
+    def output(self) -> FunctionCallOutput:
+        """The function call assembled from the stream, once it is exhausted."""
+        return FunctionCallOutput(
+            function_name=self.function_name,
+            arguments=json.loads(self.function_arguments or "{}"),
+        )
+
+
+class _EncodedMessages:
+    """
+    The JSON encoding of a conversation, extended as messages are appended.
+    """
+
+    def __init__(self):
+        self.messages: list[ChatMessage] = []
+        self.encoded = ""
+
+    def encode(self, messages: list[ChatMessage]) -> str:
+        """
+        Returns the comma-separated JSON encoding of `messages`.
+
+        Only messages appended since the previous call are encoded. If the
+        conversation was not extended (any message already encoded was
+        replaced or removed, e.g. by compaction), it is encoded again from
+        scratch.
+        """
+        count = len(self.messages)
+        extended = count <= len(messages) and all(
+            a is b for a, b in zip(messages, self.messages)
+        )
+        if not extended:
+            self.messages, self.encoded, count = [], "", 0
+
+        new = messages[count:]
+        if new:
+            encoded = ",".join(msg.model_dump_json() for msg in new)
+            self.encoded = f"{self.encoded},{encoded}" if self.encoded else encoded
+            self.messages.extend(new)
+        return self.encoded
+
+
 class OpenAIClient:
     """
     A client for interacting with OpenAI's API.
@@ -61,26 +221,40 @@ class OpenAIClient:
         headers (dict): The headers for the API requests.
     """
 
-    def __init__(self, api_key: str):
+    MAX_CACHED_CONVERSATIONS = 64
+    MAX_CACHED_FUNCTION_LISTS = 64
+
+    def __init__(self, api_key: str, api_url: str = OPENAI_CHAT_COMPLETIONS_URL):
         """
         Initializes the OpenAIClient with the API key.
 
         Args:
             api_key (str): Your OpenAI API key.
+            api_url (str): The chat completions endpoint, e.g. a local mock.
         """
         self.api_key = api_key
-        self.api_url = "https://api.openai.com/v1/chat/completions"
+        self.api_url = api_url
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        # Encoded conversations keyed by the id of their first message, and
+        # encoded function lists keyed by the ids of their schemas, both
+        # evicting the least recently used entry when full.
+        self._conversations: OrderedDict[int, tuple] = OrderedDict()
+        self._function_lists: OrderedDict[tuple, tuple] = OrderedDict()
+        self._encoding_lock = Lock()
 
-    def _send_request(self, payload: dict) -> dict:
+    def _send_request(
+        self, payload: dict | bytes, template: str = FUNCTION_CALL_TEMPLATE
+    ) -> dict:
         """
         Sends an HTTP POST request to the OpenAI API.
 
         Args:
-            payload (dict): The payload for the API request.
+            payload (dict | bytes): The payload for the API request, or its
+            already encoded JSON body.
+            template (str): Template label of the tokens used.
 
         Returns:
             dict: The response from the OpenAI API.
@@ -88,12 +262,113 @@ class OpenAIClient:
         Raises:
             Exception: If the API request fails.
         """
-        response = requests.post(self.api_url, json=payload, headers=self.headers)
+        with RequestTimer("openai", urlparse(self.api_url).path) as timer:
+            if isinstance(payload, bytes):
+                response = requests.post(
+                    self.api_url, data=payload, headers=self.headers
+                )
+            else:
+                response = requests.post(
+                    self.api_url, json=payload, headers=self.headers
+                )
+            timer.status = response.status_code
         if response.status_code != 200:
             raise Exception(
                 f"API request failed with status code {response.status_code}: {response.text}"
             )
-        return response.json()
+        data = response.json()
+        record_token_usage(template, data.get("usage"))
+        return data
+
+    def _encode_messages(self, messages: list[ChatMessage]) -> str:
+        """
+        Encodes the messages, reusing the encoding of earlier turns.
+
+        Conversations are expected to be append-only: a message must not be
+        modified once it has been sent.
+        """
+        if not messages:
+            return ""
+        key = id(messages[0])
+        with self._encoding_lock:
+            cached = self._conversations.get(key)
+            # Holding the first message keeps its id from being reused.
+            if cached is None or cached[0] is not messages[0]:
+                cached = (messages[0], _EncodedMessages())
+                self._conversations[key] = cached
+            self._conversations.move_to_end(key)
+            while len(self._conversations) > self.MAX_CACHED_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+            return cached[1].encode(messages)
+
+    def _encode_functions(
+        self, functions: list[FunctionSchema], as_tools: bool = False
+    ) -> str:
+        """
+        Encodes the function list once per distinct list of schemas.
+
+        With `as_tools`, each function is wrapped as a tool of type
+        "function". Function schemas must not be modified once they have been
+        sent.
+        """
+        key = (as_tools,) + tuple(id(fn) for fn in functions)
+        with self._encoding_lock:
+            cached = self._function_lists.get(key)
+            if cached is not None:
+                self._function_lists.move_to_end(key)
+                return cached[1]
+        if as_tools:
+            items = (
+                '{"type":"function","function":' + fn.model_dump_json() + "}"
+                for fn in functions
+            )
+        else:
+            items = (fn.model_dump_json() for fn in functions)
+        encoded = "[" + ",".join(items) + "]"
+        with self._encoding_lock:
+            # Holding the schemas keeps their ids from being reused.
+            self._function_lists[key] = (tuple(functions), encoded)
+            while len(self._function_lists) > self.MAX_CACHED_FUNCTION_LISTS:
+                self._function_lists.popitem(last=False)
+        return encoded
+
+    def _build_body(
+        self,
+        model: str,
+        messages: list[ChatMessage],
+        functions: list[FunctionSchema],
+        temperature: float,
+        stream: bool = False,
+        as_tools: bool = False,
+    ) -> tuple[bytes, str]:
+        """
+        Builds the encoded chat completions body for a function call.
+
+        Only the messages added since the previous call of the same
+        conversation are encoded; functions are encoded once. With
+        `as_tools`, the functions are sent as `tools`, allowing the model to
+        request several calls at once.
+
+        Returns:
+            tuple[bytes, str]: The request body and the encoded function list.
+        """
+        functions_json = self._encode_functions(functions, as_tools)
+        body = (
+            '{"model":'
+            + json.dumps(model)
+            + ',"messages":['
+            + self._encode_messages(messages)
+            + ('],"tools":' if as_tools else '],"functions":')
+            + functions_json
+            + ',"temperature":'
+            + json.dumps(temperature)
+            + (
+                ',"stream":true,"stream_options":{"include_usage":true}}'
+                if stream
+                else "}"
+            )
+        )
+        return body.encode("utf-8"), functions_json
 
     def function_call(
         self,
@@ -101,6 +376,7 @@ class OpenAIClient:
         messages: list[ChatMessage],
         functions: list[FunctionSchema],
         temperature: float = 1.0,
+        template: str = FUNCTION_CALL_TEMPLATE,
     ) -> FunctionCallOutput:
         """
         Performs a function call using the OpenAI API.
@@ -112,43 +388,207 @@ class OpenAIClient:
             functions (List[FunctionSchema]): A list of function definitions.
             temperature (float): The temperature parameter for the API.
             Defaults to 1.0.
+            template (str): Template label of the token usage metrics,
+            e.g. "TASAR".
 
         Returns:
             dict: The API response as a dictionary.
         """
-        with TRACER.start_as_current_span("FunctionCall") as span:
-            payload = {
-                "model": model,
-                "messages": [msg.model_dump() for msg in messages],
-                "functions": [fn.model_dump() for fn in functions],
-                "temperature": temperature,
-            }
+        with TRACER.start_as_current_span(
+            "FunctionCall",
+            attributes=self._span_attributes(model),
+            record_exception=False,
+            set_status_on_exception=False,
+        ) as span:
+            try:
+                body, functions_json = self._build_body(
+                    model, messages, functions, temperature
+                )
+                response = self._send_request(body, template)
+                function_call = (
+                    response.get("choices")[0].get("message").get("function_call")
+                )
+                output = FunctionCallOutput(
+                    function_name=function_call.get("name"),
+                    arguments=json.loads(function_call.get("arguments")),
+                )
+            except Exception as e:
+                record_error(span, e, "FunctionCall", self._span_attributes(model))
+                raise
 
-            span.set_attributes(
-                {
-                    SpanAttributes.OPENINFERENCE_SPAN_KIND: OpenInferenceSpanKindValues.CHAIN.value,
-                    SpanAttributes.LLM_FUNCTION_CALL: json.dumps(
-                        payload.get("functions")
+            set_lazy_attributes(
+                span,
+                lambda: {
+                    SpanAttributes.LLM_FUNCTION_CALL: functions_json,
+                    SpanAttributes.OUTPUT_VALUE: json.dumps(output.dict()),
+                    SpanAttributes.LLM_INVOCATION_PARAMETERS: json.dumps(
+                        {
+                            "model": model,
+                            "temperature": temperature,
+                        }
                     ),
-                }
+                },
             )
-            response = self._send_request(payload)
-            function_call = (
-                response.get("choices")[0].get("message").get("function_call")
-            )
-            output = FunctionCallOutput(
-                function_name=function_call.get("name"),
-                arguments=json.loads(function_call.get("arguments")),
-            )
-            span.set_attributes(
-                {
-                    SpanAttributes.OUTPUT_VALUE: json.dumps(output.dict()),
+            return output
+
+    def tool_call(
+        self,
+        model: str,
+        messages: list[ChatMessage],
+        tools: list[FunctionSchema],
+        temperature: float = 1.0,
+        template: str = FUNCTION_CALL_TEMPLATE,
+    ) -> ToolCallsOutput:
+        """
+        Asks the model for tool calls, possibly several in parallel.
+
+        Unlike `function_call`, the functions are sent as `tools`, and the
+        model either requests any number of tool calls or answers with text.
+        See `toctoc.agent.ToolAgent` to run the calls and send their results.
+
+        Args:
+            model (str): The model to use (e.g., "gpt-4o-mini").
+            messages (List[ChatMessage]): A list of messages in the
+            conversation.
+            tools (List[FunctionSchema]): The functions the model may call.
+            temperature (float): The temperature parameter for the API.
+            Defaults to 1.0.
+            template (str): Template label of the token usage metrics,
+            e.g. "TASAR".
+
+        Returns:
+            ToolCallsOutput: The answer or the tool calls requested.
+        """
+        with TRACER.start_as_current_span(
+            "ToolCall",
+            attributes=self._span_attributes(model),
+            record_exception=False,
+            set_status_on_exception=False,
+        ) as span:
+            try:
+                body, tools_json = self._build_body(
+                    model, messages, tools, temperature, as_tools=True
+                )
+                response = self._send_request(body, template)
+                message = response.get("choices")[0].get("message")
+                output = ToolCallsOutput(
+                    content=message.get("content"),
+                    tool_calls=[
+                        ToolCall.from_response(call)
+                        for call in message.get("tool_calls") or []
+                    ],
+                )
+            except Exception as e:
+                record_error(span, e, "ToolCall", self._span_attributes(model))
+                raise
+
+            set_lazy_attributes(
+                span,
+                lambda: {
+                    SpanAttributes.LLM_FUNCTION_CALL: tools_json,
+                    SpanAttributes.OUTPUT_VALUE: output.model_dump_json(),
                     SpanAttributes.LLM_INVOCATION_PARAMETERS: json.dumps(
                         {
                             "model": model,
                             "temperature": temperature,
                         }
                     ),
-                }
+                },
             )
             return output
+
+    @staticmethod
+    def _span_attributes(model: str) -> dict:
+        """
+        Attributes set when a FunctionCall span starts, used for sampling.
+        """
+        return {
+            SpanAttributes.OPENINFERENCE_SPAN_KIND: OpenInferenceSpanKindValues.CHAIN.value,
+            SpanAttributes.LLM_MODEL_NAME: model,
+        }
+
+    def stream_function_call(
+        self,
+        model: str,
+        messages: list[ChatMessage],
+        functions: list[FunctionSchema],
+        temperature: float = 1.0,
+        template: str = FUNCTION_CALL_TEMPLATE,
+    ) -> FunctionCallStream:
+        """
+        Performs a function call using the OpenAI API, streaming the response.
+
+        Iterating the returned stream (with `for` or `async for`) yields the
+        deltas as they arrive; once it is exhausted, `stream.output` holds the
+        FunctionCallOutput. The tracing span ends with the stream and records
+        the time to first token and the total time.
+
+        Args:
+            model (str): The model to use (e.g., "gpt-3.5-turbo-0613").
+            messages (List[ChatMessage]): A list of messages in the
+            conversation.
+            functions (List[FunctionSchema]): A list of function definitions.
+            temperature (float): The temperature parameter for the API.
+            Defaults to 1.0.
+            template (str): Template label of the token usage metrics,
+            e.g. "TASAR".
+
+        Returns:
+            FunctionCallStream: The stream of deltas.
+        """
+        span = TRACER.start_span(
+            "FunctionCall", attributes=self._span_attributes(model)
+        )
+        body, functions_json = self._build_body(
+            model, messages, functions, temperature, stream=True
+        )
+        set_lazy_attributes(
+            span,
+            lambda: {
+                SpanAttributes.LLM_FUNCTION_CALL: functions_json,
+                SpanAttributes.LLM_INVOCATION_PARAMETERS: json.dumps(
+                    {
+                        "model": model,
+                        "temperature": temperature,
+                        "stream": True,
+                    }
+                ),
+            },
+        )
+
+        def on_close(stream: FunctionCallStream) -> None:
+            def attributes() -> dict:
+                values = {"llm.total_time_ms": stream.total_time * 1000}
+                if stream.time_to_first_token is not None:
+                    values["llm.time_to_first_token_ms"] = (
+                        stream.time_to_first_token * 1000
+                    )
+                if stream.function_name is not None:
+                    values[SpanAttributes.OUTPUT_VALUE] = json.dumps(
+                        {
+                            "function_name": stream.function_name,
+                            "arguments": stream.function_arguments,
+                        }
+                    )
+                return values
+
+            set_lazy_attributes(span, attributes)
+            record_token_usage(template, stream.usage)
+            if stream.error is not None:
+                record_error(
+                    span, stream.error, "FunctionCall", self._span_attributes(model)
+                )
+            span.end()
+
+        try:
+            return open_chat_completion_stream(
+                self.api_url,
+                self.headers,
+                body,
+                on_close=on_close,
+                stream_class=FunctionCallStream,
+            )
+        except Exception as e:
+            record_error(span, e, "FunctionCall", self._span_attributes(model))
+            span.end()
+            raise
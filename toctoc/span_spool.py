@@ -0,0 +1,328 @@
+import argparse
+import fcntl
+import logging
+import os
+import struct
+import time
+import uuid
+from threading import Lock
+from typing import Iterator, Optional, Sequence
+
+import requests
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+LOGGER = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "spans-"
+SEGMENT_SUFFIX = ".otlp"
+OPEN_SUFFIX = ".open"
+
+# Each record is a serialized OTLP ExportTraceServiceRequest, length prefixed.
+_LENGTH = struct.Struct(">I")
+
+
+def _segment_sequence(name: str) -> Optional[int]:
+    """
+    Returns the sequence number of a segment file name, or None.
+
+    Segment names are `spans-<sequence>-<writer>.otlp`, where the writer id
+    keeps the segments of processes sharing a spool apart (older segments
+    have no writer id).
+    """
+    if not name.startswith(SEGMENT_PREFIX):
+        return None
+    stem = name[len(SEGMENT_PREFIX) :]
+    for suffix in (SEGMENT_SUFFIX + OPEN_SUFFIX, SEGMENT_SUFFIX):
+        if stem.endswith(suffix):
+            sequence, _, writer = stem[: -len(suffix)].partition("-")
+            return int(sequence) if sequence.isdigit() else None
+    return None
+
+
+def sealed_segments(directory: str) -> list[str]:
+    """
+    Returns the paths of the segments no longer written to, oldest first.
+    """
+    names = [
+        name
+        for name in os.listdir(directory)
+        if name.endswith(SEGMENT_SUFFIX) and _segment_sequence(name) is not None
+    ]
+    names.sort(key=lambda name: (_segment_sequence(name), name))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _recover_segment(path: str) -> None:
+    """
+    Seals an open segment if its writer is gone.
+
+    Writers hold an exclusive lock on their open segment, released by the
+    system when the process dies, so a segment that can be locked was left
+    open by a crashed process.
+    """
+    try:
+        with open(path, "ab") as file:
+            try:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # Still written to by a live process.
+            os.replace(path, path[: -len(OPEN_SUFFIX)])
+    except FileNotFoundError:
+        pass  # Recovered by another process in the meantime.
+
+
+def recover_segments(directory: str) -> None:
+    """
+    Seals the open segments of the spool whose writers are gone.
+    """
+    for name in os.listdir(directory):
+        if name.endswith(OPEN_SUFFIX) and _segment_sequence(name) is not None:
+            _recover_segment(os.path.join(directory, name))
+
+
+def iter_segment_records(path: str) -> Iterator[bytes]:
+    """
+    Iterates over the records of a segment file.
+
+    A record cut short by a crash ends the iteration.
+
+    Args:
+        path (str): The segment file.
+
+    Yields:
+        bytes: Each serialized OTLP export request.
+    """
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(header)
+            record = file.read(length)
+            if len(record) < length:
+                LOGGER.warning(f"Truncated record at the end of {path}")
+                return
+            yield record
+
+
+class SpoolSpanExporter(SpanExporter):
+    """
+    Exports spans to rotating segment files on local disk.
+
+    Each export call appends one length-prefixed OTLP protobuf record to the
+    open segment (`spans-<n>-<writer>.otlp.open`), locked while it is written
+    to. Once it exceeds `max_segment_bytes` the segment is sealed (renamed to
+    `spans-<n>-<writer>.otlp`) and a new one is opened. Several processes may
+    share a spool: each writes its own segments. Beyond `max_segments` the
+    oldest sealed segments are deleted. Writes are fsynced at most every
+    `fsync_interval` seconds, and always when a segment is sealed. Sealed
+    segments are shipped to a collector with `replay_spool`.
+
+    Attributes:
+        exported_spans (int): Spans written to the spool.
+        deleted_segments (int): Segments deleted to respect `max_segments`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        max_segments: int = 64,
+        fsync_interval: float = 1.0,
+    ):
+        """
+        Initializes the exporter, sealing segments left open by processes
+        that are gone. Segments of live processes are left alone.
+
+        Args:
+            directory (str): Directory of the segment files, created if needed.
+            max_segment_bytes (int): Size above which a segment is sealed.
+            max_segments (int): Maximum segment files kept on disk.
+            fsync_interval (float): Maximum seconds between fsyncs.
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.fsync_interval = fsync_interval
+
+        self.exported_spans = 0
+        self.deleted_segments = 0
+
+        self._lock = Lock()
+        self._file = None
+        self._size = 0
+        self._last_fsync = time.monotonic()
+        self._shutdown = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._writer = f"{os.getpid()}{uuid.uuid4().hex[:8]}"
+        self._sequence = 0
+        recover_segments(directory)
+        for name in os.listdir(directory):
+            sequence = _segment_sequence(name)
+            if sequence is not None:
+                self._sequence = max(self._sequence, sequence + 1)
+
+    def _open_path(self) -> str:
+        name = (
+            f"{SEGMENT_PREFIX}{self._sequence:08d}-{self._writer}"
+            f"{SEGMENT_SUFFIX}{OPEN_SUFFIX}"
+        )
+        return os.path.join(self.directory, name)
+
+    def _create_segment(self):
+        """
+        Creates the open segment, already locked when it gets its name, so
+        other processes never take it for a segment left by a crash.
+        """
+        path = self._open_path()
+        file = open(f"{path}.new", "ab")
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        os.replace(f"{path}.new", path)
+        return file
+
+    def _seal(self) -> None:
+        """
+        Closes the open segment and makes it available to `replay_spool`.
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        path = self._open_path()
+        # Renamed before closing, so the lock covers the whole segment life.
+        os.replace(path, path[: -len(OPEN_SUFFIX)])
+        self._file.close()
+        self._file = None
+        self._sequence += 1
+        self._size = 0
+
+        segments = sealed_segments(self.directory)
+        for path in segments[: max(0, len(segments) - self.max_segments + 1)]:
+            os.remove(path)
+            self.deleted_segments += 1
+            LOGGER.warning(f"Span spool full, deleted {path}")
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        record = encode_spans(spans).SerializeToString()
+        with self._lock:
+            if self._shutdown:
+                return SpanExportResult.FAILURE
+            try:
+                if self._file is None:
+                    self._file = self._create_segment()
+                self._file.write(_LENGTH.pack(len(record)))
+                self._file.write(record)
+                self._size += _LENGTH.size + len(record)
+                self.exported_spans += len(spans)
+
+                if self._size >= self.max_segment_bytes:
+                    self._seal()
+                elif time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._last_fsync = time.monotonic()
+            except OSError:
+                LOGGER.exception("Could not write spans to the spool")
+                return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+        return True
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._shutdown = True
+            self._seal()
+
+
+def replay_spool(
+    directory: str,
+    endpoint: str,
+    headers: Optional[dict] = None,
+    timeout: float = 10.0,
+) -> int:
+    """
+    Ships the sealed segments of a spool to an OTLP/HTTP endpoint.
+
+    Segments left open by crashed writers are sealed first, like the
+    exporter does on startup. Segments are sent oldest first and deleted
+    once every record was accepted. If the endpoint fails, the segment keeps only the records not
+    sent yet and the replay stops, so it can be resumed later.
+
+    Args:
+        directory (str): The spool directory.
+        endpoint (str): The OTLP traces endpoint, e.g.
+            "http://localhost:6006/v1/traces".
+        headers (Optional[dict]): Extra request headers.
+        timeout (float): Seconds to wait for each request.
+
+    Returns:
+        int: The number of records sent.
+
+    Raises:
+        requests.exceptions.RequestException: If a record could not be sent.
+    """
+    headers = {"Content-Type": "application/x-protobuf", **(headers or {})}
+    sent = 0
+    recover_segments(directory)
+    with requests.Session() as session:
+        for path in sealed_segments(directory):
+            records = list(iter_segment_records(path))
+            for position, record in enumerate(records):
+                try:
+                    response = session.post(
+                        endpoint, data=record, headers=headers, timeout=timeout
+                    )
+                    response.raise_for_status()
+                except requests.exceptions.RequestException:
+                    _rewrite_segment(path, records[position:])
+                    raise
+                sent += 1
+            os.remove(path)
+            LOGGER.info(f"Replayed {len(records)} records from {path}")
+    return sent
+
+
+def _rewrite_segment(path: str, records: list[bytes]) -> None:
+    """
+    Atomically replaces a segment with the given records.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        for record in records:
+            file.write(_LENGTH.pack(len(record)))
+            file.write(record)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    parser = argparse.ArgumentParser(description="Span spool tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay = subparsers.add_parser("replay", help="Ship the spool to a collector")
+    replay.add_argument("directory", help="Spool directory")
+    replay.add_argument(
+        "--endpoint",
+        default="http://localhost:6006/v1/traces",
+        help="OTLP/HTTP traces endpoint",
+    )
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        sent = replay_spool(args.directory, args.endpoint)
+        LOGGER.info(f"Replayed {sent} records to {args.endpoint}")
+
+
+if __name__ == "__main__":
+    main()
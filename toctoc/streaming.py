@@ -0,0 +1,248 @@
+import asyncio
+import json
+import time
+from typing import Optional, Callable, Iterator, AsyncIterator, Union
+from urllib.parse import urlparse
+
+import requests
+
+from toctoc.metrics import RequestTimer
+
+OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+
+def iter_sse_data(response: requests.Response) -> Iterator[dict]:
+    """
+    Iterates over the JSON payloads of a server-sent events response.
+
+    Args:
+        response (requests.Response): A response opened with `stream=True`.
+
+    Yields:
+        dict: The parsed `data:` payload of each event, until `[DONE]`.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+
+class ChatCompletionStream:
+    """
+    A streamed chat completion, consumed as an iterator of text deltas.
+
+    Iterating (sync or async) yields content deltas, and function call
+    argument deltas when the model calls a function. Once the stream is
+    exhausted the assembled message is available through `content`,
+    `function_name` and `function_arguments`.
+
+    Attributes:
+        content (str): The assistant content received so far.
+        function_name (Optional[str]): The name of the called function, if any.
+        function_arguments (str): The raw JSON arguments received so far.
+        finish_reason (Optional[str]): Why the model stopped generating.
+        usage (Optional[dict]): Token usage, when the API reports it.
+    """
+
+    def __init__(
+        self,
+        response: requests.Response,
+        on_close: Optional[Callable[["ChatCompletionStream"], None]] = None,
+        started_at: Optional[float] = None,
+        timer: Optional[RequestTimer] = None,
+    ):
+        """
+        Initializes the stream.
+
+        Args:
+            response (requests.Response): A response opened with `stream=True`.
+            on_close (Optional[Callable]): Called once with the stream when it
+                is exhausted, fails or is closed.
+            started_at (Optional[float]): `time.perf_counter()` value when the
+                request was sent. Defaults to now.
+            timer (Optional[RequestTimer]): Request metrics, recorded when the
+                stream is closed.
+        """
+        self._response = response
+        self._on_close = on_close
+        self._timer = timer
+        self._events = iter_sse_data(response)
+        self._closed = False
+
+        self.content = ""
+        self.function_name: Optional[str] = None
+        self.function_arguments = ""
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+        if started_at is None:
+            started_at = time.perf_counter()
+        self.started_at = started_at
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds between the request and the first delta."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_time(self) -> Optional[float]:
+        """Seconds between the request and the end of the stream."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    def message(self) -> dict:
+        """Returns the assembled assistant message."""
+        message = {"role": "assistant", "content": self.content or None}
+        if self.function_name is not None:
+            message["function_call"] = {
+                "name": self.function_name,
+                "arguments": self.function_arguments,
+            }
+        return message
+
+    def _next_delta(self) -> str:
+        """Returns the next non-empty delta, or raises StopIteration."""
+        try:
+            for event in self._events:
+                if event.get("usage"):
+                    self.usage = event["usage"]
+                if not event.get("choices"):
+                    continue
+                choice = event["choices"][0]
+                self.finish_reason = choice.get("finish_reason") or self.finish_reason
+                delta = choice.get("delta") or {}
+
+                text = delta.get("content") or ""
+                self.content += text
+                function_call = delta.get("function_call")
+                if function_call:
+                    if function_call.get("name"):
+                        self.function_name = function_call["name"]
+                    arguments = function_call.get("arguments") or ""
+                    self.function_arguments += arguments
+                    text += arguments
+
+                if text:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                    return text
+        except BaseException as e:
+            self.error = e
+            self.close()
+            raise
+        self.close()
+        raise StopIteration
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        if self._closed:
+            raise StopIteration
+        return self._next_delta()
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self
+
+    async def __anext__(self) -> str:
+        if self._closed:
+            raise StopAsyncIteration
+        # Reading the socket blocks, so each delta is pulled on a worker thread.
+        delta = await asyncio.to_thread(self._next_delta_or_none)
+        if delta is None:
+            raise StopAsyncIteration
+        return delta
+
+    def _next_delta_or_none(self) -> Optional[str]:
+        try:
+            return self._next_delta()
+        except StopIteration:
+            return None
+
+    def read(self) -> "ChatCompletionStream":
+        """Consumes the rest of the stream and returns it."""
+        for _ in self:
+            pass
+        return self
+
+    def close(self) -> None:
+        """Closes the underlying connection and runs the `on_close` callback."""
+        if self._closed:
+            return
+        self._closed = True
+        self.finished_at = time.perf_counter()
+        self._response.close()
+        if self._timer is not None:
+            self._timer.finish(
+                self._response.status_code if self.error is None else None
+            )
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def __enter__(self) -> "ChatCompletionStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_chat_completion_stream(
+    url: str,
+    headers: dict,
+    payload: Union[dict, bytes],
+    on_close: Optional[Callable[[ChatCompletionStream], None]] = None,
+    stream_class: type = ChatCompletionStream,
+) -> ChatCompletionStream:
+    """
+    Sends a chat completion request with `stream` enabled.
+
+    Token usage is requested with the last event and is available through the
+    `usage` attribute of the stream once it is exhausted.
+
+    Args:
+        url (str): The chat completions endpoint.
+        headers (dict): The request headers.
+        payload (Union[dict, bytes]): The request payload, without the
+            `stream` options, or an already encoded JSON body that includes
+            them.
+        on_close (Optional[Callable]): Passed to the returned stream.
+        stream_class (type): The ChatCompletionStream subclass to return.
+
+    Returns:
+        ChatCompletionStream: The stream of deltas.
+
+    Raises:
+        Exception: If the API request fails.
+    """
+    started_at = time.perf_counter()
+    if isinstance(payload, bytes):
+        body = payload
+    else:
+        body = json.dumps(
+            {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        ).encode("utf-8")
+    timer = RequestTimer("openai", urlparse(url).path).start()
+    try:
+        response = requests.post(url, data=body, headers=headers, stream=True)
+    except BaseException:
+        timer.finish()
+        raise
+    if response.status_code != 200:
+        timer.finish(response.status_code)
+        text = response.text
+        response.close()
+        raise Exception(
+            f"API request failed with status code {response.status_code}: {text}"
+        )
+    return stream_class(
+        response, on_close=on_close, started_at=started_at, timer=timer
+    )
@@ -0,0 +1,97 @@
+from typing import TYPE_CHECKING, Any, Optional
+
+from client.api_client import PropertyDetails, RoleInformation, TocTocApiClient
+from toctoc.agent import Tool
+from toctoc.openai_client import FunctionSchema
+
+if TYPE_CHECKING:
+    from chat.prefetch import AppraisalPrefetcher
+
+SALE_APPRAISAL_FUNCTION = FunctionSchema(
+    name="tasar_propiedad",
+    description=(
+        "Tasa el precio de venta de una propiedad a partir de su ubicación y "
+        "sus características."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "lat": {"type": "number", "description": "Latitud"},
+            "long": {"type": "number", "description": "Longitud"},
+            "propertyFamilyTypeId": {
+                "type": "integer",
+                "description": "Tipo de propiedad: 1 casa, 2 departamento",
+            },
+            "usableArea": {"type": "number", "description": "Superficie útil en m2"},
+            "balconyArea": {"type": "number", "description": "Superficie de terraza"},
+            "parkingLots": {"type": "integer", "description": "Estacionamientos"},
+            "bedrooms": {"type": "integer", "description": "Dormitorios"},
+            "bathrooms": {"type": "integer", "description": "Baños"},
+            "yearConstruction": {
+                "type": "integer",
+                "description": "Año de construcción",
+            },
+            "warehouse": {"type": "integer", "description": "Bodegas"},
+            "commonExpense": {"type": "number", "description": "Gasto común"},
+            "role": {"type": "string", "description": "Rol de la propiedad"},
+        },
+        "required": ["lat", "long", "propertyFamilyTypeId", "usableArea"],
+    },
+)
+
+ROLE_INFORMATION_FUNCTION = FunctionSchema(
+    name="consultar_rol",
+    description=(
+        "Obtiene la dirección, avalúo fiscal, contribuciones y superficies de "
+        "una propiedad a partir de su rol y comuna."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "role": {"type": "string", "description": "Rol, por ejemplo 1234-22"},
+            "idCommune": {"type": "integer", "description": "Código de comuna"},
+        },
+        "required": ["role", "idCommune"],
+    },
+)
+
+
+def toctoc_tools(
+    api_client: TocTocApiClient,
+    timeout: float = 10.0,
+    prefetcher: Optional["AppraisalPrefetcher"] = None,
+) -> list[Tool]:
+    """
+    Returns the TocTocApiClient lookups as agent tools.
+
+    Args:
+        api_client (TocTocApiClient): The client making the requests. Its
+        caches, policy and request coalescing apply to the tool calls.
+        timeout (float): Seconds allowed to each tool call.
+        prefetcher (Optional[AppraisalPrefetcher]): If given, the lookups go
+        through it, reusing the calls it started during the conversation.
+
+    Returns:
+        list[Tool]: The `tasar_propiedad` and `consultar_rol` tools.
+    """
+    lookups = prefetcher if prefetcher is not None else api_client
+
+    def sale_appraisal(**arguments: Any) -> dict:
+        details = PropertyDetails.from_params(arguments)
+        return lookups.get_sale_appraisal(details)
+
+    def role_information(role: str, idCommune: int) -> RoleInformation:
+        return lookups.get_role_information(role, int(idCommune))
+
+    return [
+        Tool(
+            definition=SALE_APPRAISAL_FUNCTION,
+            handler=sale_appraisal,
+            timeout=timeout,
+        ),
+        Tool(
+            definition=ROLE_INFORMATION_FUNCTION,
+            handler=role_information,
+            timeout=timeout,
+        ),
+    ]
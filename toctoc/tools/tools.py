@@ -1,32 +1,126 @@
 import json
+import re
+from typing import Iterable, Iterator, Optional
 
+_STRUCTURAL = re.compile(r'[{}"\\]')
 
-def extract_json_from_text(text):
-    """Extracts a valid JSON from a given text.
 
-    Args:
-      text: The text from which JSON will be extracted.
+class JsonStreamExtractor:
+    """Incrementally extracts top-level JSON objects from streamed text.
 
-    Returns:
-      A Python dictionary representing the extracted JSON, or None if no valid
-      JSON is found.
+    Text can be fed in arbitrary chunks (e.g. completion deltas). Each
+    top-level `{...}` object is parsed and returned as soon as its closing
+    brace arrives. Braces inside JSON strings and escaped quotes are handled,
+    and text outside objects is skipped. Objects that turn out not to be valid
+    JSON are dropped.
     """
 
-    # Find the start and end positions of JSON
-    start = text.find("{")
-    end = text.rfind("}")
+    def __init__(self):
+        self._buffer: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Feeds a chunk of text.
+
+        Args:
+          chunk: The next piece of text.
+
+        Returns:
+          The JSON objects completed by this chunk, in order.
+        """
+        objects = []
+        start = 0 if self._depth else None
+        position = 0
+        while True:
+            if self._escape and position < len(chunk):
+                self._escape = False
+                position += 1
+            match = _STRUCTURAL.search(chunk, position)
+            if match is None:
+                break
+            char = match.group()
+            position = match.end()
+
+            if self._in_string:
+                if char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._depth > 0
+            elif char == "{":
+                if self._depth == 0:
+                    start = match.start()
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buffer.append(chunk[start:position])
+                    parsed = self._parse("".join(self._buffer))
+                    self._buffer = []
+                    start = None
+                    if parsed is not None:
+                        objects.append(parsed)
 
-    if start != -1 and end != -1:
-        # Extract the JSON text and parse it
-        json_text = text[start : end + 1]
+        if self._depth > 0:
+            self._buffer.append(chunk[start:])
+        return objects
+
+    @staticmethod
+    def _parse(text: str) -> Optional[dict]:
         try:
-            return json.loads(json_text)
+            return json.loads(text)
         except json.JSONDecodeError:
-            print("Error: The text is not a valid JSON.")
             return None
-    else:
-        print("No valid JSON was found in the text.")
-        return None
+
+    def reset(self) -> None:
+        """Drops any partially received object."""
+        self.__init__()
+
+
+def iter_json_from_stream(chunks: Iterable[str]) -> Iterator[dict]:
+    """Yields each JSON object found in a stream of text chunks as it closes.
+
+    Args:
+      chunks: The streamed text, e.g. a ChatCompletionStream.
+
+    Yields:
+      The JSON objects, in order of appearance.
+    """
+    extractor = JsonStreamExtractor()
+    for chunk in chunks:
+        yield from extractor.feed(chunk)
+
+
+def extract_json_objects(text: str) -> list[dict]:
+    """Extracts every valid top-level JSON object from a given text.
+
+    Args:
+      text: The text from which JSON objects will be extracted.
+
+    Returns:
+      The JSON objects, in order of appearance.
+    """
+    return JsonStreamExtractor().feed(text)
+
+
+def extract_json_from_text(text):
+    """Extracts a valid JSON from a given text.
+
+    Args:
+      text: The text from which JSON will be extracted.
+
+    Returns:
+      A Python dictionary representing the first JSON object found in the text,
+      or None if no valid JSON is found.
+    """
+    objects = extract_json_objects(text)
+    if objects:
+        return objects[0]
+    print("No valid JSON was found in the text.")
+    return None
 
 
 if __name__ == "__main__":
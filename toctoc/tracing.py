@@ -1,26 +1,212 @@
+import hashlib
+import json
 import logging
-from typing import Optional
+import os
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Optional
 from threading import Lock
 
-from phoenix.config import get_env_host, get_env_port
-from openinference.semconv.resource import ResourceAttributes
 from opentelemetry import trace as trace_api
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
-from opentelemetry.sdk import trace as trace_sdk
+from opentelemetry.trace import Link, Status, StatusCode
 
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import SpanProcessor
+
+# The OpenTelemetry SDK, the OTLP exporter and phoenix are only imported by
+# `setup_tracer`, so importing this module (and the clients using it) stays
+# cheap until the first span is started.
 
 LOGGER = logging.getLogger(__name__)
 
+# Spans started with this attribute set are always sampled.
+FORCE_SAMPLE_ATTRIBUTE = "sampling.force"
+
+
+class AttributeCompactor:
+    """
+    Keeps large span attribute values small.
+
+    Values longer than `dedup_length` get their content hash recorded under
+    `<key>.sha1`, so identical values can be matched across spans. Values are
+    only changed when longer than `max_length`, in which case they are
+    truncated; JSON values are replaced by a JSON object with the truncated
+    text, so they stay parseable.
+
+    With `dedup`, a value already recorded by an earlier span is left out
+    and only its hash is recorded.
+    """
+
+    def __init__(
+        self,
+        max_length: int = 4096,
+        dedup_length: int = 256,
+        max_entries: int = 1024,
+        dedup: bool = False,
+    ):
+        """
+        Initializes the compactor.
+
+        Args:
+            max_length (int): Maximum characters kept of a value.
+            dedup_length (int): Minimum length of a value to be hashed.
+            max_entries (int): Maximum hashes remembered for `dedup`.
+            dedup (bool): Whether to leave out values already recorded.
+        """
+        self.max_length = max_length
+        self.dedup_length = dedup_length
+        self.max_entries = max_entries
+        self.dedup = dedup
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._lock = Lock()
+
+    def compact(self, key: str, value: str) -> dict:
+        """
+        Returns the attributes to record for the span attribute `key`.
+        """
+        if len(value) < self.dedup_length:
+            return {key: value}
+
+        digest = hashlib.sha1(value.encode("utf-8")).hexdigest()
+        attributes = {f"{key}.sha1": digest}
+        if self.dedup:
+            with self._lock:
+                seen = digest in self._seen
+                self._seen[digest] = None
+                self._seen.move_to_end(digest)
+                if len(self._seen) > self.max_entries:
+                    self._seen.popitem(last=False)
+            if seen:
+                return attributes
+        attributes[key] = self.truncate(value)
+        return attributes
+
+    def truncate(self, value: str) -> str:
+        """
+        Returns the value, truncated to `max_length` if longer.
+        """
+        if len(value) <= self.max_length:
+            return value
+        if value[:1] in ("{", "["):
+            try:
+                json.loads(value)
+            except ValueError:
+                pass
+            else:
+                return json.dumps(
+                    {"truncated": len(value), "prefix": value[: self.max_length]},
+                    ensure_ascii=False,
+                )
+        return f"{value[: self.max_length]}...[truncated {len(value)} chars]"
+
+
+ATTRIBUTE_COMPACTOR = AttributeCompactor()
+
+
+def set_lazy_attributes(
+    span: trace_api.Span,
+    build: Callable[[], dict],
+    compactor: Optional[AttributeCompactor] = ATTRIBUTE_COMPACTOR,
+) -> None:
+    """
+    Sets span attributes that are only computed if the span is recorded.
+
+    Args:
+        span (trace_api.Span): The span.
+        build (Callable[[], dict]): Returns the attributes.
+        compactor (Optional[AttributeCompactor]): Compacts string values.
+    """
+    if not span.is_recording():
+        return
+    attributes = build()
+    if compactor is not None:
+        compacted = {}
+        for key, value in attributes.items():
+            if isinstance(value, str):
+                compacted.update(compactor.compact(key, value))
+            else:
+                compacted[key] = value
+        attributes = compacted
+    span.set_attributes(attributes)
+
+
+def record_error(
+    span: trace_api.Span,
+    error: BaseException,
+    name: str,
+    attributes: Optional[dict] = None,
+) -> None:
+    """
+    Records an error on a span, even when the span was not sampled.
+
+    Unsampled spans are not recorded, so the error is recorded on a new
+    span that is always sampled and linked to the original one.
+
+    Args:
+        span (trace_api.Span): The span where the error happened.
+        error (BaseException): The error.
+        name (str): The name of the span.
+        attributes (Optional[dict]): Attributes of the new span.
+    """
+    if not span.is_recording():
+        span = trace_api.get_tracer(__name__).start_span(
+            name,
+            attributes={**(attributes or {}), FORCE_SAMPLE_ATTRIBUTE: True},
+            links=[Link(span.get_span_context())],
+        )
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.end()
+        return
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
 
 def setup_tracer(
     project_name: str,
     collector_endpoint: Optional[str] = None,
+    export_mode: str = "batch",
+    max_queue_size: int = 2048,
+    max_batch_size: int = 512,
+    schedule_delay: float = 1.0,
+    sampling_rates: Optional[dict[str, float]] = None,
+    default_sampling_rate: float = 1.0,
+    spool_directory: Optional[str] = None,
 ) -> trace_api.Tracer:
-    """Setup a tracer with the given project name and collector endpoint."""
-    if collector_endpoint is None:
-        collector_endpoint = f"http://{get_env_host()}:{get_env_port()}/v1/traces"
+    """
+    Setup a tracer with the given project name and collector endpoint.
+
+    Args:
+        project_name (str): The name of the project for the tracer.
+        collector_endpoint (Optional[str]): The endpoint for the trace collector.
+            Defaults to using environment variables if not provided.
+        export_mode (str): "batch" to export from a background thread with
+            `BatchedSpanProcessor`, or "simple" to export each span
+            synchronously when it ends.
+        max_queue_size (int): Maximum spans waiting to be exported in batch mode.
+        max_batch_size (int): Maximum spans per export in batch mode.
+        schedule_delay (float): Maximum seconds between exports in batch mode.
+        sampling_rates (Optional[dict[str, float]]): Head sampling rate per
+            OpenInference span kind, see `SpanKindSampler`.
+        default_sampling_rate (float): Sampling rate of the other span kinds.
+        spool_directory (Optional[str]): If given, spans are written to this
+            local spool instead of the collector, see `SpoolSpanExporter`.
+            Defaults to the TOCTOC_SPAN_SPOOL environment variable.
+
+    Returns:
+        trace_api.Tracer: The tracer.
+
+    Raises:
+        ValueError: If `export_mode` is unknown.
+    """
+    from openinference.semconv.resource import ResourceAttributes
+    from opentelemetry.sdk import trace as trace_sdk
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+    from toctoc.tracing_sdk import BatchedSpanProcessor, SpanKindSampler
+
+    if spool_directory is None:
+        spool_directory = os.getenv("TOCTOC_SPAN_SPOOL")
 
     resource = Resource(
         attributes={
@@ -28,17 +214,51 @@ def setup_tracer(
         }
     )
 
-    tracer_provider = trace_sdk.TracerProvider(resource=resource)
+    sampler = SpanKindSampler(sampling_rates, default_sampling_rate)
+    tracer_provider = trace_sdk.TracerProvider(resource=resource, sampler=sampler)
+
+    if spool_directory:
+        from toctoc.span_spool import SpoolSpanExporter
+
+        span_exporter = SpoolSpanExporter(spool_directory)
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        if collector_endpoint is None:
+            from phoenix.config import get_env_host, get_env_port
 
-    span_exporter = OTLPSpanExporter(endpoint=collector_endpoint)
-    simple_span_processor = SimpleSpanProcessor(span_exporter=span_exporter)
+            collector_endpoint = (
+                f"http://{get_env_host()}:{get_env_port()}/v1/traces"
+            )
+        span_exporter = OTLPSpanExporter(endpoint=collector_endpoint)
+    if export_mode == "batch":
+        span_processor = BatchedSpanProcessor(
+            span_exporter,
+            max_queue_size=max_queue_size,
+            max_batch_size=max_batch_size,
+            schedule_delay=schedule_delay,
+        )
+    elif export_mode == "simple":
+        span_processor = SimpleSpanProcessor(span_exporter=span_exporter)
+    else:
+        raise ValueError(f"Unknown export mode: {export_mode}")
 
-    tracer_provider.add_span_processor(span_processor=simple_span_processor)
+    # The provider shuts its processors down at exit, flushing queued spans.
+    tracer_provider.add_span_processor(span_processor=span_processor)
+    TracerProvider._span_processor = span_processor
     trace_api.set_tracer_provider(tracer_provider=tracer_provider)
 
     tracer = trace_api.get_tracer(__name__)
 
-    LOGGER.info(f"Tracer setup with collector endpoint: {collector_endpoint}")
+    if spool_directory:
+        LOGGER.info(f"Tracer setup with span spool: {spool_directory}")
+    else:
+        LOGGER.info(
+            f"Tracer setup with collector endpoint: {collector_endpoint} "
+            f"({export_mode} export)"
+        )
     return tracer
 
 
@@ -49,14 +269,20 @@ class TracerProvider:
     Attributes:
         _instance (Optional[trace_api.Tracer]): The singleton tracer instance.
         _lock (Lock): A lock to ensure thread-safe initialization.
+        _span_processor (Optional[SpanProcessor]): The span processor
+            of the last tracer set up.
     """
 
     _instance: Optional[trace_api.Tracer] = None
     _lock = Lock()
+    _span_processor: Optional["SpanProcessor"] = None
 
     @classmethod
     def get_tracer(
-        cls, project_name: str, collector_endpoint: Optional[str] = None
+        cls,
+        project_name: str,
+        collector_endpoint: Optional[str] = None,
+        **options,
     ) -> trace_api.Tracer:
         """
         Get or create a singleton tracer instance.
@@ -65,6 +291,7 @@ class TracerProvider:
             project_name (str): The name of the project for the tracer.
             collector_endpoint (Optional[str]): The endpoint for the trace collector.
                 Defaults to using environment variables if not provided.
+            **options: Export options passed to `setup_tracer`.
 
         Returns:
             trace_api.Tracer: The singleton tracer instance.
@@ -72,5 +299,70 @@ class TracerProvider:
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:  # Double-checked locking
-                    cls._instance = setup_tracer(project_name, collector_endpoint)
+                    cls._instance = setup_tracer(
+                        project_name, collector_endpoint, **options
+                    )
         return cls._instance
+
+    @classmethod
+    def export_stats(cls) -> dict[str, int]:
+        """
+        Returns the span export counters, empty unless spans are batched.
+        """
+        stats = getattr(cls._span_processor, "stats", None)
+        return stats() if stats is not None else {}
+
+
+class DeferredTracer(trace_api.Tracer):
+    """
+    A tracer set up by `TracerProvider.get_tracer` when its first span starts.
+
+    Module level tracers are created with it so that importing a module does
+    not import the OpenTelemetry SDK, the exporter and phoenix, nor connect
+    to the collector.
+    """
+
+    def __init__(
+        self,
+        project_name: str,
+        collector_endpoint: Optional[str] = None,
+        **options,
+    ):
+        """
+        Initializes the tracer without setting it up.
+
+        Args:
+            project_name (str): The name of the project for the tracer.
+            collector_endpoint (Optional[str]): The endpoint for the trace collector.
+            **options: Export options passed to `setup_tracer`.
+        """
+        self.project_name = project_name
+        self.collector_endpoint = collector_endpoint
+        self.options = options
+        self._tracer: Optional[trace_api.Tracer] = None
+
+    @property
+    def tracer(self) -> trace_api.Tracer:
+        """
+        The tracer of `TracerProvider`, set up on first access.
+        """
+        if self._tracer is None:
+            self._tracer = TracerProvider.get_tracer(
+                self.project_name, self.collector_endpoint, **self.options
+            )
+        return self._tracer
+
+    def start_span(self, *args, **kwargs) -> trace_api.Span:
+        return self.tracer.start_span(*args, **kwargs)
+
+    def start_as_current_span(self, *args, **kwargs):
+        return self.tracer.start_as_current_span(*args, **kwargs)
+
+
+def __getattr__(name: str):
+    # The SDK based classes used to live here, import them on demand.
+    if name in ("BatchedSpanProcessor", "SpanKindSampler"):
+        from toctoc import tracing_sdk
+
+        return getattr(tracing_sdk, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
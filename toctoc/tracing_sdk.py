@@ -0,0 +1,199 @@
+from collections import deque
+from typing import Optional
+from threading import Lock
+
+from openinference.semconv.trace import SpanAttributes
+from opentelemetry import trace as trace_api
+from opentelemetry.sdk import trace as trace_sdk
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.sdk.trace.sampling import (
+    Decision,
+    Sampler,
+    SamplingResult,
+    TraceIdRatioBased,
+)
+
+from toctoc.tracing import FORCE_SAMPLE_ATTRIBUTE
+
+
+class _CountingSpanExporter(SpanExporter):
+    """
+    Forwards to an exporter, counting the batches and spans it exports.
+    """
+
+    def __init__(self, span_exporter: SpanExporter, counters: "BatchedSpanProcessor"):
+        self.span_exporter = span_exporter
+        self.counters = counters
+
+    def export(self, spans) -> SpanExportResult:
+        result = SpanExportResult.FAILURE
+        try:
+            result = self.span_exporter.export(spans)
+            return result
+        finally:
+            self.counters._count_export(len(spans), result)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.span_exporter.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        self.span_exporter.shutdown()
+
+
+class BatchedSpanProcessor(BatchSpanProcessor):
+    """
+    The SDK `BatchSpanProcessor`, with counters of the spans it handles.
+
+    Ending a span only appends it to a bounded queue, exported in batches by
+    the SDK worker thread. When the queue is full the SDK drops the oldest
+    queued span, so a slow or unreachable collector never blocks the request
+    that ended the span; those drops are counted here.
+
+    Attributes:
+        queued (int): Spans added to the queue.
+        dropped (int): Spans dropped because the queue was full.
+        exported (int): Spans exported successfully.
+        failed (int): Spans whose export failed.
+        batches (int): Export calls made.
+    """
+
+    def __init__(
+        self,
+        span_exporter: SpanExporter,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 512,
+        schedule_delay: float = 1.0,
+    ):
+        """
+        Initializes the processor and starts its worker thread.
+
+        Args:
+            span_exporter (SpanExporter): The exporter spans are sent to.
+            max_queue_size (int): Maximum spans waiting to be exported.
+            max_batch_size (int): Maximum spans per export call.
+            schedule_delay (float): Maximum seconds between exports.
+        """
+        self.max_queue_size = max_queue_size
+        self.queued = 0
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+        self.batches = 0
+        self._counters_lock = Lock()
+        super().__init__(
+            _CountingSpanExporter(span_exporter, self),
+            max_queue_size=max_queue_size,
+            schedule_delay_millis=schedule_delay * 1000,
+            max_export_batch_size=max_batch_size,
+        )
+
+    def _queue(self) -> Optional[deque]:
+        """
+        The SDK queue; it moved to a `BatchProcessor` in opentelemetry-sdk
+        1.33.
+        """
+        processor = getattr(self, "_batch_processor", self)
+        for name in ("_queue", "queue"):
+            queue = getattr(processor, name, None)
+            if isinstance(queue, deque):
+                return queue
+        return None
+
+    def on_end(self, span: trace_sdk.ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled:
+            return
+        queue = self._queue()
+        full = queue is not None and len(queue) >= self.max_queue_size
+        super().on_end(span)
+        # Still full after the append: the worker did not take a batch in
+        # between, so a span was dropped to make room.
+        dropped = full and len(queue) >= self.max_queue_size
+        with self._counters_lock:
+            self.queued += 1
+            self.dropped += dropped
+
+    def _count_export(self, spans: int, result: SpanExportResult) -> None:
+        with self._counters_lock:
+            self.batches += 1
+            if result == SpanExportResult.SUCCESS:
+                self.exported += spans
+            else:
+                self.failed += spans
+
+    def stats(self) -> dict[str, int]:
+        """
+        Returns the export counters and the current queue length.
+        """
+        queue = self._queue()
+        with self._counters_lock:
+            return {
+                "queued": self.queued,
+                "dropped": self.dropped,
+                "exported": self.exported,
+                "failed": self.failed,
+                "batches": self.batches,
+                "queue_length": len(queue) if queue is not None else 0,
+            }
+
+
+class SpanKindSampler(Sampler):
+    """
+    Head-based sampler with a rate per OpenInference span kind.
+
+    Root spans are sampled by trace id with the rate of the span kind given in
+    their start attributes, so the decision is made before any attribute is
+    computed. Child spans follow their parent, and spans started with
+    `FORCE_SAMPLE_ATTRIBUTE` (see `record_error`) are always sampled.
+    """
+
+    def __init__(
+        self, rates: Optional[dict[str, float]] = None, default_rate: float = 1.0
+    ):
+        """
+        Initializes the sampler.
+
+        Args:
+            rates (Optional[dict[str, float]]): Sampling rate per span kind,
+                e.g. {"CHAIN": 0.1}.
+            default_rate (float): Sampling rate of the other span kinds.
+        """
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self._samplers = {
+            kind: TraceIdRatioBased(rate) for kind, rate in self.rates.items()
+        }
+        self._default_sampler = TraceIdRatioBased(default_rate)
+
+    def should_sample(
+        self,
+        parent_context,
+        trace_id,
+        name,
+        kind=None,
+        attributes=None,
+        links=None,
+        trace_state=None,
+    ) -> SamplingResult:
+        if attributes and attributes.get(FORCE_SAMPLE_ATTRIBUTE):
+            return SamplingResult(Decision.RECORD_AND_SAMPLE, attributes)
+
+        parent = trace_api.get_current_span(parent_context).get_span_context()
+        if parent.is_valid:
+            if parent.trace_flags.sampled:
+                return SamplingResult(
+                    Decision.RECORD_AND_SAMPLE, attributes, parent.trace_state
+                )
+            return SamplingResult(Decision.DROP, None, parent.trace_state)
+
+        span_kind = (attributes or {}).get(SpanAttributes.OPENINFERENCE_SPAN_KIND)
+        sampler = self._samplers.get(span_kind, self._default_sampler)
+        return sampler.should_sample(
+            parent_context, trace_id, name, kind, attributes, links, trace_state
+        )
+
+    def get_description(self) -> str:
+        return f"SpanKindSampler{{rates={self.rates}, default={self.default_rate}}}"